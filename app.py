@@ -1,52 +1,170 @@
+import time
+_t_import = time.perf_counter() # 리런 시간 측정 시작 (import 포함)
 import streamlit as st
-from google import genai
-from google.genai import types
-from supabase import create_client, Client
-import pandas as pd
-import plotly.graph_objects as go
 import datetime
+import hmac
+import logging
 import os
-import textwrap
 import re # 정규식
+import threading
 from dotenv import load_dotenv
-from korean_lunar_calendar import KoreanLunarCalendar
-from personas import PERSONAS
+from saju import calculate_saju_pillars, count_elements, Saju, PILLAR_KEYS
+from saju_card import CARD_CSS, card_html
+from matching import fetch_matches, candidate_cache, stream_metrics
+import llm
+import metrics
+import fortune
+import luck
+import relations
+import sessions
+IMPORT_SEC = time.perf_counter() - _t_import
+
+perf_log = logging.getLogger("saju.perf")
+
+# --- [프로세스 공용 리소스] ---
+# Streamlit 은 리런마다 이 파일 전체를 다시 실행하므로, 환경변수/클라이언트/약관 파일은
+# st.cache_resource / st.cache_data 로 프로세스당 한 번만 만든다 (처음 필요할 때 생성).
+# google.genai / supabase 는 import 자체가 무거워서 (콜드스타트의 절반 이상) 클라이언트를 만들 때 import 한다.
+# import 시간 점검: python -m bench.bench_startup
+
+@st.cache_resource(show_spinner=False)
+def perf_stats():
+    # 리런/리소스 초기화 시간 (프로세스 공용, 여러 세션 스레드가 쓰므로 perf_lock() 안에서만 읽고 씀)
+    return {"resource_init_sec": {}, "reruns": 0, "rerun_total_sec": 0.0, "rerun_max_sec": 0.0, "rerun_last_sec": 0.0, "import_sec": IMPORT_SEC}
+
+@st.cache_resource(show_spinner=False)
+def perf_lock():
+    return threading.Lock()
+
+def perf_snapshot():
+    with perf_lock():
+        stats = perf_stats()
+        return {**stats, "resource_init_sec": dict(stats["resource_init_sec"])}
+
+def _timed_init(name, fn):
+    t0 = time.perf_counter()
+    obj = fn()
+    elapsed = time.perf_counter() - t0
+    with perf_lock():
+        perf_stats()["resource_init_sec"][name] = elapsed
+    perf_log.info("%s 초기화 %.1fms", name, elapsed * 1000)
+    return obj
 
 # 1. 환경 변수 및 Secrets 로드 (순서 중요!)
-load_dotenv()
+@st.cache_resource(show_spinner=False)
+def load_env():
+    return _timed_init("dotenv", load_dotenv)
+
+load_env()
 
 def get_secret(key_name):
     # 1순위: 내 컴퓨터 환경변수 (.env)
     value = os.getenv(key_name)
-    # 2순위: Streamlit Cloud Secrets
-    if not value and key_name in st.secrets:
-        value = st.secrets[key_name]
+    # 2순위: Streamlit Cloud Secrets (secrets.toml 이 없으면 None - 선택 설정값 조회용)
+    try:
+        if not value and key_name in st.secrets:
+            value = st.secrets[key_name]
+    except FileNotFoundError:
+        pass
     return value
 
 # API 키 설정
-GEMINI_API_KEY = get_secret("GEMINI_API_KEY")
-SUPABASE_URL = get_secret("SUPABASE_URL")
-SUPABASE_KEY = get_secret("SUPABASE_KEY")
-TARGET_MODEL_NAME = "gemini-2.0-flash"
-
-# 2. 클라이언트 초기화
-gemini_client = None
-if GEMINI_API_KEY:
+MATCH_ENGINE = get_secret("MATCH_ENGINE") or "rpc" # "rpc": DB 함수 / "local": 앱 공용 후보 캐시 / "stream": 페이지 스트리밍
+if MATCH_ENGINE == "rpc" and not get_secret("SUPABASE_SERVICE_KEY"):
+    # match_candidates 는 service_role 에만 실행 권한 (sql/001_match_candidates.sql)
+    logging.getLogger("saju.match").warning("SUPABASE_SERVICE_KEY 가 없어 MATCH_ENGINE=local 로 실행합니다")
+    MATCH_ENGINE = "local"
+
+# 2. 클라이언트 초기화 (예외는 캐시되지 않으므로 실패하면 다음 리런에서 재시도)
+@st.cache_resource(show_spinner=False)
+def get_gemini_client():
+    api_key = get_secret("GEMINI_API_KEY")
+    if not api_key: return None
+    from google import genai
+    from google.genai import types
+    # HTTP 타임아웃(ms): 응답 없는 요청이 작업 스레드를 붙잡지 않도록
+    return _timed_init("gemini", lambda: genai.Client(api_key=api_key, http_options=types.HttpOptions(timeout=int(llm.gemini_pool.timeout * 1000))))
+
+@st.cache_resource(show_spinner=False)
+def get_supabase():
+    url, key = get_secret("SUPABASE_URL"), get_secret("SUPABASE_KEY")
+    if not (url and key): return None
+    from supabase import create_client
+    return _timed_init("supabase", lambda: metrics.instrument_supabase(create_client(url, key)))
+
+@st.cache_resource(show_spinner=False)
+def get_service_supabase():
+    # service_role 전용 RPC(매칭, 로그인 아이디 조회)용 서버 측 클라이언트 (service_role 키는 브라우저로 나가지 않음, user_id 는 로그인 세션 값만 넣음)
+    url, key = get_secret("SUPABASE_URL"), get_secret("SUPABASE_SERVICE_KEY")
+    if not (url and key): return None
+    from supabase import create_client
+    return _timed_init("supabase_service", lambda: metrics.instrument_supabase(create_client(url, key)))
+
+@st.cache_resource(show_spinner=False)
+def metrics_server():
+    # METRICS=1 + METRICS_PORT 일 때 프로세스당 한 번 /metrics 엔드포인트 시작 (metrics.py 참고)
+    return metrics.serve()
+
+def new_auth_client():
+    # 로그인/가입/로그아웃은 호출마다 새 클라이언트로 (공용 클라이언트에 특정 사용자 토큰이 붙지 않도록)
+    from supabase import create_client
+    return create_client(get_secret("SUPABASE_URL"), get_secret("SUPABASE_KEY"))
+
+def revoke_session(tokens):
+    # 로그인 때 받은 (access, refresh) 토큰으로 이 세션만 서버에서 로그아웃 (refresh token 폐기)
+    # access token 이 만료됐으면 set_session 이 refresh 로 새로 받은 뒤 폐기
+    if not tokens: return
+    try:
+        auth = new_auth_client().auth
+        auth.set_session(*tokens)
+        auth.sign_out({"scope": "local"})
+    except Exception as e:
+        logging.getLogger("saju.auth").warning("세션 토큰 폐기 실패: %s", e)
+
+def user_db():
+    # 로그인한 본인 행(users.id = 로그인 세션의 user_id) 읽기/쓰기 전용 서버 측 클라이언트
+    #   공용 anon 클라이언트에는 사용자 JWT 가 없어 RLS 의 auth.uid() 로 본인 행을 찾을 수 없음
+    #   -> service_role 클라이언트로, 항상 .eq("id", st.session_state['user_id']) 조건을 붙여서만 사용
+    client = get_service_supabase()
+    if client is None: raise RuntimeError("SUPABASE_SERVICE_KEY 가 설정되지 않았습니다")
+    return client
+
+def gemini():
     try:
-        gemini_client = genai.Client(api_key=GEMINI_API_KEY)
+        return get_gemini_client()
     except Exception as e:
         st.error(f"Gemini 연결 실패: {e}")
-else:
+        return None
+
+if not get_secret("GEMINI_API_KEY"):
     st.error("🚨 API 키를 찾을 수 없습니다. Streamlit Secrets 설정을 확인해주세요.")
 
-supabase: Client = None
-if SUPABASE_URL and SUPABASE_KEY:
+def db():
     try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        return get_supabase()
     except Exception as e:
         st.error(f"Supabase 연결 실패: {e}")
+        return None
+
+@st.cache_data(ttl=60, show_spinner=False)
+def health_check():
+    # ?health=<HEALTH_TOKEN> 로 확인: 외부 의존성 응답 여부 + 지연시간
+    result = {}
+    checks = {
+        "supabase": lambda: get_supabase().table("users").select("id").limit(1).execute(),
+        "gemini": lambda: get_gemini_client().models.get(model=llm.TARGET_MODEL_NAME),
+    }
+    for name, check in checks.items():
+        t0 = time.perf_counter()
+        try:
+            check()
+            result[name] = {"ok": True, "latency_ms": round((time.perf_counter() - t0) * 1000, 1)}
+        except Exception as e:
+            result[name] = {"ok": False, "error": str(e)}
+    return result
 
 # --- [헬퍼 함수: 약관 파일 읽기] ---
+@st.cache_data(show_spinner=False)
 def load_term_file(filename):
     try:
         file_path = os.path.join("terms", filename)
@@ -55,98 +173,35 @@ def load_term_file(filename):
     except FileNotFoundError:
         return "약관 내용을 불러올 수 없습니다."
 
-# --- [상수 데이터] ---
-# (코드 길이상 오행 데이터 등은 유지되었다고 가정합니다. 기존 코드의 상수 부분을 그대로 두세요.)
-OHEANG_DATA = {
-    "갑": {"elem": "목(木)", "bg": "#1565C0", "label": "양목"},
-    "을": {"elem": "목(木)", "bg": "#1565C0", "label": "음목"},
-    "병": {"elem": "화(火)", "bg": "#C62828", "label": "양화"},
-    "정": {"elem": "화(火)", "bg": "#C62828", "label": "음화"},
-    "무": {"elem": "토(土)", "bg": "#F9A825", "label": "양토"},
-    "기": {"elem": "토(土)", "bg": "#F9A825", "label": "음토"},
-    "경": {"elem": "금(金)", "bg": "#616161", "label": "양금"},
-    "신": {"elem": "금(金)", "bg": "#616161", "label": "음금"},
-    "임": {"elem": "수(水)", "bg": "#000000", "label": "양수"},
-    "계": {"elem": "수(水)", "bg": "#000000", "label": "음수"},
-    "인": {"elem": "목(木)", "bg": "#1565C0", "label": "양목"},
-    "묘": {"elem": "목(木)", "bg": "#1565C0", "label": "음목"},
-    "사": {"elem": "화(火)", "bg": "#C62828", "label": "음화"},
-    "오": {"elem": "화(火)", "bg": "#C62828", "label": "양화"},
-    "진": {"elem": "토(土)", "bg": "#F9A825", "label": "양토"},
-    "술": {"elem": "토(土)", "bg": "#F9A825", "label": "양토"},
-    "축": {"elem": "토(土)", "bg": "#F9A825", "label": "음토"},
-    "미": {"elem": "토(土)", "bg": "#F9A825", "label": "음토"},
-    "신": {"elem": "금(金)", "bg": "#616161", "label": "양금"},
-    "유": {"elem": "금(金)", "bg": "#616161", "label": "음금"},
-    "해": {"elem": "수(水)", "bg": "#000000", "label": "양수"},
-    "자": {"elem": "수(水)", "bg": "#000000", "label": "음수"},
-}
-GAN_LIST = ["갑", "을", "병", "정", "무", "기", "경", "신", "임", "계"]
-JI_LIST = ["자", "축", "인", "묘", "진", "사", "오", "미", "신", "유", "술", "해"]
-GAN_HANJA = ["甲", "乙", "丙", "丁", "戊", "己", "庚", "辛", "壬", "癸"]
-JI_HANJA = ["子", "丑", "寅", "卯", "辰", "巳", "午", "未", "申", "酉", "戌", "亥"]
-OHEANG_MAP = {
-    "갑": "목(木)", "을": "목(木)", "인": "목(木)", "묘": "목(木)",
-    "병": "화(火)", "정": "화(火)", "사": "화(火)", "오": "화(火)",
-    "무": "토(土)", "기": "토(土)", "진": "토(土)", "술": "토(土)", "축": "토(土)", "미": "토(土)",
-    "경": "금(金)", "신": "금(金)", "申": "금(金)", "유": "금(金)",
-    "임": "수(水)", "계": "수(水)", "해": "수(水)", "자": "수(水)"
-}
-
 # --- [계산 로직 함수들] ---
-def calculate_saju_pillars(year, month, day, hour, minute):
-    calendar = KoreanLunarCalendar()
-    calendar.setSolarDate(year, month, day)
-    year_idx = (year - 4) % 60
-    year_gan = GAN_LIST[year_idx % 10]
-    year_ji = JI_LIST[year_idx % 12]
-    month_base_idx = (year - 4) % 10
-    start_month_gan_map = {0: 2, 1: 4, 2: 6, 3: 8, 4: 0, 5: 2, 6: 4, 7: 6, 8: 8, 9: 0}
-    if month == 2 and day < 4: target_month_idx = 11
-    else: target_month_idx = 11 if month < 2 else month - 2
-    month_gan = GAN_LIST[(start_month_gan_map[month_base_idx] + target_month_idx) % 10]
-    month_ji = JI_LIST[(2 + target_month_idx) % 12]
-    base = datetime.date(1900, 1, 1)
-    target = datetime.date(year, month, day)
-    diff = (target - base).days
-    day_idx = (10 + diff) % 60
-    day_gan = GAN_LIST[day_idx % 10]
-    day_ji = JI_LIST[day_idx % 12]
-    day_gan_idx = GAN_LIST.index(day_gan)
-    start_time_gan_map = {0: 0, 1: 2, 2: 4, 3: 6, 4: 8, 5: 0, 6: 2, 7: 4, 8: 6, 9: 8}
-    time_ji_idx = 0 if (hour >= 23 or hour < 1) else (hour + 1) // 2
-    time_gan = GAN_LIST[(start_time_gan_map[day_gan_idx] + time_ji_idx) % 10]
-    time_ji = JI_LIST[time_ji_idx % 12]
-    def to_str(gan, ji):
-        g_h = GAN_HANJA[GAN_LIST.index(gan)]
-        j_h = JI_HANJA[JI_LIST.index(ji)]
-        return {"gan": gan, "gan_hanja": g_h, "ji": ji, "ji_hanja": j_h}
-    return {"year": to_str(year_gan, year_ji), "month": to_str(month_gan, month_ji), "day": to_str(day_gan, day_ji), "time": to_str(time_gan, time_ji)}
+# 사주 계산(단건/배치)은 saju.py 참고
+def daeun_table_md(saju, birth_dt, gender, count=8):
+    # 대운 8개를 가로 표로 (대운수 / 기둥)
+    periods = list(luck.daeun(saju, birth_dt, gender, count))
+    su = luck.daeun_su(periods[0].start_age)
+    head = "| 대운 | " + " | ".join(f"{su + 10 * i}세" for i in range(count)) + " |"
+    line = "|---" * (count + 1) + "|"
+    body = "| 기둥 | " + " | ".join(f"{d.pillar.hanja} ({d.pillar.name})" for d in periods) + " |"
+    return "\n".join([head, line, body])
+
+def relations_md(saju):
+    # 십신 / 지장간 / 합충형 요약 (룩업 테이블만 사용)
+    labels = {"year": "년주", "month": "월주", "day": "일주", "time": "시주"}
+    gods, hidden = relations.ten_gods(saju), relations.hidden_stems(saju)
+    lines = ["| | " + " | ".join(labels[k] for k in PILLAR_KEYS) + " |", "|---" * 5 + "|",
+             "| 십신 | " + " | ".join(f"{gods[k][0] or '일간'} / {gods[k][1]}" for k in PILLAR_KEYS) + " |",
+             "| 지장간 | " + " | ".join(" ".join(hidden[k]) for k in PILLAR_KEYS) + " |"]
+    rels = [f"{labels[a]}-{labels[b]} {kind} {'·'.join(names)}" for a, b, kind, names in relations.chart_relations(saju)]
+    if rels: lines.append("\n**합충형:** " + ", ".join(rels))
+    return "\n".join(lines)
 
 def generate_detailed_analysis(saju, user_info, element_counts, persona_key):
     try:
+        gemini_client = gemini()
         if not gemini_client: return "API 키 오류"
-        full_saju_str = f"년주:{saju['year']['gan']}{saju['year']['ji']}, 월주:{saju['month']['gan']}{saju['month']['ji']}, 일주:{saju['day']['gan']}{saju['day']['ji']}, 시주:{saju['time']['gan']}{saju['time']['ji']}"
-        persona = PERSONAS[persona_key]
-        prompt = f"""
-        {persona['prompt_instruction']}
-        [사용자] {user_info['name']} ({user_info['gender']}), 사주: {full_saju_str}, 오행: {element_counts}
-        [요청] 인사, 사주 도표, 전체 형국, 성격, 직업/재물, 대운/세운, 한마디 순으로 작성. 말투: {persona['tone']}
-        """
-        response = gemini_client.models.generate_content(model=TARGET_MODEL_NAME, contents=prompt)
-        return response.text
+        return llm.detailed_analysis(gemini_client, saju, user_info['gender'], element_counts, persona_key, user_info['name'])
     except Exception as e: return f"오류 발생: {str(e)}"
 
-def get_saju_card_html(saju):
-    pillars = [saju["time"], saju["day"], saju["month"], saju["year"]]
-    headers = ["시주 (時)", "일주 (日)", "월주 (月)", "년주 (年)"]
-    style = """<style>.saju-wrapper { display: flex; justify-content: space-between; gap: 8px; margin-bottom: 20px; } .pillar-card { background-color: #262730; border: 1px solid #464b59; border-radius: 8px; width: 24%; text-align: center; } .card-header { background-color: #31333F; padding: 8px 0; font-weight: bold; color: #FAFAFA; border-bottom: 1px solid #464b59; } .char-section { padding: 15px 0; color: white; } .char-big { font-size: 2rem; font-weight: bold; } .char-desc { font-size: 0.8rem; margin-top: 2px; } .char-tag { font-size: 0.7rem; margin-top: 5px; background: rgba(0,0,0,0.3); padding: 2px 6px; border-radius: 4px; } .card-footer { padding: 6px; font-size: 0.75rem; color: #909090; border-top: 1px solid #464b59; }</style>"""
-    html = '<div class="saju-wrapper">'
-    for i, p in enumerate(pillars):
-        gd, jd = OHEANG_DATA.get(p["gan"]), OHEANG_DATA.get(p["ji"])
-        html += f"""<div class="pillar-card"><div class="card-header">{headers[i]}</div><div class="char-section" style="background-color:{gd['bg']}"><div class="char-big">{p['gan_hanja']}</div><div class="char-desc">{p['gan']}:{gd['elem']}</div><div class="char-tag">{gd['label']}</div></div><div class="char-section" style="background-color:{jd['bg']}"><div class="char-big">{p['ji_hanja']}</div><div class="char-desc">{p['ji']}:{jd['elem']}</div><div class="char-tag">{jd['label']}</div></div><div class="card-footer">오행:{gd['elem'][0]}/{jd['elem'][0]}</div></div>"""
-    return textwrap.dedent(style + html + '</div>')
-
 # =======================================================
 # [인증 화면 UI 분리 - 라우터 적용]
 # =======================================================
@@ -178,16 +233,18 @@ def render_login_view():
                 st.error("아이디와 비밀번호를 입력해주세요.")
             else:
                 try:
-                    # [핵심] 아이디로 이메일 찾기 (ID 로그인 구현)
-                    user_query = supabase.table("users").select("email").eq("username", username).execute()
+                    # [핵심] 아이디로 이메일 찾기 (ID 로그인 구현, service_role 전용 RPC - sql/004_signup_login.sql)
+                    client = get_service_supabase()
+                    if client is None: raise RuntimeError("SUPABASE_SERVICE_KEY 가 설정되지 않았습니다")
+                    target_email = client.rpc("resolve_login_email", {"p_username": username}).execute().data
                     
-                    if not user_query.data:
+                    if not target_email:
                         st.error("존재하지 않는 아이디입니다.")
                     else:
-                        target_email = user_query.data[0]['email']
                         # 찾은 이메일로 로그인 시도
-                        res = supabase.auth.sign_in_with_password({"email": target_email, "password": password})
-                        st.session_state['user'] = res.user
+                        res = new_auth_client().auth.sign_in_with_password({"email": target_email, "password": password})
+                        st.session_state['user_id'] = res.user.id # auth User 객체 대신 id 만 (sessions.py)
+                        st.session_state['auth_tokens'] = (res.session.access_token, res.session.refresh_token) # 로그아웃 시 폐기용
                         st.session_state['is_logged_in'] = True
                         st.rerun()
                 except Exception as e:
@@ -222,7 +279,7 @@ def render_reset_view():
         else:
             try:
                 # Supabase 비밀번호 리셋 요청
-                supabase.auth.reset_password_for_email(email, options={"redirect_to": "https://sajumonk.streamlit.app/"})
+                new_auth_client().auth.reset_password_for_email(email, options={"redirect_to": "https://sajumonk.streamlit.app/"})
                 st.success("✅ 메일이 발송되었습니다. 메일함을 확인해주세요.")
             except Exception as e:
                 st.error(f"전송 실패: {str(e)}")
@@ -232,16 +289,21 @@ def render_reset_view():
         st.session_state.auth_mode = 'login'
         st.rerun()
 
+def check_signup_available(username=None, email=None):
+    # 아이디/이메일 사용 중 여부를 RPC 한 번으로 -> {"username_taken": bool, "email_taken": bool}
+    res = db().rpc("check_signup_available", {"p_username": username, "p_email": email}).execute()
+    return res.data[0]
+
 def render_signup_view():
     st.title("📝 회원가입")
     st.caption("운명의 상대를 만나기 위한 첫 걸음입니다. (* 표시는 필수 항목)")
     
-    # [1] 아이디 중복 확인 로직
+    # [1] 아이디 중복 확인 로직 (안내용: 최종 중복 판정은 가입 시 DB 유니크 인덱스)
     col_id1, col_id2 = st.columns([3, 1], vertical_alignment="bottom")
     with col_id1:
         # 아이디 입력값이 바뀌면 중복확인 상태 초기화 (on_change)
         def reset_id_check():
-            st.session_state.id_checked = False
+            st.session_state.pop('id_checked', None)
         new_username = st.text_input("아이디 *", key="signup_username", on_change=reset_id_check)
     
     with col_id2:
@@ -250,8 +312,7 @@ def render_signup_view():
                 st.error("입력 필요")
             else:
                 try:
-                    res = supabase.table("users").select("username").eq("username", new_username).execute()
-                    if res.data:
+                    if check_signup_available(username=new_username)["username_taken"]:
                         st.error("사용 불가")
                         st.session_state.id_checked = False
                     else:
@@ -264,13 +325,13 @@ def render_signup_view():
     if st.session_state.get('id_checked') is True:
         st.caption("✅ 사용 가능한 아이디입니다.")
     elif st.session_state.get('id_checked') is False and new_username:
-        st.caption("❌ 중복 확인이 필요하거나 이미 사용 중입니다.")
+        st.caption("❌ 이미 사용 중인 아이디입니다.")
 
     # [2] 이메일 중복 확인 로직
     col_em1, col_em2 = st.columns([3, 1], vertical_alignment="bottom")
     with col_em1:
         def reset_email_check():
-            st.session_state.email_checked = False
+            st.session_state.pop('email_checked', None)
         new_email = st.text_input("이메일 (본인인증용) *", key="signup_email", help="실제 사용 중인 이메일을 입력하세요.", on_change=reset_email_check)
     
     with col_em2:
@@ -281,8 +342,7 @@ def render_signup_view():
                 st.error("형식 오류")
             else:
                 try:
-                    res = supabase.table("users").select("email").eq("email", new_email).execute()
-                    if res.data:
+                    if check_signup_available(email=new_email)["email_taken"]:
                         st.error("사용 불가")
                         st.session_state.email_checked = False
                     else:
@@ -294,7 +354,7 @@ def render_signup_view():
     if st.session_state.get('email_checked') is True:
         st.caption("✅ 사용 가능한 이메일입니다.")
     elif st.session_state.get('email_checked') is False and new_email:
-        st.caption("❌ 중복 확인이 필요하거나 이미 사용 중입니다.")
+        st.caption("❌ 이미 사용 중인 이메일입니다.")
 
     # [3] 비밀번호
     c1, c2 = st.columns(2)
@@ -364,12 +424,12 @@ def render_signup_view():
             st.error("필수 항목(*)을 모두 입력해주세요.")
             return
         
-        # 중복 확인 여부 검사 (핵심!)
-        if not st.session_state.get('id_checked'):
-            st.error("아이디 중복 확인을 해주세요.")
+        # 중복 확인 버튼에서 이미 사용 중으로 나온 경우
+        if st.session_state.get('id_checked') is False:
+            st.error("이미 사용 중인 아이디입니다.")
             return
-        if not st.session_state.get('email_checked'):
-            st.error("이메일 중복 확인을 해주세요.")
+        if st.session_state.get('email_checked') is False:
+            st.error("이미 사용 중인 이메일입니다.")
             return
             
         if new_pw != new_pw_chk:
@@ -380,40 +440,60 @@ def render_signup_view():
             st.error("필수 약관에 동의해야 합니다.")
             return
             
-        # 가입 로직 수행
+        # 가입 로직 수행: Auth 가입 한 번으로 프로필(users)까지 생성
+        # (auth.users 트리거가 같은 트랜잭션에서 insert, 아이디/이메일 중복이면 전체 롤백 - sql/004_signup_login.sql)
+        profile = {
+            "username": new_username,
+            "name": new_name,
+            "phone": new_phone,
+            "birth_date": str(b_date),
+            "birth_time": str(b_time),
+            "gender": gender,
+            "agree_location": st.session_state.agree_location,
+            "agree_marketing": st.session_state.agree_marketing
+        }
         try:
-            # 1. Auth 가입
-            auth = supabase.auth.sign_up({
+            auth = new_auth_client().auth.sign_up({
                 "email": new_email, "password": new_pw,
-                "options": {"data": {"username": new_username}}
+                "options": {"data": profile}
             })
             
             if auth.user and auth.user.identities:
-                # 2. DB 저장
-                user_data = {
-                    "id": auth.user.id,
-                    "email": new_email,
-                    "username": new_username,
-                    "name": new_name,
-                    "phone": new_phone,
-                    "birth_date": str(b_date),
-                    "birth_time": str(b_time),
-                    "gender": gender,
-                    "agree_location": st.session_state.agree_location,
-                    "agree_marketing": st.session_state.agree_marketing
-                }
-                supabase.table("users").insert(user_data).execute()
                 st.success(f"가입 요청 완료! {new_email}로 발송된 인증 메일을 확인해주세요.")
             else:
                 st.warning("이미 가입된 이메일이거나 요청을 처리할 수 없습니다.")
         except Exception as e:
-            st.error(f"가입 중 오류 발생: {e}")
+            if "Database error saving new user" not in str(e):
+                st.error(f"가입 중 오류 발생: {e}")
+                return
+            # 트리거의 유니크 위반 -> 어느 쪽이 겹쳤는지는 실패했을 때만 확인
+            try:
+                taken = check_signup_available(new_username, new_email)
+            except Exception:
+                taken = {}
+            if taken.get("username_taken"):
+                st.session_state.id_checked = False
+                st.error("이미 사용 중인 아이디입니다.")
+            elif taken.get("email_taken"):
+                st.session_state.email_checked = False
+                st.error("이미 사용 중인 이메일입니다.")
+            else:
+                st.error(f"가입 중 오류 발생: {e}")
 
     st.markdown("---")
     if st.button("로그인 화면으로 돌아가기"):
         st.session_state.auth_mode = 'login'
         st.rerun()
 
+# 세션에 들고 있는 내 프로필 컬럼 (전화/이메일/약관 동의 등은 화면에서 안 씀)
+PROFILE_COLUMNS = "id, name, gender, birth_date, birth_time, saju_elements, subscription_plan"
+
+def analysis_text(name):
+    # 세션에는 캐시 키만 두고 본문은 프로세스 공용 응답 캐시에서 (만료/축출됐으면 None)
+    key = st.session_state.get("analysis_key")
+    text = llm.response_cache.get(key, record=False) if key else None
+    return llm.fill_name(text, name)
+
 # --- [메인 앱 페이지: 매칭 기능 강화 버전] ---
 def main_app_page():
     # 스타일 설정
@@ -423,14 +503,15 @@ def main_app_page():
         .match-card { background-color: #f8f9fa; padding: 15px; border-radius: 10px; margin-bottom: 10px; border: 1px solid #ddd; }
         .match-score { color: #e91e63; font-weight: bold; font-size: 1.2rem; }
         .match-tag { display: inline-block; padding: 2px 8px; border-radius: 12px; font-size: 0.8rem; margin-right: 5px; color: white; }
+        """ + CARD_CSS + """
     </style>
     """, unsafe_allow_html=True)
     
     # 사용자 정보 로드
-    user_id = st.session_state['user'].id
+    user_id = st.session_state['user_id']
     if "db_user_info" not in st.session_state:
         try:
-            data = supabase.table("users").select("*").eq("id", user_id).execute()
+            data = user_db().table("users").select(PROFILE_COLUMNS).eq("id", user_id).execute()
             if data.data:
                 st.session_state['db_user_info'] = data.data[0]
         except:
@@ -445,24 +526,37 @@ def main_app_page():
     # ----------------------------------------------------------------
     # 1. [홈 탭]
     # ----------------------------------------------------------------
-    with tab_home:
+    with tab_home, metrics.span("render", tab="home"):
         st.markdown(f"### 👋 반가워요, **{user_info.get('name', '회원')}**님!")
         
         with st.container(border=True):
             st.markdown("##### 📅 오늘의 한 줄 운세")
-            today_str = datetime.date.today().strftime("%Y-%m-%d")
-            
-            if "today_fortune" not in st.session_state or st.session_state.get("fortune_date") != today_str:
-                try:
-                    short_prompt = f"사용자({user_info.get('name')})를 위해 오늘({today_str})의 운세를 희망찬 이모지와 함께 30자 이내로 작성해."
-                    resp = gemini_client.models.generate_content(model=TARGET_MODEL_NAME, contents=short_prompt)
-                    st.session_state["today_fortune"] = resp.text
-                    st.session_state["fortune_date"] = today_str
-                except:
-                    st.session_state["today_fortune"] = "🍀 오늘은 작은 행운이 깃든 하루가 될 거예요!"
+            today = datetime.date.today()
+            today_str = today.isoformat()
+            natal_day = fortune.day_pillar_of(user_info.get('birth_date'))
+            if ("today_fortune" not in st.session_state or st.session_state.get("fortune_date") != today_str
+                    or time.time() >= st.session_state.get("fortune_retry_at", float("inf"))):
+                # (날짜, 내 일주) 별로 프로세스 공용 캐시에서 가져옴 - 세션마다 LLM 호출하지 않음
+                # Gemini 를 못 쓰면 일진/일간 관계로 바로 계산한 문구 + FORTUNE_RETRY_SEC 뒤에만 다시 확인 (실패 백오프는 fortune.py 에서 프로세스 공용)
+                client = gemini()
+                text = fortune.get_daily_fortune(client, today, natal_day) if client else None
+                st.session_state["today_fortune"] = text or fortune.local_fortune(today, natal_day)
+                st.session_state["fortune_date"] = today_str
+                if text: st.session_state.pop("fortune_retry_at", None)
+                else: st.session_state["fortune_retry_at"] = time.time() + fortune.FORTUNE_RETRY_SEC
             
             st.info(st.session_state["today_fortune"])
 
+            # 오늘의 일진 / 올해 세운 / 현재 대운 (로컬 계산, LLM 호출 없음)
+            now = calculate_saju_pillars(today.year, today.month, today.day, 12, 0)
+            info = f"오늘의 일진 **{now.day.hanja}({now.day.name})일** · 세운 **{now.year.hanja}({now.year.name})년**"
+            birth_dt = luck.birth_datetime(user_info.get('birth_date'), user_info.get('birth_time'))
+            if birth_dt:
+                natal = calculate_saju_pillars(birth_dt.year, birth_dt.month, birth_dt.day, birth_dt.hour, birth_dt.minute)
+                cur = luck.current_daeun(natal, birth_dt, user_info.get('gender'), today)
+                if cur: info += f" · 대운 **{cur.pillar.hanja}({cur.pillar.name})**"
+            st.caption(info)
+
         st.markdown("---")
         st.markdown("#### 🔥 인기 콘텐츠")
         c1, c2 = st.columns(2)
@@ -472,10 +566,14 @@ def main_app_page():
     # ----------------------------------------------------------------
     # 2. [사주분석 탭] + 저장 기능 추가
     # ----------------------------------------------------------------
-    with tab_analysis:
+    with tab_analysis, metrics.span("render", tab="analysis"):
         st.header("🔍 정통 사주 분석")
         
-        if "analysis_result" not in st.session_state:
+        result = analysis_text(user_info.get('name'))
+        if result is None and "analysis_key" in st.session_state:
+            del st.session_state["analysis_key"]
+            st.info("이전 분석 결과가 만료되었습니다. 다시 분석해주세요.")
+        if result is None:
             # [입력 모드]
             st.info("정확한 분석을 위해 정보를 확인해주세요.")
             
@@ -501,38 +599,39 @@ def main_app_page():
             if st.button("🔮 사주 분석 시작하기", type="primary"):
                 # 계산
                 saju = calculate_saju_pillars(input_date.year, input_date.month, input_date.day, input_time.hour, input_time.minute)
-                cnt = {"목":0, "화":0, "토":0, "금":0, "수":0} # 한글 키로 통일
-                for p in saju.values():
-                    if p['gan'] in OHEANG_MAP: cnt[OHEANG_MAP[p['gan']][0]] += 1 # '목(木)' -> '목'
-                    if p['ji'] in OHEANG_MAP: cnt[OHEANG_MAP[p['ji']][0]] += 1
+                cnt = count_elements(saju) # {"목":n, "화":n, ...} 한글 키로 통일
                 
-                st.session_state["saju_result"] = saju
-                st.session_state["element_counts"] = cnt
+                st.session_state["saju_result"] = saju.to_bytes() # 4바이트 코드로 보관 (오행 개수는 여기서 다시 계산)
+                st.session_state["birth_input"] = (input_date.isoformat(), input_time.strftime("%H:%M"), input_gender) # 대운 표시용
                 
-                # AI 호출
-                with st.spinner("운명을 분석 중입니다..."):
-                    try:
-                        u_ctx = {"name": user_info.get('name'), "gender": input_gender, "date": input_date, "time": input_time}
-                        full_saju = f"년주:{saju['year']['gan']}{saju['year']['ji']}, 일주:{saju['day']['gan']}{saju['day']['ji']}"
-                        
-                        prompt_sys = f"너는 사주 전문가야. {u_ctx['name']}님의 사주를 분석해줘. (무료회원용 요약)" if subscription_plan == 'free' else f"너는 사주 전문가야. {u_ctx['name']}님의 사주를 상세히 분석해줘."
-                        prompt_sys += f"\n사주: {full_saju}, 오행: {cnt}"
-                        
-                        resp = gemini_client.models.generate_content(model=TARGET_MODEL_NAME, contents=prompt_sys)
-                        st.session_state["analysis_result"] = resp.text
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"분석 중 오류: {e}")
+                # AI 호출 (스트리밍: 첫 토큰부터 바로 화면에 출력)
+                try:
+                    u_ctx = {"name": user_info.get('name'), "gender": input_gender, "date": input_date, "time": input_time}
+                    
+                    # 같은 명식 + 같은 등급이면 캐시된 풀이 재사용 (이름은 표시 직전에 채움)
+                    prompt_sys = llm.analysis_prompt(saju, cnt, subscription_plan)
+                    key = llm.cache_key("analysis", saju=saju.to_bytes().hex(), plan=llm.plan_tier(subscription_plan))
+                    st.markdown("### 📜 분석 결과")
+                    stream = llm.generate_stream(gemini(), prompt_sys, key, kind="analysis")
+                    st.write_stream(llm.fill_name_stream(stream, u_ctx['name'])) # 다 받으면 generate_stream 이 캐시에 저장
+                    st.session_state["analysis_key"] = key
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"분석 중 오류: {e}")
 
         else:
             # [결과 모드]
             st.success("분석이 완료되었습니다!")
             
             with st.expander("내 사주 명식표 보기", expanded=False):
-                st.markdown(get_saju_card_html(st.session_state["saju_result"]), unsafe_allow_html=True)
+                st.markdown(card_html(st.session_state["saju_result"]), unsafe_allow_html=True)
+                st.markdown(relations_md(Saju.from_bytes(st.session_state["saju_result"])))
+                if "birth_input" in st.session_state:
+                    b_date, b_time, b_gender = st.session_state["birth_input"]
+                    st.markdown(daeun_table_md(Saju.from_bytes(st.session_state["saju_result"]), luck.birth_datetime(b_date, b_time), b_gender))
             
             st.markdown("### 📜 분석 결과")
-            st.write(st.session_state["analysis_result"])
+            st.write(result)
             
             # [핵심] 매칭 정보 저장 버튼
             st.markdown("---")
@@ -541,20 +640,22 @@ def main_app_page():
             if st.button("💾 이 사주 결과를 '내 매칭 정보'로 저장하기"):
                 try:
                     # 1. 현재 세션에 로그인된 실제 유저 객체에서 ID를 직접 추출
-                    user_id_to_update = st.session_state['user'].id 
+                    user_id_to_update = st.session_state['user_id']
+                    element_counts = count_elements(Saju.from_bytes(st.session_state["saju_result"]))
                     
                     # 2. 업데이트 실행 전 데이터 확인 로그 (개발자용)
                     st.write(f"로그인 유저 ID: {user_id_to_update}")
-                    st.write("저장될 오행 데이터:", st.session_state["element_counts"])
+                    st.write("저장될 오행 데이터:", element_counts)
 
                     # 3. DB 업데이트 실행 (.eq 조건을 확실히 명시)
-                    response = supabase.table("users").update({
-                        "saju_elements": st.session_state["element_counts"]
+                    response = user_db().table("users").update({
+                        "saju_elements": element_counts
                     }).eq("id", user_id_to_update).execute()
                     
                     # 4. 결과 판독
                     if len(response.data) > 0:
-                        st.session_state['db_user_info']['saju_elements'] = st.session_state["element_counts"]
+                        if 'db_user_info' in st.session_state: st.session_state['db_user_info']['saju_elements'] = element_counts
+                        candidate_cache.upsert(response.data[0]) # 매칭 후보 캐시에 바로 반영
                         st.success("✅ DB에 성공적으로 기록되었습니다! 이제 매칭 탭을 확인하세요.")
                     else:
                         # 이 메시지가 뜬다면, DB에 해당 UUID를 가진 행이 진짜로 없는 것입니다.
@@ -569,13 +670,13 @@ def main_app_page():
             
             st.markdown("<br>", unsafe_allow_html=True)
             if st.button("🔄 다시 분석하기"):
-                del st.session_state["analysis_result"]
+                del st.session_state["analysis_key"]
                 st.rerun()
 
     # ----------------------------------------------------------------
     # 3. [매칭 탭] 알고리즘 구현
     # ----------------------------------------------------------------
-    with tab_match:
+    with tab_match, metrics.span("render", tab="match"):
         st.header("💞 운명의 상대 매칭")
         
         # 1. 내 정보가 있는지 확인
@@ -589,54 +690,15 @@ def main_app_page():
             st.write(f"**{user_info.get('name')}**님에게 부족한 기운을 채워줄 귀인을 찾습니다...")
             
             try:
-                # 나를 제외한 유저 불러오기 (실무에선 페이지네이션 필요)
-                candidates_query = supabase.table("users").select("*").neq("id", user_id).execute()
-                candidates = candidates_query.data
+                # 점수 계산은 DB 함수(match_candidates)에서, 상위 5명만 받아옴
+                client = get_service_supabase() if MATCH_ENGINE == "rpc" else db()
+                matches = fetch_matches(client, user_id, user_info, engine=MATCH_ENGINE)
                 
-                if not candidates:
+                if not matches:
                     st.info("아직 매칭할 다른 회원이 없습니다. 친구를 초대해보세요!")
                 else:
-                    # [매칭 알고리즘]
-                    matches = []
-                    my_lacks = [k for k, v in my_elements.items() if v == 0] # 내가 없는 오행
-                    
-                    for cand in candidates:
-                        cand_elements = cand.get('saju_elements')
-                        if not cand_elements: continue # 정보 없는 유저 패스
-                        
-                        score = 50 # 기본 점수
-                        
-                        # 1) 성별 매칭 (이성에게 가산점)
-                        if user_info.get('gender') != cand.get('gender'):
-                            score += 20
-                            
-                        # 2) 오행 보완 (내가 없는 걸 상대가 3개 이상 가졌으면 대박)
-                        bonus_txt = []
-                        for lack in my_lacks:
-                            if cand_elements.get(lack, 0) >= 3:
-                                score += 30
-                                bonus_txt.append(f"부족한 '{lack}' 기운 가득!")
-                            elif cand_elements.get(lack, 0) >= 1:
-                                score += 10
-                        
-                        # 3) 과다 조심 (나도 많고 쟤도 많으면 감점)
-                        for k, v in my_elements.items():
-                            if v >= 3 and cand_elements.get(k, 0) >= 3:
-                                score -= 10
-                        
-                        matches.append({
-                            "name": cand.get('name', '익명'),
-                            "gender": cand.get('gender', '-'),
-                            "score": min(score, 100), # 100점 만점
-                            "bonus": ", ".join(bonus_txt),
-                            "birth_year": cand.get('birth_date', '????')[:4]
-                        })
-                    
-                    # 점수순 정렬
-                    matches.sort(key=lambda x: x['score'], reverse=True)
-                    
                     # 리스트 출력
-                    for m in matches[:5]: # 상위 5명만
+                    for m in matches:
                         with st.container():
                             col_av, col_info, col_score = st.columns([1, 3, 1])
                             with col_av:
@@ -645,6 +707,8 @@ def main_app_page():
                                 st.markdown(f"**{m['name']}** ({m['gender']}, {m['birth_year']}년생)")
                                 if m['bonus']:
                                     st.caption(f"✨ {m['bonus']}")
+                                if m.get('relation'):
+                                    st.caption(f"☯️ {m['relation']}")
                             with col_score:
                                 st.markdown(f"<div style='color:#e91e63; font-weight:bold;'>{m['score']}점</div>", unsafe_allow_html=True)
                             st.divider()
@@ -655,7 +719,7 @@ def main_app_page():
     # ----------------------------------------------------------------
     # 4. [내 정보 탭]
     # ----------------------------------------------------------------
-    with tab_my:
+    with tab_my, metrics.span("render", tab="my"):
         st.header("내 정보")
         st.write(f"**이름:** {user_info.get('name')}")
         st.write(f"**등급:** {'💎 PRO' if subscription_plan == 'pro' else '🌱 FREE'}")
@@ -667,18 +731,53 @@ def main_app_page():
         
         st.divider()
         if st.button("로그아웃"):
-            supabase.auth.sign_out()
+            revoke_session(st.session_state.get('auth_tokens'))
             st.session_state.clear()
             st.rerun()
 
 # --- [앱 실행 진입점] ---
+def record_rerun(elapsed, page):
+    metrics.observe("rerun_seconds", elapsed, page=page)
+    with perf_lock():
+        stats = perf_stats()
+        stats["reruns"] += 1
+        stats["rerun_total_sec"] += elapsed
+        stats["rerun_last_sec"] = elapsed
+        stats["rerun_max_sec"] = max(stats["rerun_max_sec"], elapsed)
+    perf_log.info("rerun %.1fms (import %.1fms)", elapsed * 1000, IMPORT_SEC * 1000)
+
+def health_requested():
+    # 운영 상태(세션/캐시/호출 수)는 HEALTH_TOKEN 을 설정했을 때만, ?health=<토큰> 이 일치할 때 공개
+    token, given = get_secret("HEALTH_TOKEN"), st.query_params.get("health")
+    return bool(token and given) and hmac.compare_digest(str(given).encode(), str(token).encode())
+
 if __name__ == "__main__":
     st.set_page_config(page_title="AI 사주 매칭", page_icon="🔮", layout="wide")
+
+    if health_requested():
+        st.json({"health": health_check(), "perf": perf_snapshot(), "llm_cache": llm.response_cache.metrics(), "sessions": sessions.registry.report(),
+                 "gemini_pool": llm.gemini_pool.metrics(), "llm_usage": llm.usage.metrics(), "match_cache": candidate_cache.metrics(), "match_stream": stream_metrics(),
+                 "metrics": metrics.summary() if metrics.ENABLED else None})
+        st.stop()
     
     if 'is_logged_in' not in st.session_state:
         st.session_state['is_logged_in'] = False
 
-    if not st.session_state['is_logged_in']:
-        login_page()
-    else:
-        main_app_page()
\ No newline at end of file
+    metrics_server()
+    metrics.new_trace()
+    # 세션 크기 예산 / 유휴 세션 정리 (sessions.py)
+    session_id = sessions.session_key(st.session_state)
+    tokens = st.session_state.get('auth_tokens') # touch 가 유휴 세션을 비우기 전에 (서버 쪽 세션도 폐기)
+    if sessions.registry.touch(session_id, st.session_state):
+        revoke_session(tokens)
+        st.session_state['is_logged_in'] = False
+        st.info("오랫동안 사용하지 않아 로그아웃되었습니다. 다시 로그인해주세요.")
+    page = "main" if st.session_state['is_logged_in'] else "login"
+    try:
+        if page == "login":
+            login_page()
+        else:
+            main_app_page()
+    finally:
+        sessions.registry.record(session_id, st.session_state)
+        record_rerun(time.perf_counter() - _t_import, page)
@@ -0,0 +1,138 @@
+# backfill.py
+# 기존 유저의 saju_elements 일괄 계산/저장 (Streamlit 의존성 없음)
+#   users 를 id 순 키셋 페이지로 읽고 -> NumPy 배치로 사주/오행 계산 -> RPC 한 번으로 배치 저장
+#   (sql/003_backfill_saju_elements.sql 필요, service_role 키로 실행)
+#   배치 저장이 끝날 때마다 마지막 id 를 체크포인트 파일에 기록하므로 중단 후 다시 실행하면 이어서 진행
+#   (체크포인트는 모드별 파일. 끝까지 돈 실행은 done 으로 표시되어 다음 실행은 처음부터 새로 스캔)
+#
+# 실행: python -m backfill [--all] [--dry-run] [--page-size 1000] [--restart]
+import argparse
+import datetime
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from saju import ELEMENT_KEYS, calculate_saju_pillars_batch, count_elements_batch
+
+PAGE_SIZE = 1000
+CHECKPOINT_DIR = ".cache"
+DEFAULT_TIME = (12, 0) # 태어난 시간이 없으면 사주분석 탭 기본값(12:00)과 동일하게 계산
+
+def parse_birth(row):
+    # -> (date, hour, minute), 생년월일이 없거나 형식이 틀리면 None
+    try:
+        d = datetime.date.fromisoformat(str(row.get('birth_date') or '')[:10])
+    except ValueError:
+        return None
+    t = row.get('birth_time')
+    if not t: return d, *DEFAULT_TIME
+    try:
+        parts = str(t).split(":")
+        return d, int(parts[0]) % 24, int(parts[1]) if len(parts) > 1 else 0
+    except ValueError:
+        return d, *DEFAULT_TIME
+
+def compute_elements(rows):
+    # users 행 목록 -> ([{"id", "saju_elements"}, ...], 건너뛴 행 수)
+    valid, births = [], []
+    for r in rows:
+        b = parse_birth(r)
+        if b is None: continue
+        valid.append(r['id'])
+        births.append(b)
+    if not births: return [], len(rows)
+    dates, hours, minutes = zip(*births)
+    counts = count_elements_batch(calculate_saju_pillars_batch(np.array(dates, dtype="datetime64[D]"), hours, minutes))
+    out = [{"id": uid, "saju_elements": dict(zip(ELEMENT_KEYS, c))} for uid, c in zip(valid, counts.tolist())]
+    return out, len(rows) - len(out)
+
+def fetch_page(supabase, after_id, page_size, only_missing=True):
+    q = supabase.table("users").select("id, birth_date, birth_time")
+    if only_missing: q = q.is_("saju_elements", "null")
+    if after_id: q = q.gt("id", after_id)
+    return q.order("id").limit(page_size).execute().data
+
+def write_batch(supabase, batch):
+    return supabase.rpc("backfill_saju_elements", {"p_rows": batch}).execute().data
+
+def load_checkpoint(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_checkpoint(path, state):
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path) # 중간에 죽어도 체크포인트 파일이 깨지지 않도록
+
+def checkpoint_path_for(only_missing):
+    # 모드(--all 여부)마다 따로: 누락분만 채우던 체크포인트로 전체 재계산을 이어가지 않도록
+    return os.path.join(CHECKPOINT_DIR, f"backfill_checkpoint_{'missing' if only_missing else 'all'}.json")
+
+def backfill(supabase, page_size=PAGE_SIZE, only_missing=True, dry_run=False, checkpoint_path=None, restart=False, log=print):
+    checkpoint_path = checkpoint_path or checkpoint_path_for(only_missing)
+    mode = "missing" if only_missing else "all"
+    state = {} if restart else load_checkpoint(checkpoint_path)
+    if state.get("done") or state.get("mode", mode) != mode: state = {} # 끝난 실행 / 다른 모드 -> 새로 스캔
+    state.update(mode=mode, done=False)
+    state.setdefault("last_id", None)
+    for k in ("scanned", "computed", "updated", "skipped"): state.setdefault(k, 0)
+    if state["last_id"]: log(f"체크포인트에서 이어서 진행: id > {state['last_id']} ({state['scanned']:,}행 처리됨)")
+
+    base = dict(state) # 처리 속도는 이번 실행분만으로 계산
+    start = time.perf_counter()
+    compute_sec = 0.0
+    pending = None # (future, 해당 배치 이후 상태) - 저장은 다음 페이지 조회와 겹쳐서 진행
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        def finish(pending):
+            future, after = pending
+            updated = future.result() if future else 0
+            after["updated"] += updated or 0
+            state.update(after)
+            if not dry_run: save_checkpoint(checkpoint_path, state)
+
+        while True:
+            rows = fetch_page(supabase, state["last_id"] if pending is None else pending[1]["last_id"], page_size, only_missing)
+            if not rows: break
+            t0 = time.perf_counter()
+            batch, skipped = compute_elements(rows)
+            compute_sec += time.perf_counter() - t0
+
+            if pending: finish(pending)
+            after = {**state, "last_id": rows[-1]['id'], "scanned": state["scanned"] + len(rows),
+                     "computed": state["computed"] + len(batch), "skipped": state["skipped"] + skipped}
+            future = writer.submit(write_batch, supabase, batch) if batch and not dry_run else None
+            pending = (future, after)
+
+            elapsed = time.perf_counter() - start
+            log(f"{after['scanned']:,}행 ({(after['scanned'] - base['scanned']) / elapsed:,.0f} rows/s,"
+                f" 계산만 {(after['computed'] - base['computed']) / max(compute_sec, 1e-9):,.0f} rows/s)")
+            if len(rows) < page_size: break
+        if pending: finish(pending)
+    state["done"] = True # 마지막 페이지까지 처리 -> 다음 실행은 처음부터 (그 사이 추가된 행 포함)
+    if not dry_run: save_checkpoint(checkpoint_path, state)
+
+    elapsed = time.perf_counter() - start
+    log(f"완료: 조회 {state['scanned']:,} / 계산 {state['computed']:,} / 저장 {state['updated']:,} / 건너뜀 {state['skipped']:,}"
+        f" - {elapsed:.1f}s, {(state['scanned'] - base['scanned']) / max(elapsed, 1e-9):,.0f} rows/s")
+    return state
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from supabase import create_client
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="users.saju_elements 일괄 계산/저장")
+    parser.add_argument("--all", action="store_true", help="이미 값이 있는 행도 다시 계산 (값이 같으면 저장 안 함)")
+    parser.add_argument("--dry-run", action="store_true", help="계산만 하고 저장/체크포인트 기록 안 함")
+    parser.add_argument("--page-size", type=int, default=PAGE_SIZE)
+    parser.add_argument("--checkpoint", default=None, help="기본: .cache/backfill_checkpoint_<missing|all>.json")
+    parser.add_argument("--restart", action="store_true", help="체크포인트 무시하고 처음부터")
+    args = parser.parse_args()
+    # 다른 유저 행을 쓰므로 service_role 키 필요 (RLS 우회 + RPC 실행 권한)
+    key = os.getenv("SUPABASE_SERVICE_KEY") or os.getenv("SUPABASE_KEY")
+    backfill(create_client(os.getenv("SUPABASE_URL"), key), args.page_size, not args.all, args.dry_run, args.checkpoint, args.restart)
@@ -0,0 +1,44 @@
+# bench/bench_card.py
+# 명식 카드 HTML 벤치마크 (기존 문자열 += vs 조각 join + LRU): python -m bench.bench_card [명식 수]
+import sys
+import textwrap
+import time
+from bench.bench_saju import random_births
+from saju import Saju, calculate_saju_pillars_batch
+from saju_card import CARD_STYLE, card_html, _card_html
+
+def card_html_loop(saju):
+    # 기존 app.py 의 문자열 += 버전 (비교 기준, 스타일 포함)
+    pillars = [saju.time, saju.day, saju.month, saju.year]
+    headers = ["시주 (時)", "일주 (日)", "월주 (月)", "년주 (年)"]
+    html = '<div class="saju-wrapper">'
+    for i, p in enumerate(pillars):
+        html += f"""<div class="pillar-card"><div class="card-header">{headers[i]}</div><div class="char-section" style="background-color:{p.gan_color}"><div class="char-big">{p.gan_hanja}</div><div class="char-desc">{p.gan}:{p.gan_element}</div><div class="char-tag">{p.gan_label}</div></div><div class="char-section" style="background-color:{p.ji_color}"><div class="char-big">{p.ji_hanja}</div><div class="char-desc">{p.ji}:{p.ji_element}</div><div class="char-tag">{p.ji_label}</div></div><div class="card-footer">오행:{p.gan_element[0]}/{p.ji_element[0]}</div></div>"""
+    return textwrap.dedent(CARD_STYLE + html + '</div>')
+
+def per_call_us(fn, items):
+    t0 = time.perf_counter()
+    for x in items: fn(x)
+    return (time.perf_counter() - t0) / len(items) * 1e6
+
+def main(n=20000):
+    dates, hours, minutes = random_births(n)
+    charts = [Saju.from_indices(row) for row in calculate_saju_pillars_batch(dates, hours, minutes)]
+
+    for s in charts[:2000]:
+        if CARD_STYLE + card_html(s) != card_html_loop(s):
+            raise AssertionError(f"불일치: {s}")
+    print("기존 출력과 일치 확인: 2,000건")
+
+    _card_html.cache_clear()
+    loop_us = per_call_us(card_html_loop, charts)
+    cold_us = per_call_us(card_html, charts) # 대부분 처음 보는 명식 (조각 join)
+    hot = charts[:100] * (n // 100) # 같은 명식 반복 (리런/여러 탭)
+    warm_us = per_call_us(card_html, hot)
+    print(f"기존 += + dedent : {loop_us:7.2f} us/회")
+    print(f"조각 join (미스) : {cold_us:7.2f} us/회 ({loop_us / cold_us:.1f}x)")
+    print(f"LRU 적중         : {warm_us:7.2f} us/회 ({loop_us / warm_us:.1f}x)")
+    print(f"LRU: {_card_html.cache_info()}")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000)
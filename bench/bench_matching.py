@@ -0,0 +1,59 @@
+# bench/bench_matching.py
+# 매칭 스코어링 벤치마크 (기존 dict 루프 vs NumPy 직접 계산 vs 궁합표 조회): python -m bench.bench_matching
+import sys
+import time
+import numpy as np
+from saju import ELEMENT_KEYS, calculate_saju_pillars_batch, count_elements_batch
+from matching import CandidatePool, score_candidates_loop, stream_top_k, stream_metrics
+
+GENDERS = ["여성", "남성", "선택 안 함"]
+
+def random_candidates(n, seed=0):
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("1960-01-01").astype(np.int64)
+    end = np.datetime64("2005-12-31").astype(np.int64)
+    dates = rng.integers(start, end + 1, n).astype("datetime64[D]")
+    counts = count_elements_batch(calculate_saju_pillars_batch(dates, rng.integers(0, 24, n)))
+    genders = rng.choice(len(GENDERS), n, p=[0.48, 0.48, 0.04])
+    return [
+        {"id": f"u{i}", "name": f"회원{i}", "gender": GENDERS[g], "birth_date": str(d),
+         "saju_elements": dict(zip(ELEMENT_KEYS, c))}
+        for i, (d, g, c) in enumerate(zip(dates.tolist(), genders.tolist(), counts.tolist()))
+    ]
+
+def timed(fn, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - t0)
+    return best, result
+
+def pages(rows, size=500):
+    for i in range(0, len(rows), size): yield rows[i:i + size]
+
+def main(sizes=(10_000, 100_000, 1_000_000)):
+    me = {"gender": "여성", "saju_elements": {"목": 0, "화": 3, "토": 2, "금": 0, "수": 3}}
+    print(f"{'후보 수':>10} | {'dict 루프':>10} | {'행렬 변환':>10} | {'직접 계산':>10} | {'궁합표 top-5':>11} | {'스트림 top-5':>11} | 페이지 | 배속")
+    for n in sizes:
+        candidates = random_candidates(n)
+        t_loop, expected = timed(lambda: score_candidates_loop(me, candidates), repeat=1 if n >= 1_000_000 else 3)
+        t_build, pool = timed(lambda: CandidatePool(candidates), repeat=1)
+        t_direct, direct = timed(lambda: pool.scores_direct(me["saju_elements"], me["gender"]))
+        t_np, got = timed(lambda: pool.top_k(me["saju_elements"], me["gender"]))
+        scanned = stream_metrics()["pages"]
+        t_stream, streamed = timed(lambda: stream_top_k(pages(candidates), me["saju_elements"], me["gender"]), repeat=1)
+        scanned = stream_metrics()["pages"] - scanned
+        if got != expected or streamed != expected or not np.array_equal(direct, pool.scores(me["saju_elements"], me["gender"])):
+            raise AssertionError(f"결과 불일치 (n={n}):\n{got}\n{expected}")
+        # 본인 제외: 1등 후보를 빼면 루프 결과에서 그 후보를 뺀 것과 같아야 함
+        top_id = next(c["id"] for c in candidates if c["name"] == expected[0]["name"])
+        expected_ex = score_candidates_loop(me, [c for c in candidates if c["id"] != top_id])
+        got_ex = pool.top_k(me["saju_elements"], me["gender"], exclude_id=top_id)
+        streamed_ex = stream_top_k(pages(candidates), me["saju_elements"], me["gender"], exclude_id=top_id)
+        if got_ex != expected_ex or streamed_ex != expected_ex:
+            raise AssertionError(f"exclude_id 결과 불일치 (n={n}):\n{got_ex}\n{expected_ex}")
+        print(f"{n:>10,} | {t_loop * 1000:>8.1f}ms | {t_build * 1000:>8.1f}ms | {t_direct * 1000:>8.2f}ms | {t_np * 1000:>9.2f}ms | {t_stream * 1000:>9.2f}ms | {scanned:>6,} | x{t_loop / t_np:,.0f}")
+
+if __name__ == "__main__":
+    main(tuple(int(a) for a in sys.argv[1:]) or (10_000, 100_000, 1_000_000))
@@ -0,0 +1,48 @@
+# bench/bench_saju.py
+# 사주 배치 계산 벤치마크: python -m bench.bench_saju [행 수]
+import sys
+import time
+import numpy as np
+from saju import calculate_saju_pillars, calculate_saju_pillars_batch, count_elements_batch, Saju
+
+def random_births(n, seed=0):
+    rng = np.random.default_rng(seed)
+    start = np.datetime64("1900-01-01").astype(np.int64)
+    end = np.datetime64("2030-12-31").astype(np.int64)
+    dates = rng.integers(start, end + 1, n).astype("datetime64[D]")
+    hours = rng.integers(0, 24, n)
+    minutes = rng.integers(0, 60, n)
+    return dates, hours, minutes
+
+def check_against_scalar(dates, hours, minutes, sample=20000):
+    # 스칼라 함수와 결과가 같은지 샘플 검증
+    pillars = calculate_saju_pillars_batch(dates[:sample], hours[:sample], minutes[:sample])
+    for d, h, m, row in zip(dates[:sample].tolist(), hours[:sample].tolist(), minutes[:sample].tolist(), pillars):
+        expected = calculate_saju_pillars(d.year, d.month, d.day, h, m)
+        if Saju.from_indices(row) != expected:
+            raise AssertionError(f"불일치: {d} {h}:{m} -> {Saju.from_indices(row)} != {expected}")
+    return min(sample, len(dates))
+
+def main(n=1_000_000):
+    dates, hours, minutes = random_births(n)
+    checked = check_against_scalar(dates, hours, minutes)
+    print(f"스칼라 결과 일치 확인: {checked:,}건")
+
+    t0 = time.perf_counter()
+    for d, h, m in zip(dates[:50000].tolist(), hours[:50000].tolist(), minutes[:50000].tolist()):
+        calculate_saju_pillars(d.year, d.month, d.day, h, m)
+    scalar_rate = 50000 / (time.perf_counter() - t0)
+
+    t0 = time.perf_counter()
+    pillars = calculate_saju_pillars_batch(dates, hours, minutes)
+    t_pillars = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    count_elements_batch(pillars)
+    t_counts = time.perf_counter() - t0
+
+    print(f"스칼라   : {scalar_rate:>14,.0f} rows/s")
+    print(f"배치     : {n / t_pillars:>14,.0f} rows/s ({n:,}건, {t_pillars * 1000:.1f} ms)")
+    print(f"오행집계 : {n / t_counts:>14,.0f} rows/s")
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
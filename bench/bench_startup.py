@@ -0,0 +1,78 @@
+# bench/bench_startup.py
+# 콜드스타트 벤치마크: python -m bench.bench_startup [--budget-ms 3000]
+# - python -X importtime 으로 app.py import 비용을 모듈별로 집계 (새 프로세스)
+# - AppTest 로 로그인 화면 첫 렌더링까지 걸린 시간 측정 (새 프로세스)
+# - 무거운 의존성이 app import 시점에 올라오거나 예산을 넘으면 종료코드 1
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 탭에서 처음 쓸 때 import 되어야 하는 모듈 (streamlit 자체가 올리는 것을 빼고 app import 시점에 보이면 회귀)
+LAZY_MODULES = ["pandas", "plotly", "google.genai", "supabase"]
+# 외부 연결 없이 app.py 를 실행하기 위한 더미 설정
+DUMMY_ENV = {"GEMINI_API_KEY": "dummy", "SUPABASE_URL": "https://example.supabase.co", "SUPABASE_KEY": "dummy", "MATCH_ENGINE": "rpc"}
+
+def _env():
+    env = dict(os.environ)
+    for k, v in DUMMY_ENV.items():
+        env.setdefault(k, v)
+    return env
+
+def import_report(module="app"):
+    # [(누적 us, 자기 us, 깊이, 모듈명), ...] (importtime 출력 순서)
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"], cwd=ROOT, env=_env(),
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line: continue
+        self_us, cum_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(cum_us), int(self_us), depth, name.strip()))
+    return rows
+
+def first_render_sec():
+    code = ("import time; t = time.perf_counter()\n"
+            "from streamlit.testing.v1 import AppTest\n"
+            "at = AppTest.from_file('app.py', default_timeout=60).run()\n"
+            "assert not at.exception, at.exception\n"
+            "print(time.perf_counter() - t)")
+    proc = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=_env(), capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr[-2000:])
+    return float(proc.stdout.strip().splitlines()[-1])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="app.py 콜드스타트 측정")
+    parser.add_argument("--budget-ms", type=float, default=None, help="app import 누적 시간 상한 (넘으면 실패)")
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    rows = import_report()
+    wall = time.perf_counter() - t0
+    app_row = next(r for r in rows if r[3] == "app")
+    print(f"app import 누적: {app_row[0] / 1000:.1f}ms (프로세스 전체 {wall * 1000:.0f}ms)")
+    print(f"{'누적ms':>9} {'자기ms':>8}  모듈")
+    for cum, own, depth, name in sorted((r for r in rows if r[2] <= 2), reverse=True)[:args.top]:
+        print(f"{cum / 1000:9.1f} {own / 1000:8.1f}  {'  ' * depth}{name}")
+
+    print(f"첫 렌더링 (로그인 화면): {first_render_sec() * 1000:.0f}ms")
+
+    failed = False
+    loaded = {r[3] for r in rows} - {r[3] for r in import_report("streamlit")}
+    eager = [m for m in LAZY_MODULES if m in loaded]
+    if eager:
+        print(f"실패: 지연 로딩 대상이 app import 시점에 로드됨: {', '.join(eager)}")
+        failed = True
+    if args.budget_ms is not None and app_row[0] / 1000 > args.budget_ms:
+        print(f"실패: app import {app_row[0] / 1000:.1f}ms > 예산 {args.budget_ms:.0f}ms")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+# bench/bench_suite.py
+# 핫패스 벤치마크 모음 (오프라인, 결정적 입력): python -m bench.bench_suite [--users N] [--sessions S] [--json out.json] [--compare base.json]
+#
+# - 사주 계산 (단건), 오행 개수, 매칭 스코어링 (dict 루프 / CandidatePool), 명식 카드 HTML
+# - app.py 로그인 화면 / main_app_page 렌더링 (AppTest + bench.fakes 의 Supabase/Gemini 대역)
+# 각 항목은 워밍업 1회 후 --repeat 번 측정한 중앙값. 입력은 고정 시드라 커밋 간 수치 비교가 가능하다.
+# --compare 로 이전 결과(JSON)를 주면 --tolerance 이상 느려진 항목을 표시하고 종료코드 1
+import argparse
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 외부 연결 없이 app.py 실행: 더미 키 + LLM 디스크 캐시 끄기 (매 실행 같은 조건)
+BENCH_ENV = {"GEMINI_API_KEY": "dummy", "SUPABASE_URL": "https://example.supabase.co", "SUPABASE_KEY": "dummy", "SUPABASE_SERVICE_KEY": "dummy",
+             "MATCH_ENGINE": "rpc", "LLM_CACHE_PATH": ""}
+for _k, _v in BENCH_ENV.items(): os.environ.setdefault(_k, _v)
+
+import numpy as np
+from bench.bench_saju import random_births
+from bench.bench_matching import random_candidates
+from bench.fakes import PASSWORD, FakeGemini, FakeSupabase, install
+from saju import Saju, calculate_saju_pillars, calculate_saju_pillars_batch, count_elements
+from saju_card import card_html, _card_html
+from matching import CandidatePool, score_candidates_loop
+
+ME = {"gender": "여성", "saju_elements": {"목": 0, "화": 3, "토": 2, "금": 0, "수": 3}}
+
+def measure(fn, repeat):
+    # 워밍업 1회 + repeat 회 중앙값 (GC 는 측정 중 끔)
+    fn()
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        gc.disable()
+        try:
+            t0 = time.perf_counter()
+            fn()
+            times.append(time.perf_counter() - t0)
+        finally:
+            gc.enable()
+    return statistics.median(times)
+
+# --- [순수 계산] ---
+def bench_compute(args):
+    n = args.births
+    dates, hours, minutes = random_births(n)
+    births = [(d.year, d.month, d.day, h, m) for d, h, m in zip(dates.tolist(), hours.tolist(), minutes.tolist())]
+    charts = [Saju.from_indices(row) for row in calculate_saju_pillars_batch(dates, hours, minutes)]
+    candidates = random_candidates(args.users)
+    pool = CandidatePool(candidates)
+
+    def pillars():
+        for b in births: calculate_saju_pillars(*b)
+
+    def elements():
+        for s in charts: count_elements(s)
+
+    def cards():
+        _card_html.cache_clear()
+        for s in charts: card_html(s)
+
+    yield "saju_pillars", measure(pillars, args.repeat) / n * 1e6, "us/건"
+    yield "count_elements", measure(elements, args.repeat) / n * 1e6, "us/건"
+    yield "card_html_miss", measure(cards, args.repeat) / n * 1e6, "us/건"
+    yield "match_loop", measure(lambda: score_candidates_loop(ME, candidates), args.repeat) * 1000, f"ms/요청 ({args.users:,}명)"
+    yield "match_pool_build", measure(lambda: CandidatePool(candidates), 1) * 1000, f"ms ({args.users:,}명)"
+    yield "match_pool_top5", measure(lambda: pool.top_k(ME["saju_elements"], ME["gender"]), args.repeat) * 1000, f"ms/요청 ({args.users:,}명)"
+
+# --- [AppTest 렌더링] ---
+def _logged_in(at, fake, i):
+    row = fake.user(i)
+    at.session_state["is_logged_in"] = True
+    at.session_state["user_id"] = fake.auth.sign_in_with_password({"email": row["email"], "password": PASSWORD}).user.id
+    return at
+
+def bench_app(args):
+    import streamlit as st
+    from streamlit.testing.v1 import AppTest
+    fake = FakeSupabase(seed=args.seed).seed_users(args.users, seed=args.seed)
+    gemini = FakeGemini(seed=args.seed)
+    app_path = os.path.join(ROOT, "app.py")
+    sessions = min(args.sessions, args.users)
+
+    def new_app():
+        return AppTest.from_file(app_path, default_timeout=120)
+
+    def check(at):
+        if at.exception: raise RuntimeError(f"app 예외: {at.exception}")
+        return at
+
+    with install(fake, gemini):
+        st.cache_resource.clear()
+        st.cache_data.clear()
+        check(new_app().run()) # 리소스 초기화/모듈 로딩은 측정 밖에서
+        yield "app_login_render", measure(lambda: check(new_app().run()), args.repeat) * 1000, "ms/세션"
+
+        def main_pages():
+            for i in range(sessions): check(_logged_in(new_app(), fake, i).run())
+        yield "app_main_render", measure(main_pages, max(1, args.repeat // 2)) / sessions * 1000, f"ms/세션 ({sessions}세션)"
+
+        at = check(_logged_in(new_app(), fake, 0).run())
+        yield "app_main_rerun", measure(lambda: check(at.run()), args.repeat) * 1000, "ms/리런"
+
+# --- [결과] ---
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        return None
+
+def compare(results, baseline, tolerance):
+    # 느려진 항목 [(이름, 이전, 지금, 비율)] (값이 작을수록 좋음)
+    slower = []
+    for name, r in results.items():
+        base = baseline.get("results", {}).get(name)
+        if base and base["value"] > 0 and r["value"] > base["value"] * (1 + tolerance):
+            slower.append((name, base["value"], r["value"], r["value"] / base["value"]))
+    return slower
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="핫패스 벤치마크 모음 (오프라인)")
+    parser.add_argument("--users", type=int, default=10_000, help="회원 수 (매칭 후보 / 가짜 DB)")
+    parser.add_argument("--births", type=int, default=20_000, help="사주/카드 계산 입력 수")
+    parser.add_argument("--sessions", type=int, default=5, help="main_app_page 렌더링 세션 수")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--only", choices=["compute", "app"], default=None)
+    parser.add_argument("--json", default=None, help="결과 저장 경로")
+    parser.add_argument("--compare", default=None, help="비교할 이전 결과 JSON")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="이 비율 이상 느려지면 회귀 (0.25 = 25%%)")
+    args = parser.parse_args(argv)
+
+    groups = {"compute": bench_compute, "app": bench_app}
+    results = {}
+    print(f"{'항목':<20} {'값':>10}  단위")
+    for key, group in groups.items():
+        if args.only and args.only != key: continue
+        for name, value, unit in group(args):
+            results[name] = {"value": round(value, 4), "unit": unit}
+            print(f"{name:<20} {value:>10.3f}  {unit}")
+
+    report = {
+        "meta": {"commit": git_commit(), "python": platform.python_version(), "numpy": np.__version__,
+                 "machine": platform.machine(), "args": vars(args)},
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"저장: {args.json}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            slower = compare(results, json.load(f), args.tolerance)
+        for name, before, now, ratio in slower:
+            print(f"회귀: {name} {before:.3f} -> {now:.3f} ({ratio:.2f}x)")
+        if slower: return 1
+        print(f"회귀 없음 (허용 {args.tolerance:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
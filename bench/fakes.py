@@ -0,0 +1,304 @@
+# bench/fakes.py
+# 오프라인 벤치마크/부하 테스트용 Supabase / Gemini 대역 (네트워크 없이 app.py 를 그대로 실행)
+#
+# FakeSupabase: app/matching/backfill 이 쓰는 PostgREST 빌더 부분집합
+#   (select/eq/gt/is_/not_/or_/order/limit/update/insert/execute) + rpc 4종 + auth (가입/로그인/세션 설정/로그아웃/재설정 메일)
+# FakeGemini : genai.Client 와 같은 모양 (models.generate_content / generate_content_stream / get)
+#   응답은 입력 해시로 결정적 -> 커밋 간 비교 가능
+# latency 는 호출당 sleep 초 (숫자 또는 (최소, 최대) 균등분포) -> 네트워크/모델 지연 흉내
+# install() 은 supabase.create_client / google.genai.Client 를 대역으로 바꾼다
+#   (app.py 는 클라이언트를 만드는 시점에 import 하므로 앱 코드는 그대로)
+import contextlib
+import hashlib
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from matching import MATCH_COLUMNS, score_candidates_loop
+from bench.bench_matching import random_candidates
+
+PASSWORD = "password" # seed_users 로 만든 계정 공통 비밀번호
+
+def _sleep(latency, rng):
+    if not latency: return
+    time.sleep(rng.uniform(*latency) if isinstance(latency, tuple) else latency)
+
+# --- [Supabase: PostgREST 빌더] ---
+def _parse_value(raw):
+    raw = raw.strip('"')
+    return None if raw == "null" else raw
+
+def _cmp(row, col, op, value):
+    v = row.get(col)
+    if op == "eq": return str(v) == str(value)
+    if op == "gt": return v is not None and str(v) > str(value)
+    raise ValueError(f"unsupported op {op}")
+
+def _split_top(expr):
+    # "a.gt.1,and(b.eq.2,c.gt.3)" -> ["a.gt.1", "and(b.eq.2,c.gt.3)"] (괄호 안 쉼표는 유지)
+    parts, depth, buf = [], 0, ""
+    for ch in expr:
+        if ch == "," and depth == 0:
+            parts.append(buf)
+            buf = ""
+            continue
+        depth += (ch == "(") - (ch == ")")
+        buf += ch
+    return parts + [buf] if buf else parts
+
+def _or_filter(expr):
+    # CandidateCache 키셋 조건 정도만: col.op.value / and(...) 조합
+    def term(t):
+        if t.startswith("and("):
+            subs = [term(s) for s in _split_top(t[4:-1])]
+            return lambda r: all(f(r) for f in subs)
+        col, op, value = t.split(".", 2)
+        value = _parse_value(value)
+        return lambda r: _cmp(r, col, op, value)
+    terms = [term(t) for t in _split_top(expr)]
+    return lambda r: any(f(r) for f in terms)
+
+class _Query:
+    def __init__(self, db, table):
+        self.db, self.table = db, table
+        self.columns, self.filters, self.orders, self.max_rows = None, [], [], None
+        self.values, self.negate = None, False
+        self.op = "select"
+
+    def select(self, columns="*"):
+        self.columns = None if columns.strip() == "*" else [c.strip() for c in columns.split(",")]
+        return self
+
+    def update(self, values):
+        self.op, self.values = "update", values
+        return self
+
+    def insert(self, rows):
+        self.op, self.values = "insert", rows if isinstance(rows, list) else [rows]
+        return self
+
+    def _filter(self, fn):
+        negate, self.negate = self.negate, False
+        self.filters.append((lambda r: not fn(r)) if negate else fn)
+        return self
+
+    @property
+    def not_(self):
+        self.negate = True
+        return self
+
+    def eq(self, col, value): return self._filter(lambda r: str(r.get(col)) == str(value))
+    def gt(self, col, value): return self._filter(lambda r: r.get(col) is not None and r.get(col) > value)
+    def is_(self, col, value): return self._filter(lambda r: (r.get(col) is None) == (value == "null"))
+    def or_(self, expr): return self._filter(_or_filter(expr))
+
+    def order(self, col, desc=False):
+        self.orders.append((col, desc))
+        return self
+
+    def limit(self, n):
+        self.max_rows = n
+        return self
+
+    def execute(self):
+        self.db.sleep()
+        with self.db.lock:
+            rows = self.db.tables.setdefault(self.table, [])
+            if self.op == "insert":
+                rows.extend(dict(r) for r in self.values)
+                return SimpleNamespace(data=[dict(r) for r in self.values])
+            found = [r for r in rows if all(f(r) for f in self.filters)]
+            if self.op == "update":
+                for r in found:
+                    r.update(self.values)
+                    if "updated_at" in r: r["updated_at"] = self.db.now()
+                return SimpleNamespace(data=[dict(r) for r in found])
+            for col, desc in reversed(self.orders):
+                found.sort(key=lambda r: (r.get(col) is None, r.get(col)), reverse=desc)
+            if self.max_rows is not None: found = found[:self.max_rows]
+            if self.columns: found = [{c: r.get(c) for c in self.columns} for r in found]
+            else: found = [dict(r) for r in found]
+        self.db.stats["rows_returned"] += len(found)
+        return SimpleNamespace(data=found)
+
+class _Rpc:
+    def __init__(self, db, name, params):
+        self.db, self.name, self.params = db, name, params
+
+    def execute(self):
+        self.db.sleep()
+        fn = getattr(self.db, "rpc_" + self.name, None)
+        if fn is None: raise RuntimeError(f"rpc 미지원: {self.name}")
+        with self.db.lock:
+            return SimpleNamespace(data=fn(**self.params))
+
+# --- [Supabase: Auth] ---
+class _FakeAuth:
+    def __init__(self, db):
+        self.db = db
+        self._local = threading.local() # 모든 클라이언트가 이 객체를 공유하므로 set_session 은 스레드별로
+
+    def sign_in_with_password(self, credentials):
+        self.db.sleep()
+        with self.db.lock:
+            account = self.db.accounts.get(credentials["email"])
+        if account is None or account["password"] != credentials["password"]:
+            raise RuntimeError("Invalid login credentials")
+        user = SimpleNamespace(id=account["id"], email=credentials["email"], identities=[{}])
+        with self.db.lock:
+            self.db.stats["tokens_issued"] += 1
+            token = f"token-{account['id']}-{self.db.stats['tokens_issued']}"
+            self.db.issued.add(token)
+        return SimpleNamespace(user=user, session=SimpleNamespace(access_token=token, refresh_token="refresh-" + token))
+
+    def sign_up(self, credentials):
+        # sql/004_signup_login.sql 트리거처럼 같은 "트랜잭션"에서 users 행까지 생성
+        self.db.sleep()
+        profile = credentials.get("options", {}).get("data", {})
+        with self.db.lock:
+            taken = self.db.rpc_check_signup_available(profile.get("username"), credentials["email"])[0]
+            if taken["username_taken"] or taken["email_taken"]:
+                raise RuntimeError("Database error saving new user")
+            uid = f"user-{len(self.db.accounts):07d}"
+            self.db.accounts[credentials["email"]] = {"id": uid, "password": credentials["password"]}
+            self.db.tables["users"].append({"id": uid, "email": credentials["email"], "saju_elements": None,
+                                            "subscription_plan": "free", "updated_at": self.db.now(), **profile})
+        return SimpleNamespace(user=SimpleNamespace(id=uid, email=credentials["email"], identities=[{}]))
+
+    def set_session(self, access_token, refresh_token):
+        self.db.sleep()
+        self._local.token = access_token
+
+    def sign_out(self, options=None):
+        # 폐기된 토큰은 FakeSupabase.issued 에서 빠짐 (로그아웃 검증용)
+        self.db.sleep()
+        with self.db.lock:
+            self.db.issued.discard(getattr(self._local, "token", None))
+        self._local.token = None
+    def reset_password_for_email(self, email, options=None): self.db.sleep()
+
+class FakeSupabase:
+    # create_client() 가 돌려주는 클라이언트 대역. 모든 클라이언트가 같은 메모리 DB 를 공유
+    def __init__(self, latency=0, seed=0):
+        self.latency = latency
+        self.rng = random.Random(seed)
+        self.lock = threading.RLock()
+        self.tables = {"users": []}
+        self.accounts = {} # email -> {"id", "password"}
+        self.issued = set() # 로그인으로 발급되고 아직 로그아웃하지 않은 access token
+        self.stats = {"requests": 0, "rows_returned": 0, "tokens_issued": 0}
+        self.auth = _FakeAuth(self)
+        self._clock = 0
+
+    def now(self):
+        # updated_at: 호출 순서대로 증가하는 ISO 문자열 (CandidateCache 워터마크가 결정적으로 움직이도록)
+        self._clock += 1
+        return f"2024-01-01T00:00:00.{self._clock:06d}+00:00"
+
+    def sleep(self):
+        with self.lock:
+            self.stats["requests"] += 1
+        _sleep(self.latency, self.rng)
+
+    def table(self, name): return _Query(self, name)
+    def rpc(self, name, params): return _Rpc(self, name, params)
+
+    def seed_users(self, n, seed=0, with_elements=0.9):
+        # 결정적 회원 n명 (bench_matching.random_candidates 기반). with_elements 비율만 saju_elements 저장 상태
+        rng = random.Random(seed)
+        with self.lock:
+            for i, cand in enumerate(random_candidates(n, seed)):
+                uid, email = f"user-{len(self.accounts):07d}", f"user{i}@example.com"
+                self.accounts[email] = {"id": uid, "password": PASSWORD}
+                self.tables["users"].append({
+                    **cand, "id": uid, "username": f"user{i}", "email": email, "phone": "010-0000-0000",
+                    "birth_time": f"{rng.randrange(24):02d}:{rng.randrange(60):02d}", "subscription_plan": "free",
+                    "saju_elements": cand["saju_elements"] if rng.random() < with_elements else None,
+                    "updated_at": self.now(),
+                })
+        return self
+
+    def user(self, i):
+        return self.tables["users"][i]
+
+    # --- RPC (sql/*.sql 와 같은 입출력) ---
+    def rpc_resolve_login_email(self, p_username):
+        return next((r["email"] for r in self.tables["users"] if r.get("username") == p_username), None)
+
+    def rpc_check_signup_available(self, p_username=None, p_email=None):
+        users = self.tables["users"]
+        return [{"username_taken": bool(p_username) and any(r.get("username") == p_username for r in users),
+                 "email_taken": bool(p_email) and any((r.get("email") or "").lower() == p_email.lower() for r in users)}]
+
+    def rpc_match_candidates(self, p_user_id, p_limit=5):
+        users = self.tables["users"]
+        me = next((r for r in users if r["id"] == p_user_id), None)
+        if not me or not me.get("saju_elements"): return []
+        columns = [c.strip() for c in MATCH_COLUMNS.split(",")]
+        return score_candidates_loop(me, [{c: r.get(c) for c in columns} for r in users if r["id"] != p_user_id], p_limit)
+
+    def rpc_backfill_saju_elements(self, p_rows):
+        by_id = {r["id"]: r for r in self.tables["users"]}
+        for row in p_rows:
+            if row["id"] in by_id: by_id[row["id"]]["saju_elements"] = row["saju_elements"]
+        return len(p_rows)
+
+# --- [Gemini] ---
+class _Models:
+    def __init__(self, client):
+        self.client = client
+
+    def _usage(self, contents, text):
+        return SimpleNamespace(prompt_token_count=len(str(contents)) // 2, candidates_token_count=len(text) // 2,
+                               cached_content_token_count=0)
+
+    def generate_content(self, model, contents, config=None):
+        text = self.client.reply(contents, config)
+        _sleep(self.client.latency, self.client.rng)
+        return SimpleNamespace(text=text, usage_metadata=self._usage(contents, text))
+
+    def generate_content_stream(self, model, contents, config=None):
+        text = self.client.reply(contents, config)
+        size = self.client.chunk_chars
+        _sleep(self.client.latency, self.client.rng) # 첫 조각까지
+        for i in range(0, len(text), size):
+            if i: _sleep(self.client.chunk_latency, self.client.rng)
+            last = i + size >= len(text)
+            yield SimpleNamespace(text=text[i:i + size], usage_metadata=self._usage(contents, text) if last else None)
+
+    def get(self, model):
+        return SimpleNamespace(name=model)
+
+class FakeGemini:
+    # genai.Client 대역: 같은 (system, contents) 면 항상 같은 응답
+    def __init__(self, latency=0, chunk_latency=0, reply_chars=1200, chunk_chars=80, seed=0):
+        self.latency, self.chunk_latency = latency, chunk_latency
+        self.reply_chars, self.chunk_chars = reply_chars, chunk_chars
+        self.rng = random.Random(seed)
+        self.models = _Models(self)
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def reply(self, contents, config):
+        with self._lock:
+            self.calls += 1
+        system = (config or {}).get("system_instruction", "") if isinstance(config, dict) else ""
+        digest = hashlib.sha256(f"{system}\n{contents}".encode("utf-8")).hexdigest()
+        greeting = "[이름]님의 " if "[이름]" in str(contents) else "" # 프롬프트가 이름 자리를 쓸 때만 (llm.NAME_SLOT)
+        body = f"{greeting}사주 풀이 ({digest[:8]}). " + "오행의 흐름이 고르게 이어집니다. " * (self.reply_chars // 20)
+        return re.sub(r"\s+$", "", body[:self.reply_chars])
+
+# --- [설치] ---
+@contextlib.contextmanager
+def install(supabase=None, gemini=None):
+    # with install(FakeSupabase().seed_users(100), FakeGemini()): AppTest(...).run()
+    import supabase as supabase_module
+    from google import genai
+    saved = supabase_module.create_client, genai.Client
+    if supabase is not None: supabase_module.create_client = lambda url, key, *args, **kwargs: supabase
+    if gemini is not None: genai.Client = lambda *args, **kwargs: gemini
+    try:
+        yield supabase, gemini
+    finally:
+        supabase_module.create_client, genai.Client = saved
@@ -0,0 +1,269 @@
+# bench/load_test.py
+# 동시 세션 부하 테스트: Streamlit 서버 한 대(app.py)가 몇 명까지 버티는지 측정
+#   python -m bench.load_test --concurrency 1,5,10,25 [--db-latency 0.03] [--llm-latency 0.8] [--slo-ms 2000]
+#
+# - 서버: 이 모듈을 serve 모드로 띄운 별도 프로세스 (bench.fakes 의 Supabase/Gemini 대역 + 지연 주입 후 `streamlit run app.py`)
+# - 클라이언트: 브라우저 대신 /_stcore/stream 웹소켓에 BackMsg(rerun_script) 를 직접 보내는 가상 세션 (asyncio)
+#   가상 세션 하나 = 로그인 화면 -> 로그인 -> 사주분석 -> 저장 -> 매칭 (리런 한 번이 한 단계)
+# - 동시성 단계마다 단계별 p50/p95/p99, 에러 수, 서버 스레드 수/RSS 를 보고하고
+#   모든 단계 p95 가 --slo-ms 안인 최대 동시 세션 수를 인스턴스 용량으로 표시
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+STEPS = ["open", "login", "analysis", "save", "match"]
+
+# --- [서버: 대역 설치 후 streamlit run] ---
+def serve(args):
+    from bench.bench_suite import BENCH_ENV
+    for k, v in BENCH_ENV.items(): os.environ.setdefault(k, v)
+    os.environ["MATCH_ENGINE"] = args.engine
+    from bench.fakes import FakeGemini, FakeSupabase, install
+    from streamlit.web import cli
+    fake = FakeSupabase(latency=args.db_latency, seed=args.seed).seed_users(args.users, seed=args.seed)
+    gemini = FakeGemini(latency=args.llm_latency, chunk_latency=args.chunk_latency, seed=args.seed)
+    with install(fake, gemini):
+        cli.main(["run", os.path.join(ROOT, "app.py"), "--server.port", str(args.port), "--server.headless", "true",
+                  "--browser.gatherUsageStats", "false", "--server.fileWatcherType", "none", "--logger.level", "warning"],
+                 standalone_mode=False)
+
+def start_server(args):
+    cmd = [sys.executable, "-m", "bench.load_test", "serve", "--port", str(args.port), "--users", str(args.users),
+           "--engine", args.engine, "--db-latency", str(args.db_latency), "--llm-latency", str(args.llm_latency),
+           "--chunk-latency", str(args.chunk_latency), "--seed", str(args.seed)]
+    proc = subprocess.Popen(cmd, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL if not args.verbose else None)
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None: raise RuntimeError(f"서버 종료됨 (코드 {proc.returncode})")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{args.port}/_stcore/health", timeout=1)
+            return proc
+        except OSError:
+            time.sleep(0.3)
+    proc.kill()
+    raise RuntimeError("서버 시작 시간 초과")
+
+def process_stats(pid):
+    # /proc/<pid>/status -> (RSS MB, 스레드 수) (리눅스 외에는 (None, None))
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            fields = dict(line.split(":", 1) for line in f if ":" in line)
+        return int(fields["VmRSS"].split()[0]) / 1024, int(fields["Threads"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+# --- [클라이언트: 가상 브라우저 세션] ---
+class StepError(Exception):
+    pass
+
+class Session:
+    # 웹소켓 하나 = Streamlit 세션 하나. run() 은 스크립트가 끝날 때까지 받은 요소를 모아 둔다
+    def __init__(self, port, timeout):
+        self.url = f"ws://127.0.0.1:{port}/_stcore/stream"
+        self.timeout = timeout
+        self.ws = None
+        self.page_hash = ""
+        self.elements = []
+
+    async def __aenter__(self):
+        from websockets.asyncio.client import connect
+        self.ws = await connect(self.url, subprotocols=["streamlit"], max_size=None)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.ws.close()
+
+    async def run(self, widgets=()):
+        # widgets: [(위젯 id, 필드명, 값)] -> FINISHED_SUCCESSFULLY 까지 (st.rerun 이 끼면 다음 실행까지 기다림)
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+        msg = BackMsg()
+        state = msg.rerun_script
+        state.page_script_hash = self.page_hash
+        for wid, field, value in widgets:
+            w = state.widget_states.widgets.add()
+            w.id = wid
+            setattr(w, field, value)
+        await self.ws.send(msg.SerializeToString())
+        elements = []
+        async with asyncio.timeout(self.timeout):
+            while True:
+                fwd = ForwardMsg()
+                fwd.ParseFromString(await self.ws.recv())
+                kind = fwd.WhichOneof("type")
+                if kind == "new_session":
+                    self.page_hash = fwd.new_session.main_script_hash
+                    elements = []
+                elif kind == "delta" and fwd.delta.WhichOneof("type") == "new_element":
+                    elements.append(fwd.delta.new_element)
+                elif kind == "script_finished":
+                    if fwd.script_finished == ForwardMsg.FINISHED_SUCCESSFULLY: break
+                    if fwd.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR: raise StepError("컴파일 에러")
+        self.elements = elements
+        for e in elements:
+            if e.WhichOneof("type") == "exception": raise StepError(f"앱 예외: {e.exception.message[:200]}")
+        return self
+
+    def widget(self, kind, label):
+        for e in self.elements:
+            if e.WhichOneof("type") == kind and label in getattr(e, kind).label: return getattr(e, kind)
+        raise StepError(f"{kind} '{label}' 없음")
+
+    def text(self):
+        out = []
+        for e in self.elements:
+            kind = e.WhichOneof("type")
+            if kind == "markdown": out.append(e.markdown.body)
+            elif kind == "alert": out.append(e.alert.body)
+        return "\n".join(out)
+
+    def expect(self, text):
+        if text not in self.text(): raise StepError(f"'{text}' 없음")
+
+async def user_flow(port, account, timeout, record):
+    # 로그인 -> 사주분석 -> 저장 -> 매칭. 단계별 소요 시간을 record(단계, 초, 에러) 로 보고
+    async with Session(port, timeout) as s:
+        async def step(name, coro_fn):
+            t0 = time.perf_counter()
+            try:
+                await coro_fn()
+                record(name, time.perf_counter() - t0, None)
+                return True
+            except (StepError, TimeoutError, OSError) as e:
+                record(name, time.perf_counter() - t0, f"{type(e).__name__}: {e}")
+                return False
+
+        async def open_page():
+            await s.run()
+            s.widget("text_input", "아이디")
+
+        async def login():
+            await s.run([(s.widget("text_input", "아이디").id, "string_value", f"user{account}"),
+                         (s.widget("text_input", "비밀번호").id, "string_value", "password"),
+                         (s.widget("button", "로그인").id, "trigger_value", True)])
+            s.widget("button", "사주 분석 시작하기")
+
+        async def analysis():
+            await s.run([(s.widget("button", "사주 분석 시작하기").id, "trigger_value", True)])
+            s.widget("button", "저장하기")
+
+        async def save():
+            await s.run([(s.widget("button", "저장하기").id, "trigger_value", True)])
+            s.expect("DB에 성공적으로")
+
+        async def match():
+            await s.run()
+            s.expect("년생")
+
+        for name, fn in zip(STEPS, (open_page, login, analysis, save, match)):
+            if not await step(name, fn): return False
+    return True
+
+async def run_level(port, concurrency, flows, timeout, accounts):
+    # 가상 세션 concurrency 개가 각자 flows 번 흐름을 반복
+    samples = {name: [] for name in STEPS}
+    errors = []
+
+    def record(name, sec, error):
+        if error: errors.append((name, error))
+        else: samples[name].append(sec)
+
+    async def worker():
+        for _ in range(flows):
+            await user_flow(port, next(accounts), timeout, record)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return samples, errors, time.perf_counter() - t0
+
+def percentiles(values):
+    if not values: return None
+    if len(values) == 1: return {"p50": values[0], "p95": values[0], "p99": values[0]}
+    q = statistics.quantiles(values, n=100, method="inclusive")
+    return {"p50": statistics.median(values), "p95": q[94], "p99": q[98]}
+
+def monitor(pid, stop, peaks):
+    # 서버 프로세스 RSS/스레드 수 최댓값 (0.2초 간격)
+    while not stop.wait(0.2):
+        rss, threads = process_stats(pid)
+        if rss is None: return
+        peaks["rss_mb"] = max(peaks.get("rss_mb", 0), rss)
+        peaks["threads"] = max(peaks.get("threads", 0), threads)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streamlit 인스턴스 동시 세션 부하 테스트")
+    parser.add_argument("mode", nargs="?", choices=["run", "serve"], default="run")
+    parser.add_argument("--concurrency", default="1,5,10,25", help="동시 세션 수 단계 (쉼표 구분)")
+    parser.add_argument("--flows", type=int, default=2, help="세션당 반복 횟수")
+    parser.add_argument("--users", type=int, default=5000, help="가짜 DB 회원 수 (로그인 계정 = user0, user1, ...)")
+    parser.add_argument("--engine", choices=["rpc", "local", "stream"], default="rpc", help="MATCH_ENGINE")
+    parser.add_argument("--db-latency", type=float, default=0.03, help="Supabase 요청당 지연 (초)")
+    parser.add_argument("--llm-latency", type=float, default=0.8, help="Gemini 첫 응답까지 지연 (초)")
+    parser.add_argument("--chunk-latency", type=float, default=0.02, help="Gemini 스트리밍 조각 간 지연 (초)")
+    parser.add_argument("--slo-ms", type=float, default=2000, help="단계별 p95 목표")
+    parser.add_argument("--timeout", type=float, default=60, help="리런 하나 최대 대기 (초)")
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", default=None, help="결과 저장 경로")
+    parser.add_argument("--verbose", action="store_true", help="서버 로그 출력")
+    args = parser.parse_args(argv)
+    if args.mode == "serve": return serve(args)
+
+    import threading
+    levels = [int(x) for x in args.concurrency.split(",")]
+    if sum(levels) * args.flows + 1 > args.users: parser.error("--users 가 전체 흐름 수보다 적음 (계정마다 한 번씩 로그인)")
+    proc = start_server(args)
+    accounts = itertools.count()
+    report = {"args": vars(args), "levels": []}
+    try:
+        rss0, threads0 = process_stats(proc.pid)
+        print(f"서버 시작: RSS {rss0 or 0:.0f}MB, 스레드 {threads0}")
+        asyncio.run(run_level(args.port, 1, 1, args.timeout, accounts)) # 워밍업 (모듈 import/리소스 초기화)
+        rss_warm, _ = process_stats(proc.pid)
+        header = " | ".join(f"{name:>16}" for name in STEPS)
+        print(f"{'동시':>4} | {'흐름/s':>6} | {header} | 에러 | 스레드 | RSS MB")
+        for level in levels:
+            stop, peaks = threading.Event(), {}
+            watcher = threading.Thread(target=monitor, args=(proc.pid, stop, peaks), daemon=True)
+            watcher.start()
+            samples, errors, wall = asyncio.run(run_level(args.port, level, args.flows, args.timeout, accounts))
+            stop.set()
+            watcher.join()
+            rss, _ = process_stats(proc.pid)
+            stats = {name: percentiles(v) for name, v in samples.items()}
+            ok_flows = len(samples["match"])
+            cells = " | ".join(f"{s['p50'] * 1000:5.0f}/{s['p95'] * 1000:5.0f}/{s['p99'] * 1000:5.0f}" if s else f"{'-':>16}" for s in stats.values())
+            print(f"{level:>4} | {ok_flows / wall:6.2f} | {cells} | {len(errors):>4} | {peaks.get('threads', 0):>6} | {rss or 0:6.0f}")
+            for name, error in errors[:3]: print(f"       에러 [{name}] {error}")
+            report["levels"].append({"concurrency": level, "wall_sec": wall, "flows_ok": ok_flows, "errors": len(errors),
+                                     "error_samples": errors[:10], "steps": stats, "peak_threads": peaks.get("threads"),
+                                     "peak_rss_mb": peaks.get("rss_mb"), "rss_mb": rss})
+        print("(단계 값: p50/p95/p99 ms)")
+        rss_end, _ = process_stats(proc.pid)
+        if rss_warm and rss_end: print(f"RSS 증가 (워밍업 후 -> 종료): {rss_warm:.0f}MB -> {rss_end:.0f}MB (+{rss_end - rss_warm:.0f}MB)")
+        within = [lv["concurrency"] for lv in report["levels"]
+                  if not lv["errors"] and all(s and s["p95"] * 1000 <= args.slo_ms for s in lv["steps"].values())]
+        report["capacity"] = max(within) if within else 0
+        print(f"p95 <= {args.slo_ms:.0f}ms 를 지킨 최대 동시 세션: {report['capacity'] or '없음'}")
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"저장: {args.json}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
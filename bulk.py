@@ -0,0 +1,221 @@
+# bulk.py
+# 화면 없이 생년월일 레코드를 일괄 상세 풀이 (제휴/마케팅용, Streamlit 의존성 없음)
+#   입력: JSONL 또는 CSV (필드: id, name, gender, birth_date, birth_time, persona - birth_date 만 필수)
+#   출력: 입력 순서대로 한 줄씩 JSONL (성공 {"ok": true, 명식/오행/풀이} / 실패 {"ok": false, "error"})
+#
+# - 사주 계산은 calculate_saju_pillars, 풀이는 앱과 같은 llm.detailed_analysis + PERSONAS (응답 캐시도 공유)
+# - 작업 스레드 --workers 개, 처리 중 레코드는 최대 --window 개 -> 입력 크기와 상관없이 메모리 일정
+#   실제 Gemini 동시 호출/초당 호출 수는 llm.gemini_pool 설정 (LLM_MAX_CONCURRENCY, LLM_RATE_PER_SEC, ...)
+# - 레코드별 오류(입력 형식, 재시도 후에도 실패한 호출)는 해당 줄에 기록하고 계속 진행
+# - 기록한 레코드 수와 출력 파일 위치를 체크포인트에 남기므로 중단 후 다시 실행하면 이어서 진행
+#
+# 실행: python -m bulk input.jsonl -o out.jsonl [--persona "혜안 스님"] [--workers 8] [--restart]
+#       cat input.csv | python -m bulk - --format csv -o -   (표준 입출력, 체크포인트 없음)
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import llm
+import metrics
+from backfill import load_checkpoint, parse_birth, save_checkpoint
+from personas import PERSONAS
+from saju import PILLAR_KEYS, calculate_saju_pillars, count_elements
+
+DEFAULT_PERSONA = next(iter(PERSONAS))
+GENDERS = {"여성": "여성", "여": "여성", "f": "여성", "female": "여성",
+           "남성": "남성", "남": "남성", "m": "남성", "male": "남성"}
+PROGRESS_SEC = 5.0
+CHECKPOINT_EVERY = 100 # 이 레코드 수마다 출력 flush + 체크포인트 저장
+
+# --- [입력] ---
+def detect_format(path, fmt=None):
+    if fmt: return fmt
+    return "csv" if path.lower().endswith(".csv") else "jsonl"
+
+def read_records(f, fmt):
+    # -> (레코드 dict, 파싱 오류 문자열 또는 None). 빈 줄은 건너뜀
+    if fmt == "csv":
+        for row in csv.DictReader(f):
+            yield {k: v for k, v in row.items() if k and v not in (None, "")}, None
+        return
+    for line in f:
+        if not line.strip(): continue
+        try:
+            rec = json.loads(line)
+        except ValueError as e:
+            yield {}, f"JSON 파싱 오류: {e}"
+            continue
+        if isinstance(rec, dict): yield rec, None
+        else: yield {}, "JSON 객체가 아님"
+
+def normalize_gender(value):
+    if not value: return "선택 안 함"
+    return GENDERS.get(str(value).strip().lower(), "선택 안 함")
+
+# --- [레코드 처리] ---
+def analyze(client, rec, persona=DEFAULT_PERSONA):
+    # 레코드 하나 -> 결과 dict (입력 오류는 ValueError, 호출 실패는 llm 쪽 예외 그대로)
+    birth = parse_birth(rec)
+    if birth is None: raise ValueError(f"birth_date 형식 오류: {rec.get('birth_date')!r}")
+    d, hour, minute = birth
+    persona = rec.get("persona") or persona
+    if persona not in PERSONAS: raise ValueError(f"알 수 없는 페르소나: {persona}")
+    saju = calculate_saju_pillars(d.year, d.month, d.day, hour, minute)
+    counts = count_elements(saju)
+    text = llm.detailed_analysis(client, saju, normalize_gender(rec.get("gender")), counts, persona, rec.get("name"))
+    if not text: raise RuntimeError("빈 응답")
+    return {"persona": persona, "saju": {k: getattr(saju, k).name for k in PILLAR_KEYS}, "elements": counts, "analysis": text}
+
+def process(client, line_no, rec, error, persona):
+    # 작업 스레드에서 실행: 예외를 결과 줄로 바꿔서 돌려줌
+    out = {"line": line_no, "id": rec.get("id", line_no)}
+    t0 = time.perf_counter()
+    try:
+        if error: raise ValueError(error)
+        with metrics.span("bulk"):
+            out.update(ok=True, **analyze(client, rec, persona))
+    except Exception as e:
+        out.update(ok=False, error=f"{type(e).__name__}: {e}")
+    out["sec"] = round(time.perf_counter() - t0, 3)
+    return out
+
+# --- [진행/리포트] ---
+class Progress:
+    # 처리량/지연시간 집계 (지연시간은 최근 1000건만 보관)
+    def __init__(self, state, log):
+        self.state, self.log = state, log
+        self.base = state["done"]
+        self.start = self._last = time.perf_counter()
+        self.latencies = deque(maxlen=1000)
+
+    def add(self, result):
+        self.state["done"] = result["line"]
+        self.state["ok" if result["ok"] else "failed"] += 1
+        self.latencies.append(result["sec"])
+        now = time.perf_counter()
+        if now - self._last >= PROGRESS_SEC:
+            self._last = now
+            self.log(self.line(now))
+
+    def rate(self, now=None):
+        return (self.state["done"] - self.base) / max((now or time.perf_counter()) - self.start, 1e-9)
+
+    def line(self, now=None):
+        lat = sorted(self.latencies)
+        pct = lambda p: lat[min(len(lat) - 1, int(p * len(lat)))] if lat else 0.0
+        return (f"{self.state['done']:,}건 (성공 {self.state['ok']:,} / 실패 {self.state['failed']:,}) {self.rate(now):,.1f} rec/s,"
+                f" 레코드 p50 {pct(0.5) * 1000:,.0f}ms / p95 {pct(0.95) * 1000:,.0f}ms")
+
+    def report(self):
+        elapsed = time.perf_counter() - self.start
+        usage = llm.usage.metrics().get("detailed", {})
+        return {**self.state, "processed": self.state["done"] - self.base, "elapsed_sec": round(elapsed, 2),
+                "records_per_sec": round(self.rate(), 2), "gemini_calls": usage.get("calls", 0),
+                "output_tokens": usage.get("output_tokens", 0), "llm_cache": llm.response_cache.metrics(),
+                "gemini_pool": llm.gemini_pool.metrics()}
+
+# --- [실행] ---
+def run(client, records, out, persona=DEFAULT_PERSONA, workers=8, window=None, state=None, on_checkpoint=None, limit=None, log=print):
+    # records: read_records() 결과, out: 텍스트 출력 스트림
+    # state["done"] 번째 레코드까지는 이미 기록된 것으로 보고 건너뜀
+    # on_checkpoint(state): CHECKPOINT_EVERY 건마다 (out 을 flush 한 뒤) 호출
+    state = {"done": 0, "ok": 0, "failed": 0, **(state or {})}
+    window = window or workers * 4
+    progress = Progress(state, log)
+    pending = deque() # 입력 순서대로 (결과 future) - 앞에서부터 끝나는 대로 기록
+    start, written = state["done"], 0
+
+    def write_head():
+        nonlocal written
+        result = pending.popleft().result()
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        progress.add(result)
+        written += 1
+        if on_checkpoint and written % CHECKPOINT_EVERY == 0:
+            out.flush()
+            on_checkpoint(state)
+
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bulk")
+    try:
+        for line_no, (rec, error) in enumerate(records, 1):
+            if line_no <= start: continue
+            if limit is not None and line_no > start + limit: break
+            pending.append(executor.submit(process, client, line_no, rec, error, persona))
+            while pending and (len(pending) >= window or pending[0].done()): write_head()
+        while pending: write_head()
+    finally:
+        # 중단(Ctrl+C 등) 시 아직 기록 안 한 레코드는 버리고, 기록한 데까지만 체크포인트
+        for future in pending: future.cancel()
+        executor.shutdown(wait=True, cancel_futures=True)
+        out.flush()
+        if on_checkpoint: on_checkpoint(state)
+    report = progress.report()
+    log(f"완료: {progress.line()} - {report['elapsed_sec']:,.1f}s, Gemini 호출 {report['gemini_calls']:,}회"
+        f" (캐시 적중률 {report['llm_cache'].get('hit_rate') or 0:.0%})")
+    return report
+
+def open_output(path, checkpoint_path, input_path, restart):
+    # -> (출력 스트림, 시작 상태). 체크포인트가 있으면 기록된 위치까지 잘라내고 이어 씀
+    state = {} if restart else load_checkpoint(checkpoint_path)
+    if state:
+        if state.get("input") != input_path:
+            raise SystemExit(f"체크포인트 입력({state.get('input')})이 다릅니다. --restart 로 처음부터 실행하세요")
+        with open(path, "a", encoding="utf-8") as f: f.truncate(state["output_bytes"]) # 기록 도중 끊긴 줄 제거
+        return open(path, "a", encoding="utf-8"), state
+    if os.path.exists(path) and os.path.getsize(path) and not restart:
+        raise SystemExit(f"출력 파일이 이미 있습니다: {path} (--restart 로 덮어쓰기)")
+    return open(path, "w", encoding="utf-8"), {}
+
+def make_client():
+    from google import genai
+    from google.genai import types
+    api_key = os.getenv("GEMINI_API_KEY")
+    if not api_key: raise SystemExit("GEMINI_API_KEY 가 없습니다")
+    return genai.Client(api_key=api_key, http_options=types.HttpOptions(timeout=int(llm.gemini_pool.timeout * 1000)))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="생년월일 레코드 일괄 상세 풀이 (JSONL/CSV -> JSONL)")
+    parser.add_argument("input", help="입력 파일 (- 는 표준 입력)")
+    parser.add_argument("-o", "--output", default="-", help="출력 JSONL (- 는 표준 출력, 이어하기 불가)")
+    parser.add_argument("--format", choices=["jsonl", "csv"], default=None, help="기본: 확장자로 판단")
+    parser.add_argument("--persona", default=DEFAULT_PERSONA, choices=list(PERSONAS), help="레코드에 persona 가 없을 때")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("LLM_MAX_CONCURRENCY", "8")), help="작업 스레드 수 (기본: LLM_MAX_CONCURRENCY)")
+    parser.add_argument("--window", type=int, default=None, help="동시에 처리 중인 최대 레코드 수 (기본 workers*4)")
+    parser.add_argument("--limit", type=int, default=None, help="이번 실행에서 처리할 최대 레코드 수")
+    parser.add_argument("--checkpoint", default=None, help="기본: <output>.checkpoint.json")
+    parser.add_argument("--restart", action="store_true", help="체크포인트 무시하고 처음부터 (출력 덮어씀)")
+    parser.add_argument("--json", default=None, help="처리량 리포트 저장 경로")
+    args = parser.parse_args(argv)
+
+    client = make_client()
+    log = lambda msg: print(msg, file=sys.stderr, flush=True) # 표준 출력은 결과용
+    fmt = detect_format(args.input, args.format)
+    src = io.TextIOWrapper(sys.stdin.buffer, encoding="utf-8-sig") if args.input == "-" else open(args.input, encoding="utf-8-sig", newline="")
+    with src:
+        records = read_records(src, fmt)
+        if args.output == "-":
+            report = run(client, records, sys.stdout, args.persona, args.workers, args.window, limit=args.limit, log=log)
+        else:
+            checkpoint_path = args.checkpoint or args.output + ".checkpoint.json"
+            input_path = args.input if args.input == "-" else os.path.abspath(args.input)
+            out, state = open_output(args.output, checkpoint_path, input_path, args.restart)
+            if state.get("done"): log(f"체크포인트에서 이어서 진행: {state['done']:,}건 처리됨")
+
+            def checkpoint(s):
+                save_checkpoint(checkpoint_path, {**s, "input": input_path, "output_bytes": out.tell()})
+            with out:
+                report = run(client, records, out, args.persona, args.workers, args.window, state, checkpoint, args.limit, log)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+    return 0
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    load_dotenv()
+    sys.exit(main())
@@ -0,0 +1,86 @@
+# compat.py
+# 오행 클래스 궁합표 (Streamlit 의존성 없음)
+#
+# 매칭 점수(matching.score_candidate)는 두 사람의 오행 개수 벡터와 성별에만 의존한다.
+# 오행 개수의 합은 항상 8 (천간 4 + 지지 4) 이므로 가능한 벡터는 C(12, 4) = 495 클래스뿐.
+# 모든 (내 클래스, 상대 클래스) 쌍의 점수(성별 가산점 제외)와 보너스 오행 비트를 495x495 표로 미리 계산해 두면
+# 매칭 시점에는 후보별 계산 없이 표에서 꺼내기만 하면 된다.
+#
+# 빌드: python -m compat build  (data/compat_matrix.npz, 없으면 처음 쓸 때 메모리에서 생성)
+import itertools
+import os
+import sys
+from functools import lru_cache
+import numpy as np
+from saju import ELEMENT_KEYS
+
+MATRIX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "compat_matrix.npz")
+ELEMENT_TOTAL = 8
+OPPOSITE_GENDER_BONUS = 20
+MAX_SCORE = 100
+
+# 클래스 번호 <-> 오행 벡터 (ELEMENT_KEYS 순서)
+CLASS_VECTORS = np.array([v for v in itertools.product(range(ELEMENT_TOTAL + 1), repeat=5) if sum(v) == ELEMENT_TOTAL], dtype=np.int8)
+_RADIX = ELEMENT_TOTAL + 1
+_WEIGHTS = _RADIX ** np.arange(4, -1, -1)
+CLASS_OF = np.full(_RADIX ** 5, -1, dtype=np.int16) # 9진수 인코딩 -> 클래스 번호 (합이 8이 아니면 -1)
+CLASS_OF[CLASS_VECTORS.astype(np.int64) @ _WEIGHTS] = np.arange(len(CLASS_VECTORS))
+
+def class_ids(elements):
+    # (N, 5) 오행 개수 -> (N,) 클래스 번호 (범위 밖/합이 8이 아니면 -1)
+    e = np.asarray(elements, dtype=np.int64).reshape(-1, 5)
+    valid = ((e >= 0) & (e <= ELEMENT_TOTAL)).all(axis=1)
+    return np.where(valid, CLASS_OF[np.clip(e, 0, ELEMENT_TOTAL) @ _WEIGHTS], -1).astype(np.int16)
+
+def class_id(element_dict):
+    return int(class_ids([[element_dict.get(key, 0) for key in ELEMENT_KEYS]])[0])
+
+def build_matrix():
+    # -> (base, bonus): base[i, j] = 성별 가산점/상한 적용 전 점수 (uint8)
+    #                   bonus[i, j] = 내게 없는 오행을 상대가 3개 이상 가진 오행 비트 (1 << ELEMENT_KEYS 인덱스)
+    me = CLASS_VECTORS[:, None, :].astype(np.int16)
+    other = CLASS_VECTORS[None, :, :].astype(np.int16)
+    lack = me == 0
+    base = 50 + np.where(lack, np.where(other >= 3, 30, np.where(other >= 1, 10, 0)), 0).sum(axis=2)
+    base -= 10 * ((me >= 3) & (other >= 3)).sum(axis=2)
+    bonus = ((lack & (other >= 3)) << np.arange(5)).sum(axis=2)
+    return base.astype(np.uint8), bonus.astype(np.uint8)
+
+def save_matrix(path=MATRIX_PATH):
+    base, bonus = build_matrix()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    np.savez_compressed(path, base=base, bonus=bonus, vectors=CLASS_VECTORS)
+    return base, bonus
+
+# --- [지연 로딩] ---
+_matrix = None
+
+def load_matrix():
+    global _matrix
+    if _matrix is None:
+        if os.path.exists(MATRIX_PATH):
+            with np.load(MATRIX_PATH) as f:
+                if np.array_equal(f["vectors"], CLASS_VECTORS): # 클래스 정의가 바뀌었으면 다시 계산
+                    _matrix = (f["base"], f["bonus"])
+        if _matrix is None:
+            _matrix = build_matrix()
+    return _matrix
+
+@lru_cache(maxsize=len(CLASS_VECTORS))
+def class_scores(my_class):
+    # 내 클래스 기준 상대 클래스별 최종 점수 (2, 495) int16: [0] 같은 성별, [1] 이성(+20), 최대 100
+    base = load_matrix()[0][my_class].astype(np.int16)
+    table = np.minimum(np.stack([base, base + OPPOSITE_GENDER_BONUS]), MAX_SCORE)
+    table.flags.writeable = False # 캐시 공유 -> 호출자는 fancy indexing 으로 복사본만 받음
+    return table
+
+def bonus_text(bits, order=range(5)):
+    # 보너스 비트 -> "부족한 '화' 기운 가득!, ..." (order: 표시할 오행 인덱스 순서)
+    return ", ".join(f"부족한 '{ELEMENT_KEYS[c]}' 기운 가득!" for c in order if bits >> c & 1)
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        base, bonus = save_matrix()
+        print(f"{MATRIX_PATH} 생성 완료: {len(CLASS_VECTORS)}개 클래스, {base.nbytes + bonus.nbytes:,} bytes (압축 전)")
+    else:
+        print("사용법: python -m compat build")
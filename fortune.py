@@ -0,0 +1,113 @@
+# fortune.py
+# 오늘의 한 줄 운세: (날짜, 타고난 일주) 별로 하루 한 번만 생성해서 모든 세션이 공유
+#   - 홈 탭은 get_daily_fortune 으로 캐시(llm.response_cache)를 읽고, 없으면 single-flight 로 1회 생성
+#   - 자정 몰림을 피하려면 전날 미리 생성: python -m fortune --date 2026-01-01
+#   - Gemini 를 쓸 수 없으면 local_fortune (오늘 일진과 내 일간의 오행 관계) 으로 바로 계산
+#   - 생성이 실패한 (날짜, 일주) 는 프로세스 전체가 FORTUNE_RETRY_SEC 동안 다시 호출하지 않음 (세션 수와 무관하게 1회)
+import argparse
+import datetime
+import logging
+import os
+import threading
+import time
+import llm
+import metrics
+from saju import PILLARS, GAN_ELEMENT, ELEMENT_KEYS, pillar_indices
+
+GENERIC = -1 # 생년월일 정보가 없는 회원용
+FORTUNE_RETRY_SEC = 300 # Gemini 실패 후 같은 (날짜, 일주) 를 다시 시도하기까지
+
+log = logging.getLogger("saju.fortune")
+_retry_at = {} # (날짜, 일주) -> 다시 시도해도 되는 시각 (monotonic)
+_retry_lock = threading.Lock()
+
+# 오늘 일간 오행이 내 일간 오행에 대해: 같음 / 나를 생함 / 내가 생함 / 내가 극함 / 나를 극함
+LOCAL_MESSAGES = [
+    "🤝 {today}일, 뜻이 맞는 사람과 힘을 모으면 좋은 하루!",
+    "🌱 {today}일, 주변의 도움이 들어오는 든든한 하루예요!",
+    "🎨 {today}일, 생각을 표현하면 좋은 반응이 오는 하루!",
+    "💰 {today}일, 작은 기회와 재물운이 따르는 하루예요!",
+    "🧘 {today}일, 한 템포 쉬어 가면 더 좋은 하루가 돼요!",
+]
+
+def element_relation(me, other):
+    # 오행 인덱스(목화토금수 순) 관계 -> LOCAL_MESSAGES 인덱스
+    if me == other: return 0
+    if (other + 1) % 5 == me: return 1 # 상대가 나를 생함
+    if (me + 1) % 5 == other: return 2 # 내가 상대를 생함
+    if (me + 2) % 5 == other: return 3 # 내가 상대를 극함
+    return 4 # 상대가 나를 극함
+
+def local_fortune(date, natal_day):
+    # LLM 없이 (오늘 일진, 내 일주)로 한 줄 운세
+    today = PILLARS[pillar_indices(date.year, date.month, date.day, 12, 0)[2]]
+    if natal_day == GENERIC:
+        return f"🍀 오늘은 {today.name}일, {ELEMENT_KEYS[GAN_ELEMENT[today.stem]]} 기운이 도는 하루예요!"
+    return LOCAL_MESSAGES[element_relation(GAN_ELEMENT[PILLARS[natal_day].stem], GAN_ELEMENT[today.stem])].format(today=today.name)
+
+def day_pillar_of(birth_date):
+    # 'YYYY-MM-DD' -> 일주 60갑자 인덱스 (없거나 형식이 틀리면 GENERIC)
+    if not birth_date: return GENERIC
+    try:
+        d = datetime.date.fromisoformat(str(birth_date)[:10])
+    except ValueError:
+        return GENERIC
+    return pillar_indices(d.year, d.month, d.day, 0, 0)[2]
+
+FORTUNE_TEMPLATE = "{who} 위해 오늘({date}, {today}일)의 운세를 희망찬 이모지와 함께 30자 이내로 작성해."
+FORTUNE_WHO = ("일주가 {day}인 사람을", "사용자를")
+FORTUNE_VERSION = llm.template_hash(FORTUNE_TEMPLATE, FORTUNE_WHO) # 문구를 고치면 키가 바뀜
+
+def fortune_prompt(date, natal_day):
+    today = PILLARS[pillar_indices(date.year, date.month, date.day, 12, 0)[2]]
+    who = FORTUNE_WHO[0].format(day=PILLARS[natal_day].name) if natal_day != GENERIC else FORTUNE_WHO[1]
+    return FORTUNE_TEMPLATE.format(who=who, date=f"{date:%Y-%m-%d}", today=today.name)
+
+def fortune_key(date, natal_day):
+    return llm.cache_key("fortune", date=date.isoformat(), day=natal_day, template=FORTUNE_VERSION)
+
+def _backing_off(slot, now):
+    with _retry_lock:
+        retry_at = _retry_at.get(slot)
+        if retry_at is None: return False
+        if now < retry_at: return True
+        del _retry_at[slot]
+        return False
+
+def _failed(slot, now):
+    with _retry_lock:
+        for old in [s for s, t in _retry_at.items() if t <= now]: del _retry_at[old] # 지난 날짜 항목 정리
+        _retry_at[slot] = now + FORTUNE_RETRY_SEC
+
+def get_daily_fortune(client, date, natal_day):
+    # 실패하면 None (호출 측에서 local_fortune 표시). 백오프 중에는 캐시만 확인
+    key, slot, now = fortune_key(date, natal_day), (date, natal_day), time.monotonic()
+    if _backing_off(slot, now): return llm.response_cache.get(key)
+    try:
+        text = llm.generate(client, fortune_prompt(date, natal_day), key, kind="fortune")
+    except Exception as e:
+        text = None
+        log.warning("오늘의 운세 생성 실패 (%s, 일주 %d, %ds 동안 로컬 문구): %s", date, natal_day, FORTUNE_RETRY_SEC, e)
+    if not text:
+        _failed(slot, now)
+        metrics.inc("fortune_errors_total")
+    return text
+
+def precompute(client, date):
+    # 60 일주 + 공용 1개, 이미 있는 항목은 건너뜀
+    done = 0
+    for natal_day in [GENERIC] + list(range(60)):
+        if llm.response_cache.get(fortune_key(date, natal_day)) is None:
+            llm.generate(client, fortune_prompt(date, natal_day), fortune_key(date, natal_day), kind="fortune")
+            done += 1
+    return done
+
+if __name__ == "__main__":
+    from dotenv import load_dotenv
+    from google import genai
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="오늘의 운세 사전 생성")
+    parser.add_argument("--date", type=datetime.date.fromisoformat, default=datetime.date.today() + datetime.timedelta(days=1))
+    args = parser.parse_args()
+    n = precompute(genai.Client(api_key=os.getenv("GEMINI_API_KEY")), args.date)
+    print(f"{args.date}: {n}개 생성")
@@ -0,0 +1,439 @@
+# llm.py
+# Gemini 프롬프트 + 응답 캐시 (Streamlit 의존성 없음)
+#
+# 분석 프롬프트는 명식/오행/구독 등급/페르소나/성별에만 의존하도록 만들고 (이름은 NAME_SLOT 으로 비워둠),
+# 같은 입력이면 캐시된 응답을 돌려준다. 메모리 LRU -> SQLite 순으로 조회.
+# 실제 Gemini 호출은 모두 gemini_pool (동시성 제한 + 토큰 버킷 + 타임아웃 + 지터 재시도) 을 거친다.
+# 프롬프트는 고정된 시스템 지시문(페르소나별로 import 시 한 번 정리) + 짧은 사용자 입력으로 나눠 보내고,
+# 요청마다 입력/출력 토큰 수와 지연시간을 usage 에 기록한다.
+import hashlib
+import json
+import logging
+import os
+import random
+import re
+import sqlite3
+import textwrap
+import threading
+import time
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from personas import PERSONAS
+import metrics
+
+TARGET_MODEL_NAME = "gemini-2.0-flash"
+NAME_SLOT = "[이름]" # 응답에 남겨두고 표시 직전에 실제 이름으로 치환
+SYSTEM_TOKEN_BUDGET = 300 # 시스템 지시문 예상 토큰 상한 (넘으면 import 시 경고)
+
+log = logging.getLogger("saju.llm")
+
+# --- [프롬프트 템플릿] ---
+# system: 요청마다 같은 지시문 (Gemini system_instruction 으로 전달), contents: 사용자별 입력
+Prompt = namedtuple("Prompt", "system contents")
+
+def normalize(text):
+    # personas.py 의 들여쓰기/빈 줄 제거 (토큰 낭비 방지)
+    return "\n".join(line for line in (re.sub(r"\s+", " ", l).strip() for l in textwrap.dedent(text).splitlines()) if line)
+
+def estimate_tokens(text):
+    # 한글은 대략 1자 = 1토큰, 그 외는 4자 = 1토큰으로 어림 (실제 수치는 usage 참고)
+    hangul = sum(1 for c in text if "\uac00" <= c <= "\ud7a3")
+    return hangul + (len(text) - hangul) // 4
+
+NAME_RULE = f"사용자를 부를 때는 '{NAME_SLOT}'이라고 그대로 써."
+
+def _compile_persona(persona):
+    return normalize(f"""
+        {persona['prompt_instruction']}
+        [요청] 인사, 사주 도표, 전체 형국, 성격, 직업/재물, 대운/세운, 한마디 순으로 작성. 말투: {persona['tone']}
+        {NAME_RULE}
+        """)
+
+ANALYSIS_SYSTEM = {
+    "free": normalize(f"너는 사주 전문가야. 사용자의 사주를 분석해줘. (무료회원용 요약)\n{NAME_RULE}"),
+    "pro": normalize(f"너는 사주 전문가야. 사용자의 사주를 상세히 분석해줘.\n{NAME_RULE}"),
+}
+PERSONA_SYSTEM = {key: _compile_persona(p) for key, p in PERSONAS.items()}
+
+# 사용자 입력 부분 템플릿 (명식/오행만 채움, 이름은 NAME_SLOT)
+ANALYSIS_USER = "[사용자] {name}, 사주: 년주:{year}, 일주:{day}, 오행: {elements}"
+DETAILED_USER = "[사용자] {name} ({gender}), 사주: 년주:{year}, 월주:{month}, 일주:{day}, 시주:{time}, 오행: {elements}"
+
+def template_hash(*templates):
+    return hashlib.sha256(json.dumps(templates, sort_keys=True, ensure_ascii=False).encode("utf-8")).hexdigest()[:12]
+
+# 캐시 키에 들어가는 프롬프트 버전: 시스템 지시문(페르소나 포함) + 사용자 템플릿 해시
+#   personas.py 나 위 템플릿을 고치면 손으로 올리지 않아도 새 키가 됨 (기존 캐시 자동 무효화)
+PROMPT_VERSION = template_hash(ANALYSIS_SYSTEM, PERSONA_SYSTEM, ANALYSIS_USER, DETAILED_USER)
+
+for _name, _text in [*ANALYSIS_SYSTEM.items(), *PERSONA_SYSTEM.items()]:
+    if estimate_tokens(_text) > SYSTEM_TOKEN_BUDGET:
+        log.warning("시스템 지시문 '%s' 예상 %d토큰 > 예산 %d", _name, estimate_tokens(_text), SYSTEM_TOKEN_BUDGET)
+
+def plan_tier(plan):
+    return "free" if plan == 'free' else "pro"
+
+def analysis_prompt(saju, element_counts, plan):
+    return Prompt(ANALYSIS_SYSTEM[plan_tier(plan)], ANALYSIS_USER.format(name=NAME_SLOT, year=saju.year.name, day=saju.day.name, elements=element_counts))
+
+def detailed_prompt(saju, gender, element_counts, persona_key):
+    return Prompt(PERSONA_SYSTEM[persona_key], DETAILED_USER.format(name=NAME_SLOT, gender=gender, year=saju.year.name, month=saju.month.name,
+                                                                   day=saju.day.name, time=saju.time.name, elements=element_counts))
+
+def fill_name(text, name):
+    return text.replace(NAME_SLOT, name or "회원") if text else text
+
+def fill_name_stream(chunks, name):
+    # 스트리밍 조각 사이에서 NAME_SLOT 이 잘려도 치환되도록, 끝부분이 NAME_SLOT 의 접두어면 다음 조각까지 보류
+    pending = ""
+    for chunk in chunks:
+        text = fill_name(pending + chunk, name)
+        pending = ""
+        for n in range(min(len(NAME_SLOT) - 1, len(text)), 0, -1):
+            if NAME_SLOT.startswith(text[-n:]):
+                text, pending = text[:-n], text[-n:]
+                break
+        if text: yield text
+    if pending: yield pending
+
+# --- [응답 캐시] ---
+def cache_key(kind, **parts):
+    # 모델/프롬프트 버전이 키에 포함되므로 둘 중 하나가 바뀌면 자연스럽게 새 키가 됨
+    raw = json.dumps({"kind": kind, "model": TARGET_MODEL_NAME, "v": PROMPT_VERSION, **parts}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class ResponseCache:
+    def __init__(self, path=None, max_memory=2048, ttl=30 * 24 * 3600):
+        self.max_memory = max_memory
+        self.ttl = ttl
+        self._memory = OrderedDict() # key -> (text, created)
+        self._lock = threading.Lock()
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, text TEXT NOT NULL, created REAL NOT NULL)")
+            self._db.commit()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0}
+
+    def _remember(self, key, text, created):
+        self._memory[key] = (text, created)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory:
+            self._memory.popitem(last=False)
+
+    def get(self, key, record=True):
+        # record=False: 통계에 안 넣음 (세션이 키로 풀이 본문을 다시 읽을 때 - sessions.py)
+        now = time.time()
+        with self._lock:
+            hit = self._memory.get(key)
+            if hit and now - hit[1] < self.ttl:
+                self._memory.move_to_end(key)
+                if record: self.stats["memory_hits"] += 1
+                return hit[0]
+            if self._db is not None:
+                row = self._db.execute("SELECT text, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+                if row and now - row[1] < self.ttl:
+                    self._remember(key, row[0], row[1])
+                    if record: self.stats["disk_hits"] += 1
+                    return row[0]
+            if record: self.stats["misses"] += 1
+            return None
+
+    def put(self, key, text):
+        now = time.time()
+        with self._lock:
+            self._remember(key, text, now)
+            if self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO llm_cache (key, text, created) VALUES (?, ?, ?)", (key, text, now))
+                self._db.commit()
+            self.stats["stores"] += 1
+
+    def metrics(self):
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return {**self.stats, "hit_rate": hits / total if total else 0.0, "memory_entries": len(self._memory)}
+
+response_cache = ResponseCache(
+    path=os.getenv("LLM_CACHE_PATH", os.path.join(".cache", "llm_cache.sqlite3")),
+    ttl=int(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600))),
+)
+
+# --- [single-flight: 같은 키의 동시 요청은 한 번만 실행] ---
+_inflight = {}
+_inflight_lock = threading.Lock()
+
+def single_flight(key, fn):
+    with _inflight_lock:
+        flight = _inflight.get(key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[key] = Future()
+    if not leader:
+        return flight.result() # 먼저 시작한 요청의 결과(또는 예외)를 같이 받음
+    try:
+        flight.set_result(fn())
+    except Exception as e:
+        flight.set_exception(e)
+    finally:
+        with _inflight_lock:
+            del _inflight[key]
+    return flight.result()
+
+# --- [요청 풀: 동시성/속도 제한, 타임아웃, 재시도] ---
+RETRYABLE_CODES = {408, 429, 500, 502, 503, 504}
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        # 토큰 1개를 얻을 때까지 대기, 얻은 시각까지 기다린 초를 반환 (timeout 초과 시 TimeoutError)
+        start = time.monotonic()
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return now - start
+                wait = (1 - self.tokens) / self.rate
+            if timeout is not None and now - start + wait > timeout:
+                raise TimeoutError("Gemini 요청 한도 대기 시간 초과")
+            time.sleep(wait)
+
+def is_retryable(e):
+    if isinstance(e, (TimeoutError, FutureTimeout, ConnectionError)): return True
+    return getattr(e, "code", None) in RETRYABLE_CODES
+
+class GeminiPool:
+    # Streamlit 스크립트 스레드가 네트워크에 묶여 쌓이지 않도록 Gemini 호출을 제한된 스레드 풀에서 실행
+    def __init__(self, max_workers=8, rate=5.0, burst=10, timeout=60.0, max_retries=3, backoff=0.5):
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.bucket = TokenBucket(rate, burst)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="gemini")
+        self._slots = threading.Semaphore(max_workers) # 풀 작업 + 스트림(호출 스레드에서 읽음) 합쳐서 max_workers 개
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=1000)
+        self.queued = 0
+        self.in_flight = 0
+        self.stats = {"calls": 0, "errors": 0, "retries": 0, "timeouts": 0, "throttle_wait_sec": 0.0}
+
+    def _run(self, fn):
+        with self._slots:
+            with self._lock:
+                self.queued -= 1
+                self.in_flight += 1
+            t0 = time.perf_counter()
+            try:
+                return fn()
+            finally:
+                with self._lock:
+                    self.in_flight -= 1
+                    self._latencies.append(time.perf_counter() - t0)
+
+    def call(self, fn):
+        # fn 을 풀에서 실행하고 결과를 기다림. 재시도 가능한 오류는 지수 백오프 + full jitter 로 재시도
+        for attempt in range(self.max_retries + 1):
+            waited = self.bucket.acquire(timeout=self.timeout)
+            with self._lock:
+                self.queued += 1
+                self.stats["calls"] += 1
+                self.stats["throttle_wait_sec"] += waited
+            future = self._executor.submit(self._run, fn)
+            try:
+                return future.result(timeout=self.timeout)
+            except Exception as e:
+                final = attempt == self.max_retries or not is_retryable(e)
+                with self._lock: # 여러 스레드가 동시에 올리므로 queued/in_flight 와 같은 락 안에서
+                    if isinstance(e, FutureTimeout):
+                        self.stats["timeouts"] += 1 # 작업 스레드는 HTTP 타임아웃으로 끝남
+                    self.stats["errors" if final else "retries"] += 1
+                if final: raise
+                time.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+    @contextmanager
+    def slot(self):
+        # 스트림용: 토큰 버킷 + 동시성 슬롯을 잡고 호출 스레드에서 실행 (중간에 조각이 나가므로 재시도 없음)
+        waited = self.bucket.acquire(timeout=self.timeout)
+        with self._lock:
+            self.queued += 1
+            self.stats["calls"] += 1
+            self.stats["throttle_wait_sec"] += waited
+        if not self._slots.acquire(timeout=self.timeout):
+            with self._lock:
+                self.queued -= 1
+                self.stats["timeouts"] += 1
+                self.stats["errors"] += 1
+            raise TimeoutError("Gemini 동시 요청 슬롯 대기 시간 초과")
+        with self._lock:
+            self.queued -= 1
+            self.in_flight += 1
+        t0 = time.perf_counter()
+        try:
+            yield
+        except Exception:
+            with self._lock:
+                self.stats["errors"] += 1
+            raise
+        finally:
+            self._slots.release()
+            with self._lock:
+                self.in_flight -= 1
+                self._latencies.append(time.perf_counter() - t0)
+
+    def metrics(self):
+        with self._lock:
+            lat = sorted(self._latencies)
+            stats, queued, in_flight = dict(self.stats), self.queued, self.in_flight
+        pct = lambda p: lat[min(len(lat) - 1, int(p * len(lat)))] if lat else None
+        return {**stats, "queue_depth": queued, "in_flight": in_flight,
+                "latency_p50": pct(0.5), "latency_p95": pct(0.95), "latency_p99": pct(0.99)}
+
+gemini_pool = GeminiPool(
+    max_workers=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+    rate=float(os.getenv("LLM_RATE_PER_SEC", "5")),
+    burst=int(os.getenv("LLM_BURST", "10")),
+    timeout=float(os.getenv("LLM_TIMEOUT", "60")),
+    max_retries=int(os.getenv("LLM_MAX_RETRIES", "3")),
+)
+
+# --- [토큰/지연시간 집계] ---
+class UsageStats:
+    # 요청 종류(kind)별 호출 수, 입력/출력/캐시 토큰 합계, 지연시간 합계
+    FIELDS = ("prompt_tokens", "output_tokens", "cached_tokens")
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.by_kind = {}
+
+    def record(self, kind, usage, latency):
+        tokens = {
+            "prompt_tokens": getattr(usage, "prompt_token_count", None) or 0,
+            "output_tokens": getattr(usage, "candidates_token_count", None) or 0,
+            "cached_tokens": getattr(usage, "cached_content_token_count", None) or 0,
+        }
+        with self._lock:
+            s = self.by_kind.setdefault(kind, {"calls": 0, "latency_sec": 0.0, **{f: 0 for f in self.FIELDS}})
+            s["calls"] += 1
+            s["latency_sec"] += latency
+            for f in self.FIELDS: s[f] += tokens[f]
+        for f in self.FIELDS: metrics.inc("gemini_tokens_total", tokens[f], kind=kind, type=f.replace("_tokens", ""))
+        log.info("gemini %s: 입력 %d / 출력 %d / 캐시 %d 토큰, %.0fms", kind, tokens["prompt_tokens"], tokens["output_tokens"], tokens["cached_tokens"], latency * 1000)
+        return tokens
+
+    def metrics(self):
+        with self._lock:
+            return {kind: {**s, "avg_prompt_tokens": s["prompt_tokens"] / s["calls"], "avg_latency_sec": s["latency_sec"] / s["calls"]}
+                    for kind, s in self.by_kind.items()}
+
+usage = UsageStats()
+
+# --- [호출] ---
+def _split(prompt):
+    # Prompt 또는 문자열 -> (system, contents, config)
+    if isinstance(prompt, Prompt):
+        return prompt.system, prompt.contents, {"system_instruction": prompt.system}
+    return None, prompt, None
+
+def _kind(key, kind):
+    return kind or ("cached" if key else "adhoc")
+
+def _generate_content(client, prompt, kind="adhoc"):
+    _, contents, config = _split(prompt)
+
+    def call():
+        t0 = time.perf_counter()
+        with metrics.span("gemini", kind=kind, mode="call") as span:
+            res = client.models.generate_content(model=TARGET_MODEL_NAME, contents=contents, config=config)
+            span.set(chars=len(res.text or ""))
+        usage.record(kind, res.usage_metadata, time.perf_counter() - t0)
+        return res.text
+    return gemini_pool.call(call)
+
+def _prompt_hash(prompt):
+    system, contents, _ = _split(prompt)
+    return hashlib.sha256(json.dumps([system, contents], ensure_ascii=False).encode("utf-8")).hexdigest()
+
+def generate(client, prompt, key=None, kind=None):
+    # prompt: Prompt(system, contents) 또는 문자열 / kind: 토큰 집계용 요청 종류 이름
+    # key 가 있으면 캐시 조회 -> 없을 때만 Gemini 호출
+    # 같은 키(키가 없으면 같은 프롬프트)가 동시에 들어오면 한 번만 호출
+    kind = _kind(key, kind)
+    if key is None:
+        return single_flight("prompt:" + _prompt_hash(prompt), lambda: _generate_content(client, prompt, kind))
+    cached = response_cache.get(key)
+    if cached is not None: return cached
+
+    def call():
+        cached = response_cache.get(key) # 대기 중에 다른 요청이 채웠을 수 있음
+        if cached is not None: return cached
+        text = _generate_content(client, prompt, kind)
+        if text: response_cache.put(key, text)
+        return text
+    return single_flight(key, call)
+
+def detailed_analysis(client, saju, gender, element_counts, persona_key, name=None):
+    # 페르소나 상세 풀이 (앱 / bulk.py 공용). 명식+성별+페르소나가 같으면 캐시를 같이 씀
+    prompt = detailed_prompt(saju, gender, element_counts, persona_key)
+    key = cache_key("detailed", saju=saju.to_bytes().hex(), gender=gender, persona=persona_key)
+    return fill_name(generate(client, prompt, key, kind="detailed"), name)
+
+def generate_stream(client, prompt, key=None, kind=None):
+    # 토큰이 도착하는 대로 조각을 yield, 끝까지 받으면 전체 텍스트를 캐시에 저장 (중간에 끊기면 저장 안 함)
+    # 스트림은 호출 스레드에서 읽되 gemini_pool 의 토큰 버킷 + 동시성 슬롯 + 통계를 같이 씀
+    # 같은 키(키가 없으면 같은 프롬프트)가 이미 진행 중이면 새로 스트리밍하지 않고 그 결과를 한 번에 받음
+    #   (앞 요청이 실패하거나 중간에 끊겼으면 generate 로 풀을 거쳐 다시 호출)
+    if key is not None:
+        cached = response_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+    kind = _kind(key, kind)
+    flight_key = key if key is not None else "prompt:" + _prompt_hash(prompt)
+    with _inflight_lock:
+        flight = _inflight.get(flight_key)
+        leader = flight is None
+        if leader:
+            flight = _inflight[flight_key] = Future()
+    if not leader:
+        try:
+            text = flight.result()
+        except Exception:
+            text = generate(client, prompt, key, kind)
+        if text: yield text
+        return
+    _, contents, config = _split(prompt)
+    parts = []
+    try:
+        last_usage = None
+        t0 = time.perf_counter()
+        with gemini_pool.slot(), metrics.span("gemini", kind=kind, mode="stream") as span:
+            for chunk in client.models.generate_content_stream(model=TARGET_MODEL_NAME, contents=contents, config=config):
+                if chunk.usage_metadata: last_usage = chunk.usage_metadata # 토큰 수는 마지막 조각 기준 누적값
+                if chunk.text:
+                    if not parts: metrics.observe("gemini_first_chunk_seconds", time.perf_counter() - t0, kind=kind)
+                    parts.append(chunk.text)
+                    yield chunk.text
+            span.set(chars=sum(map(len, parts)))
+        usage.record(kind, last_usage, time.perf_counter() - t0)
+        text = "".join(parts)
+        if key is not None and text:
+            response_cache.put(key, text)
+        flight.set_result(text)
+    except Exception as e:
+        flight.set_exception(e)
+        raise
+    finally:
+        if not flight.done(): flight.set_exception(RuntimeError("스트림이 중간에 닫힘")) # 소비 측이 generator 를 닫음
+        with _inflight_lock:
+            del _inflight[flight_key]
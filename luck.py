@@ -0,0 +1,122 @@
+# luck.py
+# 대운/세운/월운/일진 타임라인 (Streamlit 의존성 없음)
+#
+# 모두 제너레이터로 필요한 만큼만 만들고, 다음 기간은 이전 기간의 60갑자 인덱스에서 +1(-1) 해서 구한다.
+#   (60갑자는 연/월/일 모두 한 칸씩 순서대로 진행 -> 매 기간 calculate_saju_pillars 를 다시 부를 필요 없음)
+# 절입 시각은 saju_table.jie_times 를 분 단위로 내림해서 사용 (만세력 테이블과 같은 기준)
+import datetime
+from collections import namedtuple
+from functools import lru_cache
+from saju import PILLARS, pillar_indices
+from saju_table import jie_times
+
+DAEUN_YEARS = 10
+DAYS_PER_YEAR = 365.2425
+# 대운 한 칸: n번째(1부터), 시작 나이(만, 소수), 시작일, 60갑자 기둥
+Daeun = namedtuple("Daeun", "n start_age start_date pillar")
+# 한 해 요약: 연도, 나이(세는 나이 아님, 그 해 생일 기준 만 나이), 그 해에 해당하는 대운 기둥, 세운 기둥
+LifeYear = namedtuple("LifeYear", "year age daeun pillar")
+
+def birth_datetime(birth_date, birth_time=None):
+    # DB 문자열('YYYY-MM-DD', 'HH:MM[:SS]') -> datetime (시간이 없으면 12:00, 날짜가 없거나 틀리면 None)
+    try:
+        d = datetime.date.fromisoformat(str(birth_date or "")[:10])
+        h, m = (int(x) for x in str(birth_time).split(":")[:2]) if birth_time else (12, 0)
+        return datetime.datetime(d.year, d.month, d.day, h % 24, m)
+    except ValueError:
+        return None
+
+@lru_cache(maxsize=256)
+def _jie_of_year(year):
+    # 사주 년도 year 의 12절 시각 (분 단위 내림)
+    return tuple(t.replace(second=0, microsecond=0) for t, _ in jie_times(year))
+
+def iter_jie(after, reverse=False):
+    # after 이후(reverse 면 after 이전, after 포함)의 절입 시각을 순서대로
+    year = after.year if reverse else after.year - 1 # 1월생은 전년도 목록(소한)부터
+    step = -1 if reverse else 1
+    while True:
+        terms = _jie_of_year(year)
+        for t in (reversed(terms) if reverse else terms):
+            if (t <= after) if reverse else (t > after): yield t
+        year += step
+
+def daeun_direction(saju, gender):
+    # 양년생 남자 / 음년생 여자 -> 순행(+1), 반대 -> 역행(-1). 성별 미상은 순행
+    if gender not in ("남성", "여성"): return 1
+    return 1 if saju.year.gan_yang == (gender == "남성") else -1
+
+def daeun_start(birth_dt, direction):
+    # 출생 ~ 다음(역행이면 직전) 절입까지 일수 / 3 = 대운 시작 나이 (3일 = 1년, 1일 = 4개월)
+    term = next(iter_jie(birth_dt, reverse=direction < 0))
+    days = abs((term - birth_dt).total_seconds()) / 86400
+    age = days / 3
+    return age, (birth_dt + datetime.timedelta(days=age * DAYS_PER_YEAR)).date()
+
+def daeun_su(start_age):
+    # 표기용 대운수 (1~10, 반올림)
+    return min(10, max(1, int(start_age + 0.5)))
+
+def daeun(saju, birth_dt, gender, count=None):
+    # 대운 제너레이터 (count 가 None 이면 끝없이)
+    direction = daeun_direction(saju, gender)
+    age, start = daeun_start(birth_dt, direction)
+    idx = saju.month.index
+    n = 0
+    while count is None or n < count:
+        n += 1
+        idx = (idx + direction) % 60
+        yield Daeun(n, age, start, PILLARS[idx])
+        age += DAEUN_YEARS
+        start = _add_years(start, DAEUN_YEARS)
+
+def yearly(start_year):
+    # 세운: (년도, 기둥) - 입춘 기준 년도
+    idx = (start_year - 4) % 60
+    year = start_year
+    while True:
+        yield year, PILLARS[idx]
+        idx = (idx + 1) % 60
+        year += 1
+
+def monthly(start):
+    # 월운: (절입 시각, 기둥) - start 가 속한 달부터 (첫 항목의 시각은 그 달의 절입 시각)
+    idx = pillar_indices(start.year, start.month, start.day, start.hour, start.minute)[1]
+    begin = next(iter_jie(start, reverse=True))
+    yield begin, PILLARS[idx]
+    for t in iter_jie(start):
+        idx = (idx + 1) % 60
+        yield t, PILLARS[idx]
+
+def daily(start_date):
+    # 일진: (날짜, 기둥)
+    idx = pillar_indices(start_date.year, start_date.month, start_date.day, 0, 0)[2]
+    day = start_date
+    while True:
+        yield day, PILLARS[idx]
+        idx = (idx + 1) % 60
+        day += datetime.timedelta(days=1)
+
+def lifetime(saju, birth_dt, gender, years=100):
+    # 출생년도부터 years 년 동안 (년도, 나이, 대운, 세운) - 대운/세운 제너레이터를 나란히 진행
+    periods = daeun(saju, birth_dt, gender)
+    current, upcoming = None, next(periods)
+    for year, pillar in yearly(birth_dt.year):
+        if year >= birth_dt.year + years: return
+        # 대운은 시작일이 속한 해부터 적용
+        while upcoming.start_date.year <= year:
+            current, upcoming = upcoming, next(periods)
+        yield LifeYear(year, year - birth_dt.year, current.pillar if current else None, pillar)
+
+def current_daeun(saju, birth_dt, gender, today):
+    # today 기준 대운 (아직 대운 시작 전이면 None)
+    found = None
+    for d in daeun(saju, birth_dt, gender):
+        if d.start_date > today: return found
+        found = d
+
+def _add_years(d, n):
+    try:
+        return d.replace(year=d.year + n)
+    except ValueError: # 2월 29일
+        return d.replace(year=d.year + n, day=28)
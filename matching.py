@@ -0,0 +1,447 @@
+# matching.py
+# 매칭 점수 계산 (Streamlit 의존성 없음)
+#
+# 기본 경로는 DB 함수 match_candidates (sql/001_match_candidates.sql) 를 supabase.rpc 로 호출.
+#   (service_role 에만 실행 권한 -> SUPABASE_SERVICE_KEY 클라이언트로 호출, 동점은 id 순)
+# MATCH_ENGINE=local 이면 후보를 받아와 아래 score_candidates 로 계산 (RPC 미적용 환경/로컬 개발용).
+#   후보 오행은 (N, 5) int8 행렬 + 성별 코드 벡터(CandidatePool)로 들고 전체를 한 번에 계산
+#   CandidatePool 은 프로세스 공용 캐시(candidate_cache)로 모든 세션이 공유하고 updated_at 기준으로 증분 갱신
+#   동점은 풀에 들어온 순서 (전체 로드는 updated_at, id 순 + 이후 upsert 는 뒤에) - rpc/stream 의 id 순과 다를 수 있음
+#   local 엔진은 후보 일주도 들고 있어서 상위 K명에 일간/일지 관계(relations.pair_label)를 붙인다 (점수에는 미반영)
+# MATCH_ENGINE=stream 이면 캐시 없이 id 키셋 페이지로 후보를 흘려 보며 상위 K명 힙만 유지 (요청당 메모리 O(K + 페이지))
+#   점수는 오행 클래스(compat.py, 495개) 궁합표에서 후보별로 꺼내기만 한다 (클래스 밖 데이터는 직접 계산)
+import datetime
+import heapq
+import logging
+import os
+import threading
+import time
+import numpy as np
+from saju import ELEMENT_KEYS, DAY_OFFSET_1900
+from relations import pair_label
+import metrics
+from compat import class_ids, class_id, class_scores, bonus_text, load_matrix
+
+log = logging.getLogger("saju.match")
+
+MATCH_COLUMNS = "id, name, gender, birth_date, saju_elements" # 매칭에 필요한 컬럼만 (전화/이메일 제외)
+CACHE_COLUMNS = MATCH_COLUMNS + ", updated_at" # sql/002_users_updated_at.sql 필요
+TOP_K = 5
+STREAM_PAGE_SIZE = int(os.getenv("MATCH_STREAM_PAGE_SIZE", "500"))
+ROW_OVERHEAD_BYTES = 300 # 후보 1명당 id/이름/출생년도 문자열 + 리스트/dict 슬롯
+_ORD_1900 = datetime.date(1900, 1, 1).toordinal()
+
+def day_index(birth_date):
+    # 'YYYY-MM-DD' -> 일주 60갑자 인덱스 (일주는 태어난 시간과 무관), 없거나 형식이 틀리면 -1
+    try:
+        return (DAY_OFFSET_1900 + datetime.date.fromisoformat(str(birth_date or "")[:10]).toordinal() - _ORD_1900) % 60
+    except ValueError:
+        return -1
+
+def score_candidate(my_elements, my_gender, cand):
+    # 후보 1명 점수 -> (score, bonus 문자열)
+    cand_elements = cand.get('saju_elements')
+    my_lacks = [k for k, v in my_elements.items() if v == 0] # 내가 없는 오행
+
+    score = 50 # 기본 점수
+
+    # 1) 성별 매칭 (이성에게 가산점)
+    if my_gender != cand.get('gender'):
+        score += 20
+
+    # 2) 오행 보완 (내가 없는 걸 상대가 3개 이상 가졌으면 대박)
+    bonus_txt = []
+    for lack in my_lacks:
+        if cand_elements.get(lack, 0) >= 3:
+            score += 30
+            bonus_txt.append(f"부족한 '{lack}' 기운 가득!")
+        elif cand_elements.get(lack, 0) >= 1:
+            score += 10
+
+    # 3) 과다 조심 (나도 많고 쟤도 많으면 감점)
+    for k, v in my_elements.items():
+        if v >= 3 and cand_elements.get(k, 0) >= 3:
+            score -= 10
+
+    return min(score, 100), ", ".join(bonus_txt) # 100점 만점
+
+def score_candidates_loop(user_info, candidates, k=TOP_K):
+    # 기존 dict 루프 버전 (벤치마크/검증 기준)
+    my_elements = user_info.get('saju_elements')
+    matches = []
+    for cand in candidates:
+        if not cand.get('saju_elements'): continue # 정보 없는 유저 패스
+        score, bonus = score_candidate(my_elements, user_info.get('gender'), cand)
+        matches.append({
+            "name": cand.get('name', '익명'),
+            "gender": cand.get('gender', '-'),
+            "score": score,
+            "bonus": bonus,
+            "birth_year": (cand.get('birth_date') or '????')[:4]
+        })
+
+    # 점수순 정렬
+    matches.sort(key=lambda x: x['score'], reverse=True)
+    return matches[:k]
+
+# --- [벡터화 스코어링] ---
+class CandidatePool:
+    # 후보 목록을 행렬로 보관: elements (N, 5) int8 (ELEMENT_KEYS 순서), genders (N,) int16 코드, classes (N,) int16 오행 클래스
+    # upsert/remove 로 한 명씩 갱신 가능 (버퍼 용량을 두 배씩 늘리고, 삭제는 마지막 행과 자리 교체)
+    def __init__(self, rows=()):
+        rows = [r for r in rows if r.get('saju_elements')] # 정보 없는 유저 패스
+        self.gender_codes = {}
+        self.ids = [r.get('id') for r in rows]
+        self.row_of = {uid: i for i, uid in enumerate(self.ids)}
+        self.names = [r.get('name', '익명') for r in rows]
+        self.gender_labels = [r.get('gender', '-') for r in rows]
+        self.birth_years = [(r.get('birth_date') or '????')[:4] for r in rows]
+        self._genders = np.array([self.gender_code(r.get('gender')) for r in rows], dtype=np.int16)
+        self._elements = np.array([self._element_row(r) for r in rows], dtype=np.int8).reshape(-1, 5)
+        self._days = np.array([day_index(r.get('birth_date')) for r in rows], dtype=np.int8)
+        self._classes = class_ids(self._elements)
+
+    @property
+    def genders(self): return self._genders[:len(self.ids)]
+    @property
+    def elements(self): return self._elements[:len(self.ids)]
+    @property
+    def days(self): return self._days[:len(self.ids)]
+    @property
+    def classes(self): return self._classes[:len(self.ids)]
+
+    def __len__(self):
+        return len(self.ids)
+
+    @staticmethod
+    def _element_row(row):
+        return [row['saju_elements'].get(key, 0) for key in ELEMENT_KEYS]
+
+    def gender_code(self, gender):
+        return self.gender_codes.setdefault(gender, len(self.gender_codes))
+
+    def nbytes(self):
+        # 대략적인 메모리 사용량: 행렬 + 행당 문자열/리스트/dict 오버헤드 추정치
+        return self._elements.nbytes + self._genders.nbytes + self._days.nbytes + self._classes.nbytes + len(self.ids) * ROW_OVERHEAD_BYTES
+
+    def upsert(self, row):
+        uid = row.get('id')
+        if not row.get('saju_elements'):
+            self.remove(uid)
+            return
+        i = self.row_of.get(uid)
+        if i is None:
+            i = len(self.ids)
+            if i == len(self._elements):
+                cap = max(16, 2 * i)
+                self._elements = np.concatenate([self._elements, np.zeros((cap - i, 5), dtype=np.int8)])
+                self._genders = np.concatenate([self._genders, np.zeros(cap - i, dtype=np.int16)])
+                self._days = np.concatenate([self._days, np.full(cap - i, -1, dtype=np.int8)])
+                self._classes = np.concatenate([self._classes, np.full(cap - i, -1, dtype=np.int16)])
+            self.row_of[uid] = i
+            self.ids.append(uid)
+            self.names.append(None); self.gender_labels.append(None); self.birth_years.append(None)
+        self.names[i] = row.get('name', '익명')
+        self.gender_labels[i] = row.get('gender', '-')
+        self.birth_years[i] = (row.get('birth_date') or '????')[:4]
+        self._genders[i] = self.gender_code(row.get('gender'))
+        self._elements[i] = self._element_row(row)
+        self._days[i] = day_index(row.get('birth_date'))
+        self._classes[i] = class_ids(self._elements[i])[0]
+
+    def remove(self, uid):
+        i = self.row_of.pop(uid, None)
+        if i is None: return
+        last = len(self.ids) - 1
+        if i != last:
+            for col in (self.ids, self.names, self.gender_labels, self.birth_years):
+                col[i] = col[last]
+            self._elements[i] = self._elements[last]
+            self._genders[i] = self._genders[last]
+            self._days[i] = self._days[last]
+            self._classes[i] = self._classes[last]
+            self.row_of[self.ids[i]] = i
+        for col in (self.ids, self.names, self.gender_labels, self.birth_years):
+            col.pop()
+
+    def scores(self, my_elements, my_gender):
+        # 궁합표 조회: [같은 성별, 이성] x 상대 클래스 -> 후보별 gather 한 번
+        my_class = class_id(my_elements)
+        if my_class < 0: return self.scores_direct(my_elements, my_gender)
+        opposite = (self.genders != self.gender_codes.get(my_gender, -1)).astype(np.intp)
+        classes = self.classes
+        scores = class_scores(my_class)[opposite, classes]
+        odd = classes < 0 # 오행 합이 8이 아닌 (수동 입력/구버전) 데이터만 직접 계산
+        if odd.any(): scores[odd] = self.scores_direct(my_elements, my_gender, odd)
+        return scores
+
+    def scores_direct(self, my_elements, my_gender, rows=slice(None)):
+        # 규칙은 score_candidate 와 동일 (+20 이성, +30/+10 부족 오행 보완, 공통 과다 -10, 최대 100)
+        my = np.array([my_elements.get(key, 0) for key in ELEMENT_KEYS])
+        elements = self.elements[rows]
+        e = elements[:, my == 0]
+        over = elements[:, my >= 3]
+        my_code = self.gender_codes.get(my_gender, -1)
+        scores = 50 + 20 * (self.genders[rows] != my_code).astype(np.int16)
+        scores += np.where(e >= 3, 30, np.where(e >= 1, 10, 0)).sum(axis=1, dtype=np.int16)
+        scores -= 10 * (over >= 3).sum(axis=1, dtype=np.int16)
+        return np.minimum(scores, 100)
+
+    def top_k(self, my_elements, my_gender, k=TOP_K, exclude_id=None, my_day=-1):
+        # my_day: 내 일주 인덱스 (주면 결과에 "relation" 추가)
+        n = len(self)
+        scores = self.scores(my_elements, my_gender)
+        # 동점은 먼저 들어온 후보 우선 (기존 stable sort 와 같은 순서)
+        rank = scores.astype(np.int64) * n - np.arange(n)
+        # 제외할 유저(본인)는 후보 인덱스에서 빼고 고름 (rank 에 최솟값을 넣으면 -rank 가 오버플로)
+        skip = self.row_of.get(exclude_id)
+        rows = np.delete(np.arange(n), skip) if skip is not None else None
+        if rows is not None: rank = rank[rows]
+        k = min(k, len(rank))
+        if k <= 0: return []
+        top = np.argpartition(-rank, k - 1)[:k]
+        top = top[np.argsort(-rank[top])]
+        if rows is not None: top = rows[top]
+
+        # 보너스 문구 순서는 기존처럼 my_elements 키 순서
+        lack_cols = [ELEMENT_KEYS.index(e) for e, v in my_elements.items() if v == 0 and e in ELEMENT_KEYS]
+        my_class = class_id(my_elements)
+        bonus_bits = load_matrix()[1][my_class] if my_class >= 0 else None
+        matches = []
+        for i in top.tolist():
+            if bonus_bits is not None and self._classes[i] >= 0:
+                bits = int(bonus_bits[self._classes[i]])
+            else:
+                bits = sum(1 << c for c in lack_cols if self.elements[i, c] >= 3)
+            match = {
+                "name": self.names[i],
+                "gender": self.gender_labels[i],
+                "score": int(scores[i]),
+                "bonus": bonus_text(bits, lack_cols),
+                "birth_year": self.birth_years[i]
+            }
+            if my_day >= 0 and self._days[i] >= 0:
+                match["relation"] = pair_label(my_day, int(self._days[i]), my_gender)
+            matches.append(match)
+        return matches
+
+def score_candidates(user_info, candidates, k=TOP_K):
+    # 후보 dict 리스트 -> 점수 상위 k명 (앱 표시용 dict)
+    return CandidatePool(candidates).top_k(user_info.get('saju_elements'), user_info.get('gender'), k)
+
+# --- [후보 풀 캐시: 프로세스 공용] ---
+class CandidateCache:
+    # - 첫 요청에서 전체 로드, 이후 ttl 초마다 updated_at 워터마크 이후 변경분만 가져옴
+    # - 삭제된 유저는 증분으로 알 수 없으므로 full_resync 초마다 전체 재로드
+    # - max_rows 를 넘으면 updated_at 이 오래된 후보부터 제거
+    # - 다른 스레드가 갱신 중이면 기다리지 않고 현재(조금 오래된) 풀로 응답
+    # - 갱신이 실패하면 retry_backoff 초부터 두 배씩 (최대 max_backoff) 기다렸다가 다시 시도, 그동안은 기존 풀로 응답
+    def __init__(self, ttl=30, full_resync=3600, max_rows=500_000, page_size=1000, retry_backoff=5, max_backoff=300):
+        self.ttl = ttl
+        self.full_resync = full_resync
+        self.max_rows = max_rows
+        self.page_size = page_size
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.pool = CandidatePool()
+        self.updated = {} # id -> updated_at
+        self.watermark = None # (updated_at, id)
+        self.refreshed_at = None
+        self.full_loaded_at = None
+        self.failures = 0 # 연속 실패 횟수
+        self.next_retry_at = None
+        self.last_error = None
+        self._lock = threading.Lock() # pool 읽기/쓰기 + stats/실패 상태
+        self._refresh_lock = threading.Lock() # 갱신은 한 번에 하나만
+        self.stats = {"hits": 0, "misses": 0, "refreshes": 0, "full_loads": 0, "rows_fetched": 0, "evicted": 0, "errors": 0, "backoff_skips": 0}
+
+    def _fetch(self, supabase, since):
+        # updated_at, id 키셋 페이지네이션으로 since 이후 변경분 전부
+        rows = []
+        while True:
+            q = supabase.table("users").select(CACHE_COLUMNS).order("updated_at").order("id").limit(self.page_size)
+            if since:
+                ts, uid = since
+                q = q.or_(f'updated_at.gt."{ts}",and(updated_at.eq."{ts}",id.gt.{uid})')
+            else:
+                q = q.not_.is_("saju_elements", "null") # 전체 로드는 매칭 가능한 유저만
+            page = q.execute().data
+            rows.extend(page)
+            if len(page) < self.page_size: return rows
+            since = (page[-1]['updated_at'], page[-1]['id'])
+
+    def _apply(self, rows, full):
+        with self._lock:
+            if full:
+                self.pool, self.updated = CandidatePool(), {}
+            for r in rows:
+                self.pool.upsert(r)
+                if r.get('saju_elements'): self.updated[r['id']] = r.get('updated_at') or ''
+                else: self.updated.pop(r['id'], None)
+            if rows:
+                self.watermark = max(self.watermark or ('', ''), (rows[-1].get('updated_at') or '', rows[-1]['id']))
+            self._evict()
+
+    def _evict(self):
+        excess = len(self.pool) - self.max_rows
+        if excess <= 0: return
+        excess += self.max_rows // 10 # 매번 정렬하지 않도록 여유분까지 한 번에
+        for uid, _ in sorted(self.updated.items(), key=lambda kv: kv[1])[:excess]:
+            self.pool.remove(uid)
+            del self.updated[uid]
+        self.stats["evicted"] += excess
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def refresh(self, supabase, full=False):
+        rows = self._fetch(supabase, None if full else self.watermark)
+        self._apply(rows, full)
+        now = time.monotonic()
+        with self._lock:
+            self.refreshed_at = now
+            if full: self.full_loaded_at = now
+            self.stats["full_loads" if full else "refreshes"] += 1
+            self.stats["rows_fetched"] += len(rows)
+            self.failures, self.next_retry_at, self.last_error = 0, None, None
+
+    def _failed(self, e, now):
+        # -> 다음 재시도까지 대기 시간
+        with self._lock:
+            self.stats["errors"] += 1
+            self.failures += 1
+            self.last_error = e
+            delay = min(self.max_backoff, self.retry_backoff * 2 ** (self.failures - 1))
+            self.next_retry_at = now + delay
+            return delay
+
+    def _backing_off(self, now):
+        # 최근 갱신 실패 -> 백오프 동안은 DB 를 다시 두드리지 않음 (풀이 아직 없으면 마지막 오류 그대로)
+        with self._lock:
+            retry_at, error, loaded = self.next_retry_at, self.last_error, self.refreshed_at is not None
+            if retry_at is None or now >= retry_at: return False
+            self.stats["backoff_skips"] += 1
+        if not loaded and error is not None: raise error
+        return True
+
+    def get(self, supabase):
+        now = time.monotonic()
+        if self.refreshed_at is not None and now - self.refreshed_at < self.ttl:
+            self._count("hits")
+            return self
+        if self._backing_off(now): return self
+        blocking = self.refreshed_at is None # 첫 로드는 기다려야 함
+        if not self._refresh_lock.acquire(blocking=blocking):
+            self._count("hits") # 다른 스레드가 갱신 중 -> 기존 풀로 응답
+            return self
+        try:
+            now = time.monotonic() # 첫 로드는 앞 스레드를 기다렸을 수 있음
+            if self._backing_off(now): return self
+            if self.refreshed_at is None or now - self.refreshed_at >= self.ttl:
+                self._count("misses")
+                full = self.full_loaded_at is None or now - self.full_loaded_at >= self.full_resync
+                try:
+                    self.refresh(supabase, full=full)
+                except Exception as e:
+                    delay = self._failed(e, now)
+                    metrics.inc("match_cache_refresh_errors_total", full=full)
+                    log.warning("후보 캐시 갱신 실패 (%d회 연속, %.0fs 뒤 재시도, 기존 %d명으로 응답): %s",
+                                self.failures, delay, len(self.pool), e)
+                    if self.refreshed_at is None: raise
+            else:
+                self._count("hits")
+        finally:
+            self._refresh_lock.release()
+        return self
+
+    def upsert(self, row):
+        # 내 정보 저장 직후 바로 반영 (write-through, 워터마크는 건드리지 않음)
+        with self._lock:
+            self.pool.upsert(row)
+            if row.get('saju_elements'): self.updated[row['id']] = row.get('updated_at') or ''
+
+    def top_k(self, my_elements, my_gender, k=TOP_K, exclude_id=None, my_day=-1):
+        with self._lock:
+            return self.pool.top_k(my_elements, my_gender, k, exclude_id, my_day)
+
+    def metrics(self):
+        with self._lock:
+            stats, refreshed_at, failures = dict(self.stats), self.refreshed_at, self.failures
+            rows, nbytes = len(self.pool), self.pool.nbytes()
+        total = stats["hits"] + stats["misses"]
+        return {
+            **stats,
+            "hit_rate": stats["hits"] / total if total else 0.0,
+            "staleness_sec": time.monotonic() - refreshed_at if refreshed_at is not None else None,
+            "consecutive_failures": failures,
+            "rows": rows,
+            "approx_bytes": nbytes,
+        }
+
+candidate_cache = CandidateCache(
+    ttl=int(os.getenv("MATCH_CACHE_TTL", "30")),
+    max_rows=int(os.getenv("MATCH_CACHE_MAX_ROWS", "500000")),
+)
+
+# --- [후보 스트리밍: 캐시 없이 페이지 단위] ---
+stream_stats = {"requests": 0, "pages": 0, "rows_scanned": 0, "early_stops": 0}
+_stream_lock = threading.Lock() # 요청 스레드마다 stream_top_k 를 부르므로 stream_stats 는 이 락 안에서만
+
+def _count_stream(**deltas):
+    with _stream_lock:
+        for name, n in deltas.items(): stream_stats[name] += n
+
+def stream_metrics():
+    with _stream_lock:
+        return dict(stream_stats)
+
+def stream_candidates(supabase, page_size=STREAM_PAGE_SIZE, columns=MATCH_COLUMNS):
+    # 매칭 가능한 유저를 id 키셋 페이지네이션으로 page_size 명씩 (offset 없이 PK 인덱스만 탐)
+    last = None
+    while True:
+        q = supabase.table("users").select(columns).not_.is_("saju_elements", "null").order("id").limit(page_size)
+        if last is not None: q = q.gt("id", last)
+        page = q.execute().data
+        if page: yield page
+        if len(page) < page_size: return
+        last = page[-1]['id']
+
+def best_possible_score(my_elements):
+    # 어떤 후보도 넘을 수 없는 점수 상한: 이성 +20, 부족 오행마다 +30 (과다 감점은 피할 수 있음)
+    lacks = sum(1 for v in my_elements.values() if v == 0)
+    return min(100, 70 + 30 * lacks)
+
+def stream_top_k(pages, my_elements, my_gender, k=TOP_K, exclude_id=None, my_day=-1):
+    # 페이지마다 CandidatePool 로 상위 k명만 뽑아 크기 k 최소 힙에 병합
+    # k등 점수가 상한에 닿으면 남은 페이지는 받지 않음 (동점은 먼저 온 후보 우선이라 뒤 페이지가 이길 수 없음)
+    bound = best_possible_score(my_elements)
+    heap = [] # (score, -페이지 번호, -페이지 내 순위, match)
+    scanned = rows = stopped = 0
+    for page_no, page in enumerate(pages):
+        scanned, rows = scanned + 1, rows + len(page)
+        pool = CandidatePool(r for r in page if r.get('id') != exclude_id)
+        for rank, m in enumerate(pool.top_k(my_elements, my_gender, k, my_day=my_day)):
+            item = (m["score"], -page_no, -rank, m)
+            if len(heap) < k: heapq.heappush(heap, item)
+            elif item[:3] > heap[0][:3]: heapq.heapreplace(heap, item)
+            else: break # 페이지 안에서도 점수순이라 뒤는 볼 필요 없음
+        if len(heap) == k and heap[0][0] >= bound:
+            stopped = 1
+            if hasattr(pages, "close"): pages.close() # 제너레이터면 다음 페이지 요청 중단
+            break
+    _count_stream(requests=1, pages=scanned, rows_scanned=rows, early_stops=stopped)
+    return [item[3] for item in sorted(heap, key=lambda item: item[:3], reverse=True)]
+
+def fetch_matches(supabase, user_id, user_info, engine="rpc", k=TOP_K):
+    with metrics.span("match", engine=engine):
+        return _fetch_matches(supabase, user_id, user_info, engine, k)
+
+def _fetch_matches(supabase, user_id, user_info, engine, k):
+    if engine == "rpc":
+        return supabase.rpc("match_candidates", {"p_user_id": user_id, "p_limit": k}).execute().data
+    if engine == "stream":
+        return stream_top_k(stream_candidates(supabase), user_info.get('saju_elements'), user_info.get('gender'), k,
+                            exclude_id=user_id, my_day=day_index(user_info.get('birth_date')))
+    return candidate_cache.get(supabase).top_k(user_info.get('saju_elements'), user_info.get('gender'), k, exclude_id=user_id,
+                                               my_day=day_index(user_info.get('birth_date')))
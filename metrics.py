@@ -0,0 +1,220 @@
+# metrics.py
+# 핫패스 계측: 지연시간/크기 히스토그램, 카운터, 스팬 트레이스 (Streamlit 의존성 없음)
+#
+# 설정 (환경변수, 기본은 꺼짐):
+#   METRICS=1            메모리에 집계 시작 (꺼져 있으면 span() 은 공용 no-op 객체, observe/inc 는 바로 return)
+#   METRICS_PORT=9464    http://127.0.0.1:9464/metrics 에 Prometheus 텍스트 포맷으로 노출
+#   METRICS_JSONL=path   스팬이 끝날 때마다 한 줄씩 기록 (trace, span, 시작 시각, 소요 시간, 에러, 속성)
+#
+# 이름 규칙: 히스토그램은 *_seconds / *_bytes, 카운터는 *_total. 라벨은 키워드 인자 (문자열로 변환)
+import contextvars
+import itertools
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PREFIX = "saju_"
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+BYTES_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+ENABLED = os.getenv("METRICS", "").lower() in ("1", "true", "on")
+JSONL_PATH = os.getenv("METRICS_JSONL") or None
+if JSONL_PATH: ENABLED = True
+
+_lock = threading.Lock()
+_histograms = {} # (이름, 라벨 튜플) -> [버킷별 개수..., 합계, 개수]
+_counters = {} # (이름, 라벨 튜플) -> 값
+_jsonl = None
+_trace = contextvars.ContextVar("metrics_trace", default=None)
+_span_ids = itertools.count(1)
+
+def configure(enabled=None, jsonl_path=None):
+    # 테스트/벤치마크/CLI 에서 환경변수 대신 직접 켜고 끌 때
+    global ENABLED, JSONL_PATH, _jsonl
+    if enabled is not None: ENABLED = enabled
+    if jsonl_path is not None:
+        with _lock:
+            if _jsonl: _jsonl.close()
+            JSONL_PATH, _jsonl = jsonl_path or None, None
+
+def reset():
+    with _lock:
+        _histograms.clear()
+        _counters.clear()
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+def _buckets(name):
+    return BYTES_BUCKETS if name.endswith("_bytes") else SECONDS_BUCKETS
+
+# --- [기록] ---
+def observe(name, value, **labels):
+    if not ENABLED: return
+    key = _key(name, labels)
+    buckets = _buckets(name)
+    with _lock:
+        h = _histograms.get(key)
+        if h is None: h = _histograms[key] = [0] * (len(buckets) + 2)
+        for i, le in enumerate(buckets):
+            if value <= le:
+                h[i] += 1
+                break
+        h[-2] += value
+        h[-1] += 1
+
+def inc(name, value=1, **labels):
+    if not ENABLED: return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+def new_trace():
+    # 리런(요청) 하나 = 트레이스 하나. 이후 같은 컨텍스트의 스팬에 trace id 가 붙는다
+    if not ENABLED: return None
+    trace = f"{time.time_ns():x}"
+    _trace.set(trace)
+    return trace
+
+class Span:
+    # with span("gemini", kind="fortune") as s: ... s.set(bytes=123)
+    # -> {name}_seconds 히스토그램, 예외가 나가면 {name}_errors_total 카운터 (+ JSONL 한 줄)
+    #    BaseException (st.rerun/st.stop 제어 흐름, KeyboardInterrupt) 은 에러로 세지 않음
+    __slots__ = ("name", "labels", "attrs", "t0", "start")
+
+    def __init__(self, name, labels):
+        self.name, self.labels, self.attrs = name, labels, None
+
+    def set(self, **attrs):
+        self.attrs = {**(self.attrs or {}), **attrs}
+        return self
+
+    def __enter__(self):
+        self.start = time.time()
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.t0
+        observe(f"{self.name}_seconds", elapsed, **self.labels)
+        error = exc_type is not None and issubclass(exc_type, Exception)
+        if error: inc(f"{self.name}_errors_total", **self.labels)
+        if JSONL_PATH:
+            write_event(self.name, self.start, elapsed, error=exc_type.__name__ if error else None, **self.labels, **(self.attrs or {}))
+        return False
+
+class _NoopSpan:
+    __slots__ = ()
+    def set(self, **attrs): return self
+    def __enter__(self): return self
+    def __exit__(self, exc_type, exc, tb): return False
+
+_NOOP = _NoopSpan()
+
+def span(name, **labels):
+    return Span(name, labels) if ENABLED else _NOOP
+
+def write_event(name, start, elapsed, **fields):
+    global _jsonl
+    line = json.dumps({"trace": _trace.get(), "span": next(_span_ids), "name": name, "ts": round(start, 6),
+                       "sec": round(elapsed, 6), **fields}, ensure_ascii=False, default=str)
+    with _lock:
+        if _jsonl is None: _jsonl = open(JSONL_PATH, "a", encoding="utf-8", buffering=1) # 줄 단위 flush
+        _jsonl.write(line + "\n")
+
+# --- [Supabase: httpx 이벤트 훅] ---
+# supabase-py 의 모든 PostgREST 요청 (table/rpc) 은 client.postgrest.session (httpx.Client) 을 지나간다.
+# 호출 지점을 하나하나 감싸지 않고 세션에 훅을 달아서 경로별 지연시간/응답 크기/HTTP 에러를 기록한다.
+def _rest_path(request):
+    # /rest/v1/users -> users, /rest/v1/rpc/match_candidates -> rpc/match_candidates
+    path = request.url.path
+    return path.split("/rest/v1/", 1)[-1] or path
+
+def _on_request(request):
+    request.extensions["metrics_t0"] = time.perf_counter()
+
+def _on_response(response):
+    request = response.request
+    t0 = request.extensions.get("metrics_t0")
+    if t0 is None: return
+    response.read() # 훅은 본문을 읽기 전에 불리므로 크기를 재려면 먼저 읽음 (postgrest 는 어차피 전부 읽음)
+    elapsed = time.perf_counter() - t0
+    labels = {"method": request.method, "path": _rest_path(request)}
+    observe("supabase_seconds", elapsed, **labels)
+    observe("supabase_response_bytes", len(response.content), **labels)
+    if response.status_code >= 400: inc("supabase_errors_total", status=response.status_code, **labels)
+    if JSONL_PATH:
+        write_event("supabase", time.time() - elapsed, elapsed, status=response.status_code, bytes=len(response.content), **labels)
+
+def instrument_supabase(client):
+    # 공용 클라이언트에 한 번만 (꺼져 있으면 아무것도 안 함)
+    if not ENABLED: return client
+    hooks = client.postgrest.session.event_hooks
+    if _on_request not in hooks["request"]:
+        hooks["request"].append(_on_request)
+        hooks["response"].append(_on_response)
+    return client
+
+# --- [내보내기] ---
+def _labels_text(labels, extra=()):
+    items = list(labels) + list(extra)
+    if not items: return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_prometheus():
+    with _lock:
+        histograms = {k: list(v) for k, v in _histograms.items()}
+        counters = dict(_counters)
+    lines = []
+    for name in sorted({name for name, _ in histograms}):
+        lines.append(f"# TYPE {PREFIX}{name} histogram")
+        buckets = _buckets(name)
+        for (n, labels), h in sorted(histograms.items()):
+            if n != name: continue
+            cumulative = 0
+            for le, count in zip(buckets, h):
+                cumulative += count
+                lines.append(f"{PREFIX}{name}_bucket{_labels_text(labels, [('le', le)])} {cumulative}")
+            lines.append(f"{PREFIX}{name}_bucket{_labels_text(labels, [('le', '+Inf')])} {h[-1]}")
+            lines.append(f"{PREFIX}{name}_sum{_labels_text(labels)} {h[-2]}")
+            lines.append(f"{PREFIX}{name}_count{_labels_text(labels)} {h[-1]}")
+    for name in sorted({name for name, _ in counters}):
+        lines.append(f"# TYPE {PREFIX}{name} counter")
+        for (n, labels), value in sorted(counters.items()):
+            if n == name: lines.append(f"{PREFIX}{name}{_labels_text(labels)} {value}")
+    return "\n".join(lines) + "\n"
+
+def summary():
+    # 헬스체크 JSON 용: "이름{라벨}" -> 개수/평균 (히스토그램), 값 (카운터)
+    with _lock:
+        out = {f"{name}{_labels_text(labels)}": {"count": h[-1], "avg": h[-2] / h[-1] if h[-1] else 0.0}
+               for (name, labels), h in sorted(_histograms.items())}
+        out.update({f"{name}{_labels_text(labels)}": value for (name, labels), value in sorted(_counters.items())})
+    return out
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args): pass # 스크레이프마다 stderr 에 찍지 않음
+
+def serve(port=None, host="127.0.0.1"):
+    # 데몬 스레드로 /metrics 엔드포인트 시작 -> 서버 객체 (포트가 없거나 꺼져 있으면 None)
+    port = port or os.getenv("METRICS_PORT")
+    if not (ENABLED and port): return None
+    server = ThreadingHTTPServer((host, int(port)), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
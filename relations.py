@@ -0,0 +1,135 @@
+# relations.py
+# 십신 / 지장간 / 합·충·형 룩업 테이블 (Streamlit 의존성 없음)
+#
+# 모든 관계는 import 시 작은 정수 테이블로 만들어 두고 (천간 10x10, 지지 12x12, 지장간 12x3),
+# 명식 하나 또는 두 명식 사이의 관계는 테이블 인덱싱 몇 번으로 계산한다.
+# 배치 함수는 (N, 4) 60갑자 인덱스 배열 (calculate_saju_pillars_batch 출력)을 그대로 받는다.
+import numpy as np
+from saju import GAN_ELEMENT, GAN_YANG, GAN_LIST, PILLAR_KEYS
+
+# --- [십신] ---
+# 일간(나) 기준 다른 천간의 관계. 짝수 = 음양이 같음(편), 홀수 = 음양이 다름(정)
+TEN_GODS = ["비견", "겁재", "식신", "상관", "편재", "정재", "편관", "정관", "편인", "정인"]
+
+def _ten_god(me, other):
+    a, b = GAN_ELEMENT[me], GAN_ELEMENT[other]
+    if a == b: rel = 0              # 같은 오행
+    elif (a + 1) % 5 == b: rel = 1  # 내가 생함
+    elif (a + 2) % 5 == b: rel = 2  # 내가 극함
+    elif (b + 2) % 5 == a: rel = 3  # 나를 극함
+    else: rel = 4                   # 나를 생함
+    return rel * 2 + (GAN_YANG[me] != GAN_YANG[other])
+
+TEN_GOD_TABLE = np.array([[_ten_god(me, other) for other in range(10)] for me in range(10)], dtype=np.int8)
+
+# --- [지장간] ---
+# 지지별 숨은 천간 (여기, 중기, 정기 순, 없으면 -1). 마지막 값이 정기(본기)
+HIDDEN_STEMS = np.array([
+    [-1, 8, 9],  # 자: 임 계
+    [9, 7, 5],   # 축: 계 신 기
+    [4, 2, 0],   # 인: 무 병 갑
+    [-1, 0, 1],  # 묘: 갑 을
+    [1, 9, 4],   # 진: 을 계 무
+    [4, 6, 2],   # 사: 무 경 병
+    [2, 5, 3],   # 오: 병 기 정
+    [3, 1, 5],   # 미: 정 을 기
+    [4, 8, 6],   # 신: 무 임 경
+    [-1, 6, 7],  # 유: 경 신
+    [7, 3, 4],   # 술: 신 정 무
+    [4, 0, 8],   # 해: 무 갑 임
+], dtype=np.int8)
+HIDDEN_MAIN = HIDDEN_STEMS[:, 2]
+
+# --- [합/충/형] ---
+# 비트 플래그: 같은 쌍에 여러 관계가 겹칠 수 있음 (예: 사-신 은 합 + 형)
+CLASH, COMBINE, TRIAD, PUNISH = 1, 2, 4, 8
+RELATION_NAMES = {CLASH: "충", COMBINE: "합", TRIAD: "삼합", PUNISH: "형"}
+
+def _stem_relation(a, b):
+    if a == b: return 0
+    if abs(a - b) == 5: return COMBINE # 갑기/을경/병신/정임/무계 합
+    if abs(a - b) == 6 and min(a, b) < 4: return CLASH # 갑경/을신/병임/정계 충
+    return 0
+
+_PUNISH_GROUPS = [(2, 5, 8), (1, 10, 7)] # 인사신, 축술미 삼형
+_SELF_PUNISH = (4, 6, 9, 11) # 진진/오오/유유/해해 자형
+
+def _branch_relation(a, b):
+    flags = 0
+    if a != b and (a - b) % 12 == 6: flags |= CLASH
+    if a != b and (a + b) % 12 == 1: flags |= COMBINE # 자축/인해/묘술/진유/사신/오미 육합
+    if a != b and a % 4 == b % 4: flags |= TRIAD # 신자진/해묘미/인오술/사유축 (반합 포함)
+    if a != b and any(a in g and b in g for g in _PUNISH_GROUPS): flags |= PUNISH
+    if {a, b} == {0, 3}: flags |= PUNISH # 자묘 상형
+    if a == b and a in _SELF_PUNISH: flags |= PUNISH
+    return flags
+
+STEM_REL = np.array([[_stem_relation(a, b) for b in range(10)] for a in range(10)], dtype=np.uint8)
+BRANCH_REL = np.array([[_branch_relation(a, b) for b in range(12)] for a in range(12)], dtype=np.uint8)
+
+# 명식 안의 기둥 쌍 (년월, 년일, 년시, 월일, 월시, 일시)
+_POS_A, _POS_B = np.triu_indices(4, k=1)
+
+def relation_names(flags):
+    return [name for bit, name in RELATION_NAMES.items() if flags & bit]
+
+# --- [명식 1개] ---
+def ten_gods(saju):
+    # 기둥별 (천간 십신, 지지 정기 십신) - 일간 자신은 None
+    me = saju.day.stem
+    out = {}
+    for key, p in saju.items():
+        stem = None if key == "day" else TEN_GODS[TEN_GOD_TABLE[me, p.stem]]
+        out[key] = (stem, TEN_GODS[TEN_GOD_TABLE[me, HIDDEN_MAIN[p.branch]]])
+    return out
+
+def hidden_stems(saju):
+    # 기둥별 지장간 천간 이름 (여기 -> 정기)
+    return {key: [GAN_LIST[s] for s in HIDDEN_STEMS[p.branch] if s >= 0] for key, p in saju.items()}
+
+def chart_relations(saju):
+    # 명식 안의 천간/지지 합충형: [(기둥 a, 기둥 b, "천간"/"지지", [관계...]), ...]
+    idx = saju.indices()
+    out = []
+    for a, b in zip(_POS_A.tolist(), _POS_B.tolist()):
+        s = int(STEM_REL[idx[a] % 10, idx[b] % 10])
+        j = int(BRANCH_REL[idx[a] % 12, idx[b] % 12])
+        if s: out.append((PILLAR_KEYS[a], PILLAR_KEYS[b], "천간", relation_names(s)))
+        if j: out.append((PILLAR_KEYS[a], PILLAR_KEYS[b], "지지", relation_names(j)))
+    return out
+
+# --- [배치] ---
+def ten_god_profile_batch(pillars):
+    # (N, 4) 60갑자 -> (N, 10) int8 십신 개수 (일간 제외 천간 3 + 지지 정기 4 = 7개)
+    p = np.asarray(pillars, dtype=np.int64)
+    me = (p[:, 2] % 10)[:, None]
+    stems = TEN_GOD_TABLE[me, p[:, [0, 1, 3]] % 10]
+    branches = TEN_GOD_TABLE[me, HIDDEN_MAIN[p % 12]]
+    gods = np.concatenate([stems, branches], axis=1)
+    return (gods[:, :, None] == np.arange(10)).sum(axis=1, dtype=np.int8)
+
+def chart_relation_counts_batch(pillars):
+    # (N, 4) -> (N, 4) int8: 명식 안의 지지 충/합/삼합/형 쌍 개수
+    p = np.asarray(pillars, dtype=np.int64) % 12
+    flags = BRANCH_REL[p[:, _POS_A], p[:, _POS_B]]
+    return np.stack([(flags & bit) != 0 for bit in RELATION_NAMES], axis=-1).sum(axis=1, dtype=np.int8)
+
+# --- [두 명식 사이] ---
+def pair_flags(my_day, other_days):
+    # 일주(60갑자 인덱스) 기준 두 사람의 관계: (일간 관계 비트, 일지 관계 비트, 상대 일간의 내 기준 십신)
+    # other_days 는 스칼라 또는 배열
+    o = np.asarray(other_days, dtype=np.int64)
+    return STEM_REL[my_day % 10, o % 10], BRANCH_REL[my_day % 12, o % 12], TEN_GOD_TABLE[my_day % 10, o % 10]
+
+SPOUSE_STAR = {"남성": "정재", "여성": "정관"}
+
+def pair_label(my_day, other_day, my_gender=None):
+    # 매칭 카드 표시용 한 줄 요약 (관계 없으면 빈 문자열)
+    stem, branch, god = (int(x) for x in pair_flags(my_day, other_day))
+    parts = []
+    if stem & COMBINE: parts.append("일간합 💞")
+    if branch & (COMBINE | TRIAD): parts.append("일지합 🤝")
+    if branch & CLASH: parts.append("일지충 ⚡")
+    if stem & CLASH: parts.append("일간충 ⚔️")
+    if TEN_GODS[god] == SPOUSE_STAR.get(my_gender): parts.append(f"배우자성({TEN_GODS[god]}) 일간")
+    return " · ".join(parts)
@@ -0,0 +1,245 @@
+# saju.py
+# 사주 계산 로직 (Streamlit 의존성 없음 - 배치 작업/CLI에서도 import 가능)
+import datetime
+import numpy as np
+import saju_table
+
+saju_table.warm_table() # 만세력 파일이 없으면 백그라운드에서 미리 빌드 (saju_table.py)
+
+# --- [상수 데이터] ---
+GAN_LIST = ["갑", "을", "병", "정", "무", "기", "경", "신", "임", "계"]
+JI_LIST = ["자", "축", "인", "묘", "진", "사", "오", "미", "신", "유", "술", "해"]
+GAN_HANJA = ["甲", "乙", "丙", "丁", "戊", "己", "庚", "辛", "壬", "癸"]
+JI_HANJA = ["子", "丑", "寅", "卯", "辰", "巳", "午", "未", "申", "酉", "戌", "亥"]
+ELEMENT_KEYS = ["목", "화", "토", "금", "수"] # saju_elements JSON 키 순서
+
+# 오호둔(년간 -> 인월 천간), 오서둔(일간 -> 자시 천간)
+START_MONTH_GAN = [2, 4, 6, 8, 0, 2, 4, 6, 8, 0]
+START_TIME_GAN = [0, 2, 4, 6, 8, 0, 2, 4, 6, 8]
+# 천간/지지 인덱스 -> 오행 인덱스 (ELEMENT_KEYS 기준)
+GAN_ELEMENT = [0, 0, 1, 1, 2, 2, 3, 3, 4, 4]
+JI_ELEMENT = [4, 2, 0, 0, 2, 1, 1, 2, 3, 3, 2, 4]
+
+# 오행 이름/색상 (ELEMENT_KEYS 순서), 음양 (True=양)
+ELEMENT_NAMES = ["목(木)", "화(火)", "토(土)", "금(金)", "수(水)"]
+ELEMENT_COLORS = ["#1565C0", "#C62828", "#F9A825", "#616161", "#000000"]
+GAN_YANG = [True, False, True, False, True, False, True, False, True, False]
+JI_YANG = [False, False, True, False, True, False, True, False, True, False, True, True] # 자/사/오/해는 체용 기준
+
+PILLAR_KEYS = ["year", "month", "day", "time"]
+DAY_OFFSET_1900 = 10 # 1900-01-01 = 갑술일 (60갑자 10번)
+
+# --- [계산 로직 함수들] ---
+def ganji_index(gan_idx, ji_idx):
+    # (천간, 지지) -> 60갑자 인덱스 (중국인의 나머지 정리, 짝/홀이 같을 때만 유효)
+    return (6 * gan_idx - 5 * ji_idx) % 60
+
+def month_index(month, day):
+    # 인월(寅月)=0 ... 축월(丑月)=11, 입춘은 2월 4일 고정
+    if month == 2 and day < 4: return 11
+    return 11 if month < 2 else month - 2
+
+def time_ji_index(hour):
+    return 0 if (hour >= 23 or hour < 1) else (hour + 1) // 2
+
+def _pillar_dict(gan_idx, ji_idx):
+    return {"gan": GAN_LIST[gan_idx], "gan_hanja": GAN_HANJA[gan_idx], "ji": JI_LIST[ji_idx], "ji_hanja": JI_HANJA[ji_idx]}
+
+# 시주 테이블: (일간 0~9, 시 0~23) -> 시주 60갑자 인덱스
+HOUR_TABLE = np.array([[ganji_index((START_TIME_GAN[g] + time_ji_index(h)) % 10, time_ji_index(h)) for h in range(24)] for g in range(10)], dtype=np.uint8)
+_HOUR_ROWS = HOUR_TABLE.tolist()
+
+def _formula_indices(year, month, day, hour):
+    # 만세력 테이블 범위(1900~2100) 밖의 날짜용: 입춘 2월 4일 고정 근사식
+    target_month_idx = month_index(month, day)
+    month_gan = (START_MONTH_GAN[(year - 4) % 10] + target_month_idx) % 10
+    diff = (datetime.date(year, month, day) - datetime.date(1900, 1, 1)).days
+    day_idx = (DAY_OFFSET_1900 + diff) % 60
+    return (year - 4) % 60, ganji_index(month_gan, (2 + target_month_idx) % 12), day_idx, _HOUR_ROWS[day_idx % 10][hour]
+
+def pillar_indices(year, month, day, hour, minute):
+    # (년주, 월주, 일주, 시주) 60갑자 인덱스. 만세력 테이블을 인덱싱만 하고, 절입일이면 절입 시각과 비교
+    i = datetime.date(year, month, day).toordinal() - saju_table.TABLE_START_ORD
+    table = saju_table.load_table()
+    if not 0 <= i < len(table):
+        return _formula_indices(year, month, day, hour)
+    y, m, d, term_min = table.item(i)
+    if term_min >= 0 and hour * 60 + minute >= term_min:
+        m = (m + 1) % 60
+        if m % 12 == 2: y = (y + 1) % 60 # 입춘 -> 년주도 변경
+    return y, m, d, _HOUR_ROWS[d % 10][hour]
+
+def calculate_saju_pillars(year, month, day, hour, minute):
+    return Saju.from_indices(pillar_indices(year, month, day, hour, minute))
+
+def count_elements(saju):
+    # Saju -> {"목":n, "화":n, ...} (saju_elements 저장 형식)
+    cnt = [0] * 5
+    for p in saju:
+        cnt[GAN_ELEMENT[p.stem]] += 1
+        cnt[JI_ELEMENT[p.branch]] += 1
+    return dict(zip(ELEMENT_KEYS, cnt))
+
+# --- [정수 기반 명식 타입] ---
+# 천간 0~9 / 지지 0~11 정수만 들고, 한글/한자/오행/색상은 인덱스 조회로 그때그때 계산.
+# Pillar 는 60갑자 60개를 미리 만들어 공유하므로 세션마다 객체가 늘지 않음.
+class Pillar:
+    __slots__ = ("stem", "branch")
+
+    def __init__(self, stem, branch):
+        self.stem = stem
+        self.branch = branch
+
+    @classmethod
+    def from_index(cls, idx):
+        return PILLARS[idx]
+
+    @property
+    def index(self): return ganji_index(self.stem, self.branch)
+    @property
+    def gan(self): return GAN_LIST[self.stem]
+    @property
+    def ji(self): return JI_LIST[self.branch]
+    @property
+    def gan_hanja(self): return GAN_HANJA[self.stem]
+    @property
+    def ji_hanja(self): return JI_HANJA[self.branch]
+    @property
+    def gan_element(self): return ELEMENT_NAMES[GAN_ELEMENT[self.stem]]
+    @property
+    def ji_element(self): return ELEMENT_NAMES[JI_ELEMENT[self.branch]]
+    @property
+    def gan_yang(self): return GAN_YANG[self.stem]
+    @property
+    def ji_yang(self): return JI_YANG[self.branch]
+    @property
+    def gan_color(self): return ELEMENT_COLORS[GAN_ELEMENT[self.stem]]
+    @property
+    def ji_color(self): return ELEMENT_COLORS[JI_ELEMENT[self.branch]]
+    @property
+    def gan_label(self): return ("양" if self.gan_yang else "음") + ELEMENT_KEYS[GAN_ELEMENT[self.stem]]
+    @property
+    def ji_label(self): return ("양" if self.ji_yang else "음") + ELEMENT_KEYS[JI_ELEMENT[self.branch]]
+    @property
+    def name(self): return self.gan + self.ji
+    @property
+    def hanja(self): return self.gan_hanja + self.ji_hanja
+
+    def to_dict(self):
+        return _pillar_dict(self.stem, self.branch)
+
+    def __repr__(self):
+        return f"Pillar({self.hanja})"
+
+PILLARS = tuple(Pillar(i % 10, i % 12) for i in range(60))
+
+class Saju:
+    __slots__ = ("year", "month", "day", "time")
+
+    def __init__(self, year, month, day, time):
+        self.year, self.month, self.day, self.time = year, month, day, time
+
+    @classmethod
+    def from_indices(cls, indices):
+        # (년, 월, 일, 시) 60갑자 인덱스 -> Saju
+        y, m, d, t = (PILLARS[int(i)] for i in indices)
+        return cls(y, m, d, t)
+
+    @classmethod
+    def from_bytes(cls, data):
+        if len(data) != 4:
+            raise ValueError(f"사주 코드는 4바이트여야 합니다: {data!r}")
+        return cls.from_indices(data)
+
+    @classmethod
+    def from_int(cls, code):
+        return cls.from_bytes(int(code).to_bytes(4, "big"))
+
+    def indices(self):
+        return (self.year.index, self.month.index, self.day.index, self.time.index)
+
+    def to_bytes(self):
+        # DB/세션 저장용 4바이트 (년/월/일/시 60갑자 인덱스)
+        return bytes(self.indices())
+
+    def to_int(self):
+        # DB integer 컬럼용 (최대 0x3B3B3B3B < 2^31)
+        return int.from_bytes(self.to_bytes(), "big")
+
+    def to_dict(self):
+        # 예전 nested dict 형식 ({"year": {"gan":..., "gan_hanja":...}, ...})
+        return {k: p.to_dict() for k, p in self.items()}
+
+    def items(self):
+        return zip(PILLAR_KEYS, self)
+
+    def __iter__(self):
+        return iter((self.year, self.month, self.day, self.time))
+
+    def __eq__(self, other):
+        return isinstance(other, Saju) and self.indices() == other.indices()
+
+    def __hash__(self):
+        return hash(self.indices())
+
+    def __repr__(self):
+        return f"Saju({' '.join(p.hanja for p in self)})"
+
+# --- [배치 계산: NumPy 벡터화] ---
+# 유저 테이블 백필 / 궁합표 사전계산용. calculate_saju_pillars와 결과가 동일해야 함.
+# 반환값: (N, 4) uint8 배열, 열 순서는 PILLAR_KEYS (년/월/일/시), 값은 60갑자 인덱스
+#   천간 = idx % 10, 지지 = idx % 12
+_START_MONTH_GAN = np.array(START_MONTH_GAN, dtype=np.int64)
+_GAN_ELEMENT = np.array(GAN_ELEMENT, dtype=np.int8)
+_JI_ELEMENT = np.array(JI_ELEMENT, dtype=np.int8)
+_EPOCH_TO_TABLE = datetime.date(1970, 1, 1).toordinal() - saju_table.TABLE_START_ORD
+
+def _formula_indices_batch(d):
+    # 테이블 범위 밖 날짜용 근사식 (_formula_indices 의 벡터화 버전)
+    years = d.astype("datetime64[Y]").astype(np.int64) + 1970
+    month_start = d.astype("datetime64[M]")
+    months = month_start.astype(np.int64) % 12 + 1
+    days = (d - month_start).astype(np.int64) + 1
+    target_month = np.where((months < 2) | ((months == 2) & (days < 4)), 11, months - 2)
+    month_gan = (_START_MONTH_GAN[(years - 4) % 10] + target_month) % 10
+    return (years - 4) % 60, ganji_index(month_gan, (2 + target_month) % 12)
+
+def calculate_saju_pillars_batch(dates, hours, minutes=None):
+    # dates: datetime64로 변환 가능한 배열 (pandas Series, datetime.date 리스트, 'YYYY-MM-DD' 문자열 등)
+    # hours/minutes: 정수 배열 (minutes 생략 시 0분 = 절입 시각 비교에서 정각으로 처리)
+    d = np.asarray(dates, dtype="datetime64[D]").ravel()
+    hours = np.asarray(hours, dtype=np.int64).ravel()
+    minutes = np.zeros_like(hours) if minutes is None else np.asarray(minutes, dtype=np.int64).ravel()
+    if d.shape != hours.shape or d.shape != minutes.shape:
+        raise ValueError(f"dates/hours/minutes 길이가 다릅니다: {d.shape}, {hours.shape}, {minutes.shape}")
+
+    table = saju_table.load_table()
+    idx = d.astype(np.int64) + _EPOCH_TO_TABLE
+    in_range = (idx >= 0) & (idx < len(table))
+    rows = table[np.where(in_range, idx, 0)]
+
+    out = np.empty((len(d), 4), dtype=np.uint8)
+    y = rows["year"].astype(np.int64)
+    m = rows["month"].astype(np.int64)
+    term_min = rows["term_min"]
+    passed = (term_min >= 0) & (hours * 60 + minutes >= term_min)
+    m = np.where(passed, (m + 1) % 60, m)
+    y = np.where(passed & (m % 12 == 2), (y + 1) % 60, y)
+    if not in_range.all():
+        y[~in_range], m[~in_range] = _formula_indices_batch(d[~in_range])
+    out[:, 0] = y
+    out[:, 1] = m
+
+    day_idx = (DAY_OFFSET_1900 + idx) % 60
+    out[:, 2] = day_idx
+    out[:, 3] = HOUR_TABLE[day_idx % 10, hours % 24]
+    return out
+
+def count_elements_batch(pillars):
+    # (N, 4) 60갑자 배열 -> (N, 5) int8 오행 개수 (ELEMENT_KEYS 순서)
+    p = np.asarray(pillars, dtype=np.int64)
+    elems = np.concatenate([_GAN_ELEMENT[p % 10], _JI_ELEMENT[p % 12]], axis=-1)
+    counts = np.zeros(p.shape[:-1] + (5,), dtype=np.int8)
+    for e in range(5):
+        counts[..., e] = (elems == e).sum(axis=-1)
+    return counts
@@ -0,0 +1,43 @@
+# saju_card.py
+# 사주 명식 카드 HTML (Streamlit 의존성 없음)
+#
+# 카드 모양은 8글자(천간 4 + 지지 4)에만 의존하므로
+#   천간 10개 / 지지 12개 조각과 (기둥 위치 x 60갑자) 카드 240개를 import 시 미리 만들어 두고,
+#   명식 하나의 카드는 조각 4개를 join 한 결과를 4바이트 코드 기준 LRU 로 보관한다.
+# 스타일시트(CARD_CSS)는 카드마다 넣지 않고 페이지 스타일 블록에 한 번만 넣는다.
+from functools import lru_cache
+from saju import PILLARS, Saju, GAN_LIST, JI_LIST, GAN_HANJA, JI_HANJA, GAN_ELEMENT, JI_ELEMENT, GAN_YANG, JI_YANG, ELEMENT_KEYS, ELEMENT_NAMES, ELEMENT_COLORS
+
+CARD_CSS = """.saju-wrapper { display: flex; justify-content: space-between; gap: 8px; margin-bottom: 20px; } .pillar-card { background-color: #262730; border: 1px solid #464b59; border-radius: 8px; width: 24%; text-align: center; } .card-header { background-color: #31333F; padding: 8px 0; font-weight: bold; color: #FAFAFA; border-bottom: 1px solid #464b59; } .char-section { padding: 15px 0; color: white; } .char-big { font-size: 2rem; font-weight: bold; } .char-desc { font-size: 0.8rem; margin-top: 2px; } .char-tag { font-size: 0.7rem; margin-top: 5px; background: rgba(0,0,0,0.3); padding: 2px 6px; border-radius: 4px; } .card-footer { padding: 6px; font-size: 0.75rem; color: #909090; border-top: 1px solid #464b59; }"""
+CARD_STYLE = f"<style>{CARD_CSS}</style>"
+# 화면 순서: 시/일/월/년 (Saju 인덱스 순서는 년/월/일/시)
+CARD_ORDER = [(3, "시주 (時)"), (2, "일주 (日)"), (1, "월주 (月)"), (0, "년주 (年)")]
+CARD_CACHE_SIZE = 4096 # 카드 1개 약 2KB
+
+def _char_section(color, hanja, name, element, label):
+    return f"""<div class="char-section" style="background-color:{color}"><div class="char-big">{hanja}</div><div class="char-desc">{name}:{element}</div><div class="char-tag">{label}</div></div>"""
+
+def _label(yang, element):
+    return ("양" if yang else "음") + ELEMENT_KEYS[element]
+
+STEM_FRAGMENTS = [_char_section(ELEMENT_COLORS[GAN_ELEMENT[i]], GAN_HANJA[i], GAN_LIST[i], ELEMENT_NAMES[GAN_ELEMENT[i]], _label(GAN_YANG[i], GAN_ELEMENT[i])) for i in range(10)]
+BRANCH_FRAGMENTS = [_char_section(ELEMENT_COLORS[JI_ELEMENT[i]], JI_HANJA[i], JI_LIST[i], ELEMENT_NAMES[JI_ELEMENT[i]], _label(JI_YANG[i], JI_ELEMENT[i])) for i in range(12)]
+
+def _pillar_card(header, p):
+    footer = f"""<div class="card-footer">오행:{ELEMENT_NAMES[GAN_ELEMENT[p.stem]][0]}/{ELEMENT_NAMES[JI_ELEMENT[p.branch]][0]}</div>"""
+    return f"""<div class="pillar-card"><div class="card-header">{header}</div>{STEM_FRAGMENTS[p.stem]}{BRANCH_FRAGMENTS[p.branch]}{footer}</div>"""
+
+# PILLAR_CARDS[기둥 위치][60갑자 인덱스] (위치는 CARD_ORDER 의 화면 순서)
+PILLAR_CARDS = [[_pillar_card(header, p) for p in PILLARS] for _, header in CARD_ORDER]
+
+@lru_cache(maxsize=CARD_CACHE_SIZE)
+def _card_html(code):
+    # code: Saju.to_bytes() 4바이트 (년/월/일/시)
+    return '<div class="saju-wrapper">' + "".join(PILLAR_CARDS[pos][code[i]] for pos, (i, _) in enumerate(CARD_ORDER)) + '</div>'
+
+def card_html(saju):
+    # 스타일시트 제외한 카드 HTML (CARD_STYLE 은 페이지에 따로 한 번)
+    return _card_html(saju.to_bytes() if isinstance(saju, Saju) else bytes(saju))
+
+def card_cache_info():
+    return _card_html.cache_info()._asdict()
@@ -0,0 +1,169 @@
+# saju_table.py
+# 만세력 룩업 테이블 (1900-01-01 ~ 2100-12-31)
+# - 날짜별 년주/월주/일주 60갑자 인덱스를 미리 계산해 data/saju_table.npy 에 저장
+# - 월주/년주는 실제 절기(節, 태양황경 15° + 30°k) 시각 기준 (입춘에 년주 변경)
+# - 앱에서는 load_table()로 처음 필요할 때 mmap 으로 읽음 (콜드스타트 비용 없음)
+# - 파일은 저장소에 넣지 않음 (.gitignore). 배포 이미지/시작 스크립트에서 미리 빌드할 것
+#   파일이 없으면 saju import 시 warm_table() 백그라운드 스레드가 만들어 저장 (~1초, 그 사이 load_table() 호출은 완료를 기다림)
+#
+# 빌드 (배포 단계): python -m saju_table build
+import datetime
+import math
+import os
+import sys
+import threading
+import numpy as np
+
+TABLE_START = datetime.date(1900, 1, 1)
+TABLE_END = datetime.date(2100, 12, 31)
+TABLE_START_ORD = TABLE_START.toordinal()
+TABLE_END_ORD = TABLE_END.toordinal()
+TABLE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "saju_table.npy")
+
+# year/month/day: 해당 날짜 00:00(KST) 시점의 60갑자 인덱스
+# term_min: 그 날짜에 절기가 들어오면 시작 분(0~1439), 없으면 -1
+#           (해당 분 이후 출생은 월주 +1, 입춘이면 년주도 +1)
+TABLE_DTYPE = np.dtype([("year", "u1"), ("month", "u1"), ("day", "u1"), ("term_min", "<i2")])
+
+KST = datetime.timedelta(hours=9) # 역사적 표준시(UTC+8:30 시기 등)와 서머타임은 반영하지 않음
+JIE_NAMES = ["입춘", "경칩", "청명", "입하", "망종", "소서", "입추", "백로", "한로", "입동", "대설", "소한"]
+DAY_OFFSET_1900 = 10 # 1900-01-01 = 갑술일
+MONTH_OFFSET_1900 = 14 # 1900년 인월 = 무인월
+
+# --- [천문 계산: 태양 겉보기 황경] ---
+# VSOP87 지구 일심황경 축약 계열 (Meeus, Astronomical Algorithms 부록 III)
+# 절기 시각 오차 약 1분 이내 (천문연구원 발표 시각과 비교)
+L0 = [(175347046,0,0), (3341656,4.6692568,6283.07585), (34894,4.6261,12566.1517), (3497,2.7441,5753.3849), (3418,2.8289,3.5231), (3136,3.6277,77713.7715), (2676,4.4181,7860.4194), (2343,6.1352,3930.2097), (1324,0.7425,11506.7698), (1273,2.0371,529.691), (1199,1.1096,1577.3435), (990,5.233,5884.927), (902,2.045,26.298), (857,3.508,398.149), (780,1.179,5223.694), (753,2.533,5507.553), (505,4.583,18849.228), (492,4.205,775.523), (357,2.92,0.067), (317,5.849,11790.629), (284,1.899,796.298), (271,0.315,10977.079), (243,0.345,5486.778), (206,4.806,2544.314), (205,1.869,5573.143), (202,2.458,6069.777), (156,0.833,213.299), (132,3.411,2942.463), (126,1.083,20.775), (115,0.645,0.98), (103,0.636,4694.003), (102,0.976,15720.839), (102,4.267,7.114), (99,6.21,2146.17), (98,0.68,155.42), (86,5.98,161000.69), (85,1.3,6275.96), (85,3.67,71430.7), (80,1.81,17260.15), (79,3.04,12036.46), (75,1.76,5088.63), (74,3.5,3154.69), (74,4.68,801.82), (70,0.83,9437.76), (62,3.98,8827.39), (61,1.82,7084.9), (57,2.78,6286.6), (56,4.39,14143.5), (56,3.47,6279.55), (52,0.19,12139.55), (52,1.33,1748.02), (51,0.28,5856.48), (49,0.49,1194.45), (41,5.37,8429.24), (41,2.4,19651.05), (39,6.17,10447.39), (37,6.04,10213.29), (37,2.57,1059.38), (36,1.71,2352.87), (36,1.78,6812.77), (33,0.59,17789.85), (30,0.44,83996.85), (30,2.74,1349.87), (25,3.16,4690.48)]
+L1 = [(628331966747,0,0), (206059,2.678235,6283.07585), (4303,2.6351,12566.1517), (425,1.59,3.523), (119,5.796,26.298), (109,2.966,1577.344), (93,2.59,18849.23), (72,1.14,529.69), (68,1.87,398.15), (67,4.41,5507.55), (59,2.89,5223.69), (56,2.17,155.42), (45,0.4,796.3), (36,0.47,775.52), (29,2.65,7.11), (21,5.34,0.98), (19,1.85,5486.78), (19,4.97,213.3), (17,2.99,6275.96), (16,0.03,2544.31), (16,1.43,2146.17), (15,1.21,10977.08), (12,2.83,1748.02), (12,3.26,5088.63), (12,5.27,1194.45), (12,2.08,4694), (11,0.77,553.57), (10,1.3,6286.6), (10,4.24,1349.87), (9,2.7,242.73), (9,5.64,951.72), (8,5.3,2352.87), (6,2.65,9437.76), (6,4.67,4690.48)]
+L2 = [(52919,0,0), (8720,1.0721,6283.0758), (309,0.867,12566.152), (27,0.05,3.52), (16,5.19,26.3), (16,3.68,155.42), (10,0.76,18849.23), (9,2.06,77713.77), (7,0.83,775.52), (5,4.66,1577.34), (4,1.03,7.11), (4,3.44,5573.14), (3,5.14,796.3), (3,6.05,5507.55), (3,1.19,242.73), (3,6.12,529.69), (3,0.31,398.15), (3,2.28,553.57), (2,4.38,5223.69), (2,3.75,0.98)]
+L3 = [(289,5.844,6283.076), (35,0,0), (17,5.49,12566.15), (3,5.2,155.42), (1,4.72,3.52), (1,5.3,18849.23), (1,5.97,242.73)]
+L4 = [(114,3.142,0), (8,4.13,6283.08), (1,3.84,12566.15)]
+L5 = [(1,3.14,0)]
+_VSOP_L = (L0, L1, L2, L3, L4, L5)
+
+def _delta_t(year):
+    # TT - UT (초), Espenak & Meeus 다항식 근사
+    if year < 1920:
+        t = year - 1900
+        return -2.79 + 1.494119 * t - 0.0598939 * t**2 + 0.0061966 * t**3 - 0.000197 * t**4
+    if year < 1941:
+        t = year - 1920
+        return 21.20 + 0.84493 * t - 0.076100 * t**2 + 0.0020936 * t**3
+    if year < 1961:
+        t = year - 1950
+        return 29.07 + 0.407 * t - t**2 / 233 + t**3 / 2547
+    if year < 1986:
+        t = year - 1975
+        return 45.45 + 1.067 * t - t**2 / 260 - t**3 / 718
+    if year < 2005:
+        t = year - 2000
+        return 63.86 + 0.3345 * t - 0.060374 * t**2 + 0.0017275 * t**3 + 0.000651814 * t**4 + 0.00002373599 * t**5
+    if year < 2050:
+        t = year - 2000
+        return 62.92 + 0.32217 * t + 0.005589 * t**2
+    return -20 + 32 * ((year - 1820) / 100) ** 2 - 0.5628 * (2150 - year)
+
+def _sun_longitude(jde):
+    tau = (jde - 2451545.0) / 365250
+    lon = sum(sum(a * math.cos(b + c * tau) for a, b, c in series) * tau**i for i, series in enumerate(_VSOP_L)) / 1e8
+    t = tau * 10
+    omega = math.radians(125.04452 - 1934.136261 * t)
+    l_sun = math.radians(280.4665 + 36000.7698 * t)
+    l_moon = math.radians(218.3165 + 481267.8813 * t)
+    # 장동(Δψ) + FK5 보정 + 광행차 (초 단위)
+    dpsi = -17.20 * math.sin(omega) - 1.32 * math.sin(2 * l_sun) - 0.23 * math.sin(2 * l_moon) + 0.21 * math.sin(2 * omega)
+    return (math.degrees(lon) + 180 + (dpsi - 0.09033 - 20.4898) / 3600) % 360
+
+def _jd(dt):
+    return dt.toordinal() + 1721424.5 + (dt.hour * 3600 + dt.minute * 60 + dt.second) / 86400
+
+def _from_jd(jd):
+    base = jd - 1721424.5
+    day = int(base)
+    return datetime.datetime.fromordinal(day) + datetime.timedelta(seconds=round((base - day) * 86400))
+
+def solar_term_time(year, longitude, guess):
+    # 태양 황경이 longitude 가 되는 시각 (KST naive datetime), guess 근처에서 뉴턴 반복
+    jd = _jd(guess)
+    dt_days = _delta_t(year) / 86400
+    for _ in range(50):
+        diff = (longitude - _sun_longitude(jd + dt_days) + 180) % 360 - 180
+        jd += diff / 360 * 365.2422
+        if abs(diff) < 1e-7: break
+    return _from_jd(jd) + KST
+
+def jie_times(year):
+    # 사주 년도 year 의 12절 시각 (입춘 ~ 다음해 소한), [(kst_datetime, 인월=0 기준 월 번호), ...]
+    terms = []
+    for k in range(12):
+        guess = datetime.datetime(year, 2, 4) + datetime.timedelta(days=30.44 * k)
+        terms.append((solar_term_time(guess.year, (315 + 30 * k) % 360, guess), k))
+    return terms
+
+# --- [테이블 빌드] ---
+def build_table(start=TABLE_START, end=TABLE_END):
+    terms = []
+    for y in range(start.year - 1, end.year + 1):
+        for t, k in jie_times(y):
+            terms.append((t, (y - 1900) * 12 + k, y))
+
+    table = np.empty(end.toordinal() - start.toordinal() + 1, dtype=TABLE_DTYPE)
+    ti = 0
+    for i in range(len(table)):
+        day_start = datetime.datetime.fromordinal(start.toordinal() + i)
+        # day_start 이전에 들어온 마지막 절기 찾기
+        while ti + 1 < len(terms) and terms[ti + 1][0] < day_start:
+            ti += 1
+        _, months_since, saju_year = terms[ti]
+        term_min = -1
+        if ti + 1 < len(terms):
+            nxt = terms[ti + 1][0] - day_start
+            if nxt < datetime.timedelta(days=1):
+                term_min = nxt.seconds // 60
+        table[i] = ((saju_year - 4) % 60, (MONTH_OFFSET_1900 + months_since) % 60,
+                    (DAY_OFFSET_1900 + start.toordinal() + i - TABLE_START_ORD) % 60, term_min)
+    return table
+
+def save_table(path=TABLE_PATH, table=None):
+    table = build_table() if table is None else table
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        np.save(f, table)
+    os.replace(tmp, path) # 여러 프로세스가 동시에 만들어도 읽는 쪽이 반쯤 쓴 파일을 보지 않도록
+    return table
+
+# --- [지연 로딩] ---
+_table = None
+_table_lock = threading.Lock() # 빌드는 프로세스당 한 번 (동시에 부른 쪽은 기다림)
+
+def load_table():
+    global _table
+    if _table is not None: return _table
+    with _table_lock:
+        if _table is None:
+            if os.path.exists(TABLE_PATH):
+                _table = np.load(TABLE_PATH, mmap_mode="r")
+            else:
+                # 빌드 파일이 없으면 만들어서 저장 (다음 프로세스부터는 mmap). 저장할 수 없으면 메모리에서만 사용
+                table = build_table()
+                try:
+                    save_table(TABLE_PATH, table)
+                except OSError:
+                    pass
+                _table = table
+    return _table
+
+def warm_table():
+    # 빌드 파일이 없을 때만 백그라운드에서 미리 빌드 -> 첫 요청이 빌드 시간을 기다리지 않음
+    if _table is not None or os.path.exists(TABLE_PATH): return None
+    thread = threading.Thread(target=load_table, name="saju-table-build", daemon=True)
+    thread.start()
+    return thread
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "build":
+        t = save_table()
+        print(f"{TABLE_PATH} 생성 완료: {len(t):,}일, {t.nbytes:,} bytes")
+    else:
+        print("사용법: python -m saju_table build")
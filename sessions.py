@@ -0,0 +1,121 @@
+# sessions.py
+# 세션 상태 예산 / 유휴 세션 정리 / 세션별 메모리 리포트 (Streamlit 의존성 없음)
+#
+# 세션에는 작은 값만 둔다:
+#   로그인 유저는 id 문자열 + 로그아웃 때 폐기할 토큰 쌍만 (auth User 객체 X), 프로필은 필요한 컬럼만, 명식은 4바이트 코드,
+#   분석 풀이 본문은 프로세스 공용 llm.response_cache 에 두고 세션에는 캐시 키만 (같은 명식+등급이면 세션끼리 공유)
+# registry 는 세션 키 -> (마지막 리런 시각, 추정 크기) 를 들고
+#   세션 키는 처음 리런 때 만든 uuid4 를 세션 상태(SESSION_KEY)에 넣어 두고 계속 쓴다 (Streamlit 내부 id 에 기대지 않음)
+#   - 리런마다 touch(): idle_ttl 넘게 쉬었던 세션이면 자기 앱 상태(APP_KEYS)를 지워 로그아웃 상태로 만들고,
+#     크기가 budget 을 넘으면 다시 만들 수 있는 값(DROPPABLE)부터 버림
+#   - sweep(): idle_ttl 넘게 리런이 없던 세션의 registry 항목만 정리 (다른 세션의 상태는 건드리지 않음)
+# 세션 상태는 항상 그 세션의 스크립트 스레드에서만 바꾼다. 탭을 닫은 세션은 Streamlit 이
+# 연결 끊김 후 정리하고 (server.disconnectedSessionTTL), 열어둔 채 쉬는 세션은 돌아온 첫 리런에서 비워진다.
+import os
+import sys
+import threading
+import time
+import uuid
+
+# 앱이 세션에 직접 넣는 키 (위젯 키 제외). 유휴 정리 시 이 키들만 지운다
+APP_KEYS = ("is_logged_in", "user_id", "auth_tokens", "db_user_info", "today_fortune", "fortune_date", "fortune_retry_at",
+            "saju_result", "birth_input", "analysis_key", "auth_mode")
+# registry 키 (APP_KEYS 에 넣지 않음 -> 유휴 정리 뒤에도 같은 키로 돌아옴)
+SESSION_KEY = "session_key"
+# 예산 초과 시 버리는 순서 (다음 리런에서 DB/캐시/로컬 계산으로 다시 채워짐)
+DROPPABLE = ("today_fortune", "fortune_date", "fortune_retry_at", "db_user_info")
+
+def approx_bytes(obj, _depth=0):
+    # 세션 값의 대략적인 크기 (dict/list/tuple/set 은 안쪽까지, 그 외는 getsizeof)
+    size = sys.getsizeof(obj)
+    if _depth > 4: return size
+    if isinstance(obj, dict):
+        size += sum(approx_bytes(k, _depth + 1) + approx_bytes(v, _depth + 1) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(approx_bytes(v, _depth + 1) for v in obj)
+    return size
+
+def state_bytes(state, keys=APP_KEYS):
+    return sum(approx_bytes(state[k]) for k in keys if k in state)
+
+def session_key(state):
+    # 이 세션의 registry 키 (없으면 새로 만들어 세션 상태에 저장)
+    if SESSION_KEY not in state: state[SESSION_KEY] = uuid.uuid4().hex
+    return state[SESSION_KEY]
+
+class SessionRegistry:
+    def __init__(self, budget=16 * 1024, idle_ttl=1800, sweep_interval=60, max_evicted=10_000):
+        self.budget = budget
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.max_evicted = max_evicted
+        self._lock = threading.Lock()
+        self._sessions = {} # session id -> [last_seen, bytes]
+        self._evicted = {} # sweep 이 정리한 session id -> 정리 시각 (돌아오면 로그아웃 처리)
+        self._last_sweep = time.monotonic()
+        self.stats = {"evicted": 0, "dropped_keys": 0, "sweeps": 0}
+
+    def touch(self, session_id, state):
+        # 리런 시작 시 (그 세션의 스크립트 스레드에서) 호출 -> 유휴로 정리됐으면 True
+        now = time.monotonic()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            idle = self._evicted.pop(session_id, None) is not None or (entry is not None and now - entry[0] >= self.idle_ttl)
+        if idle:
+            for key in APP_KEYS:
+                if key in state: del state[key]
+        size, dropped = state_bytes(state), 0
+        if size > self.budget:
+            for key in DROPPABLE:
+                if key not in state: continue
+                del state[key]
+                dropped += 1
+                size = state_bytes(state)
+                if size <= self.budget: break
+        with self._lock:
+            self._sessions[session_id] = [now, size]
+            self.stats["evicted"] += idle
+            self.stats["dropped_keys"] += dropped
+        self.sweep(now)
+        return idle
+
+    def record(self, session_id, state):
+        # 리런 끝에 크기만 다시 기록 (리런 중에 분석/로그인 등으로 바뀐 상태 반영)
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry: entry[1] = state_bytes(state)
+
+    def sweep(self, now=None):
+        # sweep_interval 마다 한 번만 실제로 돈다 (리런마다 불려도 가벼움) -> 정리한 항목 수
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            if now - self._last_sweep < self.sweep_interval: return 0
+            self._last_sweep = now
+            self.stats["sweeps"] += 1
+            idle = [sid for sid, (last_seen, _) in self._sessions.items() if now - last_seen >= self.idle_ttl]
+            for sid in idle:
+                del self._sessions[sid]
+                self._evicted[sid] = now
+            while len(self._evicted) > self.max_evicted: self._evicted.pop(next(iter(self._evicted)))
+        return len(idle)
+
+    def report(self, top=20):
+        # 헬스체크 JSON 용: 전체 요약 + 큰 세션 top 개 (id 는 앞 8자만)
+        now = time.monotonic()
+        with self._lock:
+            live = [(sid, now - last_seen, size) for sid, (last_seen, size) in self._sessions.items()]
+        sizes = [size for _, _, size in live]
+        return {
+            **self.stats,
+            "sessions": len(live),
+            "idle_sessions": sum(1 for _, idle, _ in live if idle >= self.idle_ttl / 2),
+            "total_bytes": sum(sizes),
+            "max_bytes": max(sizes, default=0),
+            "budget_bytes": self.budget,
+            "largest": [{"session": sid[:8], "bytes": size, "idle_sec": round(idle)}
+                        for sid, idle, size in sorted(live, key=lambda x: -x[2])[:top]],
+        }
+
+_idle_ttl = int(os.getenv("SESSION_IDLE_SEC", "1800"))
+registry = SessionRegistry(budget=int(os.getenv("SESSION_BUDGET_BYTES", str(16 * 1024))),
+                           idle_ttl=_idle_ttl, sweep_interval=min(60, _idle_ttl))
@@ -0,0 +1,142 @@
+-- 001_match_candidates.sql
+-- 매칭 탭 서버사이드 스코어링 (supabase.rpc("match_candidates", ...))
+-- 적용: Supabase 대시보드 SQL Editor 에서 실행 (여러 번 실행해도 안전)
+--
+-- 점수 규칙은 matching.py 의 score_candidates 와 동일
+--   기본 50 / 이성 +20 / 내게 없는 오행을 상대가 3개 이상 +30, 1개 이상 +10
+--   둘 다 3개 이상인 오행마다 -10 / 최대 100
+--   성별이 없는(null) 유저도 후보에 포함 (성별 '' 클래스, 파이썬 경로와 같음)
+--   동점은 id 오름차순 (MATCH_ENGINE=stream 과 같은 순서. local 은 후보 캐시에 들어온 순서)
+--
+-- 권한: 아무 p_user_id 로나 다른 회원의 매칭 목록(이름/출생년도)을 볼 수 없도록 service_role 에만 실행 권한.
+--   앱 서버가 SUPABASE_SERVICE_KEY 로 만든 클라이언트로, 로그인한 세션의 user_id 를 넣어서 호출한다.
+--   match_classes 테이블도 RLS 를 켜고 anon/authenticated 권한을 회수 (클래스별 인원 수 비공개).
+--
+-- 후보를 한 명씩 보지 않고 (성별, 오행 벡터) 클래스 단위로 점수를 매긴다.
+-- 오행 개수 합이 8이므로 클래스는 성별당 최대 495개 -> 유저 수와 무관하게 지연시간이 일정.
+-- match_classes 는 트리거로 유지되고, 상위 클래스에서 인덱스로 K명만 꺼낸다.
+
+-- 1. saju_elements(jsonb) -> 오행 개수 생성 컬럼
+alter table public.users
+    add column if not exists el_wood  smallint generated always as ((saju_elements->>'목')::smallint) stored,
+    add column if not exists el_fire  smallint generated always as ((saju_elements->>'화')::smallint) stored,
+    add column if not exists el_earth smallint generated always as ((saju_elements->>'토')::smallint) stored,
+    add column if not exists el_metal smallint generated always as ((saju_elements->>'금')::smallint) stored,
+    add column if not exists el_water smallint generated always as ((saju_elements->>'수')::smallint) stored;
+
+-- 2. 클래스 -> 유저 조회용 인덱스 (클래스 안에서 id 순으로 K명, 결과 컬럼 include -> index-only scan)
+drop index if exists public.users_match_idx;
+create index users_match_idx
+    on public.users ((coalesce(gender, '')), el_wood, el_fire, el_earth, el_metal, el_water, id)
+    include (name, gender, birth_date)
+    where saju_elements is not null;
+
+-- 3. (성별, 오행 벡터) 클래스별 인원 수 (성별 null 은 '')
+create table if not exists public.match_classes (
+    gender     text     not null,
+    el_wood    smallint not null,
+    el_fire    smallint not null,
+    el_earth   smallint not null,
+    el_metal   smallint not null,
+    el_water   smallint not null,
+    user_count integer  not null default 0,
+    primary key (gender, el_wood, el_fire, el_earth, el_metal, el_water)
+);
+-- 집계 테이블은 API 로 노출하지 않음 (트리거는 security definer, match_candidates 는 service_role 로만 읽음)
+alter table public.match_classes enable row level security;
+revoke all on public.match_classes from anon, authenticated;
+
+create or replace function public.match_classes_sync() returns trigger
+language plpgsql security definer set search_path = public as $$
+begin
+    if tg_op in ('UPDATE', 'DELETE') and old.saju_elements is not null then
+        update match_classes set user_count = user_count - 1
+        where gender = coalesce(old.gender, '') and el_wood = old.el_wood and el_fire = old.el_fire
+          and el_earth = old.el_earth and el_metal = old.el_metal and el_water = old.el_water;
+    end if;
+    if tg_op in ('INSERT', 'UPDATE') and new.saju_elements is not null then
+        insert into match_classes as c (gender, el_wood, el_fire, el_earth, el_metal, el_water, user_count)
+        values (coalesce(new.gender, ''), new.el_wood, new.el_fire, new.el_earth, new.el_metal, new.el_water, 1)
+        on conflict (gender, el_wood, el_fire, el_earth, el_metal, el_water)
+        do update set user_count = c.user_count + 1;
+    end if;
+    return null;
+end $$;
+
+drop trigger if exists users_match_classes_sync on public.users;
+create trigger users_match_classes_sync
+    after insert or delete or update of saju_elements, gender on public.users
+    for each row execute function public.match_classes_sync();
+
+-- 기존 데이터로 초기화
+truncate public.match_classes;
+insert into public.match_classes (gender, el_wood, el_fire, el_earth, el_metal, el_water, user_count)
+select coalesce(gender, ''), el_wood, el_fire, el_earth, el_metal, el_water, count(*)
+from public.users
+where saju_elements is not null
+group by 1, 2, 3, 4, 5, 6;
+
+-- 4. 매칭 RPC: 필요한 컬럼만 (이름/성별/출생년도/점수/보너스), 상위 p_limit 명
+create or replace function public.match_candidates(p_user_id uuid, p_limit integer default 5)
+returns table (name text, gender text, birth_year text, score integer, bonus text)
+language sql stable set search_path = public as $$
+    with me as (
+        select coalesce(gender, '') as gender, el_wood, el_fire, el_earth, el_metal, el_water
+        from users where id = p_user_id and saju_elements is not null
+    ),
+    scored as (
+        select c.*,
+               -- 내 클래스에서는 나 자신을 제외
+               c.user_count - (case when c.gender = me.gender and c.el_wood = me.el_wood and c.el_fire = me.el_fire
+                                     and c.el_earth = me.el_earth and c.el_metal = me.el_metal
+                                     and c.el_water = me.el_water then 1 else 0 end) as n,
+               least(100, 50
+                   + (case when c.gender is distinct from me.gender then 20 else 0 end)
+                   + (case when me.el_wood  = 0 then case when c.el_wood  >= 3 then 30 when c.el_wood  >= 1 then 10 else 0 end else 0 end)
+                   + (case when me.el_fire  = 0 then case when c.el_fire  >= 3 then 30 when c.el_fire  >= 1 then 10 else 0 end else 0 end)
+                   + (case when me.el_earth = 0 then case when c.el_earth >= 3 then 30 when c.el_earth >= 1 then 10 else 0 end else 0 end)
+                   + (case when me.el_metal = 0 then case when c.el_metal >= 3 then 30 when c.el_metal >= 1 then 10 else 0 end else 0 end)
+                   + (case when me.el_water = 0 then case when c.el_water >= 3 then 30 when c.el_water >= 1 then 10 else 0 end else 0 end)
+                   - (case when me.el_wood  >= 3 and c.el_wood  >= 3 then 10 else 0 end)
+                   - (case when me.el_fire  >= 3 and c.el_fire  >= 3 then 10 else 0 end)
+                   - (case when me.el_earth >= 3 and c.el_earth >= 3 then 10 else 0 end)
+                   - (case when me.el_metal >= 3 and c.el_metal >= 3 then 10 else 0 end)
+                   - (case when me.el_water >= 3 and c.el_water >= 3 then 10 else 0 end)
+               ) as score,
+               concat_ws(', ',
+                   case when me.el_wood  = 0 and c.el_wood  >= 3 then '부족한 ''목'' 기운 가득!' end,
+                   case when me.el_fire  = 0 and c.el_fire  >= 3 then '부족한 ''화'' 기운 가득!' end,
+                   case when me.el_earth = 0 and c.el_earth >= 3 then '부족한 ''토'' 기운 가득!' end,
+                   case when me.el_metal = 0 and c.el_metal >= 3 then '부족한 ''금'' 기운 가득!' end,
+                   case when me.el_water = 0 and c.el_water >= 3 then '부족한 ''수'' 기운 가득!' end
+               ) as bonus
+        from match_classes c cross join me
+        where c.user_count > 0
+    ),
+    -- 점수 순으로 누적 인원이 p_limit 에 닿는 점수까지 (그 점수의 클래스는 전부 -> 동점을 id 순으로 고를 수 있게)
+    ranked as (
+        select s.*, sum(s.n) over (order by s.score desc, s.gender, s.el_wood, s.el_fire, s.el_earth, s.el_metal, s.el_water
+                                   rows unbounded preceding) - s.n as before
+        from scored s where s.n > 0
+    ),
+    top_classes as (
+        select r.* from ranked r
+        where r.score >= (select min(score) from ranked where before < p_limit)
+    )
+    select u.name, u.gender, coalesce(left(u.birth_date::text, 4), '????'), t.score, t.bonus
+    from top_classes t
+    cross join lateral (
+        select x.id, x.name, x.gender, x.birth_date
+        from users x
+        where x.saju_elements is not null and x.id <> p_user_id
+          and coalesce(x.gender, '') = t.gender and x.el_wood = t.el_wood and x.el_fire = t.el_fire
+          and x.el_earth = t.el_earth and x.el_metal = t.el_metal and x.el_water = t.el_water
+        order by x.id
+        limit p_limit
+    ) u
+    order by t.score desc, u.id
+    limit p_limit;
+$$;
+
+revoke all on function public.match_candidates(uuid, integer) from public, anon, authenticated;
+grant execute on function public.match_candidates(uuid, integer) to service_role;
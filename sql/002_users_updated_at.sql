@@ -0,0 +1,21 @@
+-- 002_users_updated_at.sql
+-- 매칭 후보 캐시(matching.CandidateCache) 증분 갱신용 updated_at 워터마크
+-- 적용: Supabase 대시보드 SQL Editor 에서 실행 (여러 번 실행해도 안전)
+
+alter table public.users
+    add column if not exists updated_at timestamptz not null default now();
+
+create or replace function public.touch_updated_at() returns trigger
+language plpgsql as $$
+begin
+    new.updated_at := now();
+    return new;
+end $$;
+
+drop trigger if exists users_touch_updated_at on public.users;
+create trigger users_touch_updated_at
+    before update on public.users
+    for each row execute function public.touch_updated_at();
+
+-- (updated_at, id) 키셋 페이지네이션
+create index if not exists users_updated_at_idx on public.users (updated_at, id);
@@ -0,0 +1,29 @@
+-- 003_backfill_saju_elements.sql
+-- saju_elements 일괄 기록 (python -m backfill 이 배치마다 한 번 호출)
+-- 적용: Supabase 대시보드 SQL Editor 에서 실행 (여러 번 실행해도 안전)
+--
+-- p_rows: [{"id": uuid, "saju_elements": {"목": n, ...}}, ...]
+-- 값이 바뀐 행만 UPDATE (updated_at / match_classes 트리거도 실제로 바뀐 행에만 동작)
+-- 다른 유저의 행을 덮어쓸 수 있으므로 service_role 에만 실행 권한을 준다.
+
+create or replace function public.backfill_saju_elements(p_rows jsonb)
+returns integer
+language sql volatile security definer set search_path = public as $$
+    with src as (
+        select r.id, r.saju_elements
+        from jsonb_to_recordset(p_rows) as r(id uuid, saju_elements jsonb)
+    ),
+    updated as (
+        update users u set saju_elements = s.saju_elements
+        from src s
+        where u.id = s.id and u.saju_elements is distinct from s.saju_elements
+        returning 1
+    )
+    select count(*)::integer from updated;
+$$;
+
+revoke all on function public.backfill_saju_elements(jsonb) from public, anon, authenticated;
+grant execute on function public.backfill_saju_elements(jsonb) to service_role;
+
+-- 백필 대상 스캔용 (saju_elements 가 비어있는 행을 id 순으로)
+create index if not exists users_missing_elements_idx on public.users (id) where saju_elements is null;
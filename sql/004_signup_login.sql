@@ -0,0 +1,56 @@
+-- 004_signup_login.sql
+-- 회원가입/로그인 DB 왕복 줄이기
+-- 적용: Supabase 대시보드 SQL Editor 에서 실행 (여러 번 실행해도 안전)
+--
+-- 가입: auth.sign_up 한 번. options.data 로 넘긴 프로필을 auth.users 트리거가 같은 트랜잭션에서 public.users 에 넣는다.
+--       아이디/이메일 중복은 유니크 인덱스가 막고, 실패하면 auth 유저도 함께 롤백 (프로필 없는 계정이 안 생김)
+-- 로그인: resolve_login_email(아이디) 한 번 -> sign_in_with_password
+--       아이디로 이메일을 알아낼 수 있으므로 service_role 에만 실행 권한 (앱 서버의 SUPABASE_SERVICE_KEY 클라이언트로 호출)
+-- 중복 확인 버튼: check_signup_available 한 번으로 아이디/이메일 동시 확인 (안내용, 최종 판정은 유니크 인덱스)
+
+-- 1. 유니크 인덱스 (기존 중복 데이터가 있으면 생성 실패 -> 먼저 정리할 것)
+--    select username, count(*) from public.users group by 1 having count(*) > 1;
+--    select lower(email), count(*) from public.users group by 1 having count(*) > 1;
+create unique index if not exists users_username_key on public.users (username);
+create unique index if not exists users_email_lower_key on public.users (lower(email));
+
+-- 2. auth.users -> public.users 프로필 생성 트리거
+create or replace function public.handle_new_user() returns trigger
+language plpgsql security definer set search_path = public as $$
+declare
+    meta jsonb := new.raw_user_meta_data;
+begin
+    if meta is null or not meta ? 'username' then return new; end if; -- 앱 가입 경로가 아니면 무시
+    -- jsonb_populate_record: 컬럼 타입(date/time/boolean 등)에 맞게 자동 변환
+    insert into users (id, email, username, name, phone, birth_date, birth_time, gender, agree_location, agree_marketing)
+    select new.id, new.email, p.username, p.name, p.phone, p.birth_date, p.birth_time, p.gender, p.agree_location, p.agree_marketing
+    from jsonb_populate_record(null::users, meta) p;
+    -- 프로필은 public.users 에만 두고, JWT 에 실리는 user_metadata 에는 아이디만 남김
+    update auth.users set raw_user_meta_data = jsonb_build_object('username', meta->>'username') where id = new.id;
+    return new;
+end $$;
+
+drop trigger if exists on_auth_user_created on auth.users;
+create trigger on_auth_user_created
+    after insert on auth.users
+    for each row execute function public.handle_new_user();
+
+-- 3. 중복 확인 (users 테이블을 anon 에게 열지 않고 여부만 반환)
+create or replace function public.check_signup_available(p_username text default null, p_email text default null)
+returns table (username_taken boolean, email_taken boolean)
+language sql stable security definer set search_path = public as $$
+    select p_username is not null and exists (select 1 from users where username = p_username),
+           p_email is not null and exists (select 1 from users where lower(email) = lower(p_email));
+$$;
+
+-- 4. 아이디 -> 이메일 (users_username_key 인덱스 조회)
+create or replace function public.resolve_login_email(p_username text)
+returns text
+language sql stable security definer set search_path = public as $$
+    select email from users where username = p_username;
+$$;
+
+revoke all on function public.check_signup_available(text, text) from public;
+revoke all on function public.resolve_login_email(text) from public, anon, authenticated;
+grant execute on function public.check_signup_available(text, text) to anon, authenticated;
+grant execute on function public.resolve_login_email(text) to service_role;